@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Virtual Arduino on a pseudo-terminal, for load and soak tests without hardware.
+Behaves like arduino_test_sketch.ino: sends the "Arduino started" banner when
+the port is opened, one JSON line per sample, and switches to bin1 frames
+when the Pi asks for them. Can add timing jitter, sensor noise, garbage
+lines and periodic disconnects.
+
+The pty is published under a stable symlink so the backend can find it
+again after a simulated disconnect:
+
+    python arduino_simulator.py --link /tmp/ttyVIRT0 --rate 10 --garbage 0.05
+    ARDUINO_EXTRA_PORTS=/tmp/ttyVIRT0 python backend/app.py
+
+Linux/macOS only (needs a pty).
+"""
+
+import os
+import sys
+import json
+import time
+import tty
+import random
+import select
+import argparse
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from app import ARDUINO_BANNER_STATUS, LineFramer, encode_vitals_frame  # noqa: E402
+
+# Sketch defaults (fake sensor values in readAndSendSensorData)
+BASE_SAMPLE = {"heart_rate": 72, "spo2": 98, "temperature": 36.8, "weight": 70.5, "height": 170.0}
+# Noise scale per channel, multiplied by --noise
+NOISE = {"heart_rate": 3.0, "spo2": 0.7, "temperature": 0.15, "weight": 0.2, "height": 0.3}
+MAX_BAUD = 115200
+GARBAGE_LINES = (
+    b"DEBUG: sensor warmup\r\n",
+    b'{"hr": 7',  # truncated line, runs into the next one
+    b"\x00\xff\xfe\x13\x37\r\n",
+    b"{not json}\r\n",
+    b"\xa5\x5a\x10garbage-frame\r\n",  # stray bin1 sync bytes
+)
+
+
+class VirtualArduino:
+    """One simulated board. run() blocks; start() runs it in a daemon thread."""
+
+    def __init__(self, link=None, device="vitals", rate=1.0, binary_rate=50.0, jitter=0.0,
+                 noise=1.0, garbage=0.0, disconnect_every=0.0, downtime=0.0, bin1=True, seed=None):
+        self.link = link
+        self.device = device
+        self.rate = rate
+        self.binary_rate = binary_rate
+        self.jitter = jitter
+        self.noise = noise
+        self.garbage = garbage
+        self.disconnect_every = disconnect_every
+        self.downtime = downtime
+        self.bin1 = bin1
+        self.random = random.Random(seed)
+        self.path = None
+        self.binary = False
+        self.stats = {"samples": 0, "garbage": 0, "bytes": 0, "connects": 0, "disconnects": 0, "mode_switches": 0}
+        self._stop = threading.Event()
+        self._master = None
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name=f"sim-{self.device}", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        try:
+            while not self._stop.is_set():
+                self._open_pty()
+                self._session()
+                self._close_pty()
+                if self.downtime and not self._stop.is_set():
+                    self._stop.wait(self.downtime)
+        finally:
+            self._close_pty()
+
+    # ------------------------------------------------------------------ pty
+
+    def _open_pty(self):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        os.close(slave)
+        self._master = master
+        if self.link:
+            # Swap the symlink atomically so the reader never sees it missing
+            tmp = f"{self.link}.tmp"
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            os.symlink(self.path, tmp)
+            os.replace(tmp, self.link)
+
+    def _close_pty(self):
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+        if self.link and (self.downtime or self._stop.is_set()) and os.path.lexists(self.link):
+            # Unplugged: the port disappears until the next session
+            os.remove(self.link)
+
+    def _host_attached(self):
+        """The master reports POLLHUP while no one has the slave side open."""
+        poller = select.poll()
+        poller.register(self._master, select.POLLIN)
+        return not any(ev & select.POLLHUP for _, ev in poller.poll(0))
+
+    # -------------------------------------------------------------- session
+
+    def _session(self):
+        """Serve one pty until a simulated disconnect (or stop())."""
+        opened_at = time.monotonic()
+        attached = False
+        framer = LineFramer()
+        next_send = 0.0
+        seq = 0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self.disconnect_every and now - opened_at >= self.disconnect_every:
+                self.stats["disconnects"] += 1
+                return
+
+            if not self._host_attached():
+                # Like a real board, reset when the port is (re)opened: JSON
+                # mode, banner after the host has finished opening the port
+                attached = False
+                self._stop.wait(0.02)
+                continue
+            if not attached:
+                attached = True
+                self.binary = False
+                self.stats["connects"] += 1
+                self._stop.wait(0.1)
+                banner = {"status": ARDUINO_BANNER_STATUS, "device": self.device}
+                if self.bin1:
+                    banner.update(proto=["json", "bin1"], max_baud=MAX_BAUD)
+                if not self._write(json.dumps(banner).encode() + b"\r\n"):
+                    continue
+                next_send = time.monotonic() + self._interval()
+
+            # Wait for a host command or the next sample, whichever is first
+            ready, _, _ = select.select([self._master], [], [], max(0.0, next_send - time.monotonic()))
+            if ready:
+                try:
+                    data = os.read(self._master, 1024)
+                except OSError:
+                    continue  # host closed the port; picked up on the next pass
+                for line in framer.feed(data):
+                    self._handle_command(line)
+                continue
+
+            if self.garbage and self.random.random() < self.garbage:
+                if self._write(self.random.choice(GARBAGE_LINES)):
+                    self.stats["garbage"] += 1
+            seq += 1
+            if self._write(self._encode(self._sample(), seq)):
+                self.stats["samples"] += 1
+            next_send += self._interval()
+            if next_send < time.monotonic():
+                next_send = time.monotonic()  # fell behind (host not reading); don't burst
+
+    def _handle_command(self, line):
+        try:
+            cmd = json.loads(line.decode("utf-8", errors="ignore"))
+        except ValueError:
+            return
+        if not (self.bin1 and isinstance(cmd, dict) and cmd.get("cmd") == "proto" and cmd.get("mode") == "bin1"):
+            return
+        baud = int(cmd.get("baud") or MAX_BAUD)
+        if baud <= 0 or baud > MAX_BAUD:
+            baud = MAX_BAUD
+        self._write(json.dumps({"status": "ok", "mode": "bin1", "baud": baud}).encode() + b"\r\n")
+        self.binary = True
+        self.stats["mode_switches"] += 1
+
+    def _write(self, data):
+        try:
+            os.write(self._master, data)
+        except OSError:
+            return False
+        self.stats["bytes"] += len(data)
+        return True
+
+    # -------------------------------------------------------------- samples
+
+    def _interval(self):
+        base = 1.0 / (self.binary_rate if self.binary else self.rate)
+        return base * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+    def _sample(self):
+        return {
+            name: value + self.random.gauss(0, NOISE[name] * self.noise)
+            for name, value in BASE_SAMPLE.items()
+        }
+
+    def _encode(self, sample, seq):
+        if self.binary:
+            return encode_vitals_frame(sample, seq=seq)
+        # Same keys and precision as the sketch's JSON line
+        return (
+            f'{{"hr": {round(sample["heart_rate"])}, "spo2": {round(sample["spo2"])}, '
+            f'"temp": {sample["temperature"]:.1f}, "weight": {sample["weight"]:.1f}, '
+            f'"height": {sample["height"]:.1f}}}\r\n'
+        ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual Arduino on a pseudo-terminal")
+    parser.add_argument("--link", default="/tmp/ttyVIRT0", help="stable symlink to the pty ('' for none)")
+    parser.add_argument("--device", default="vitals", help='"device" name in the banner')
+    parser.add_argument("--rate", type=float, default=1.0, help="JSON samples per second")
+    parser.add_argument("--binary-rate", type=float, default=50.0, help="bin1 frames per second")
+    parser.add_argument("--jitter", type=float, default=0.0, help="interval jitter as a fraction (0.2 = ±20%%)")
+    parser.add_argument("--noise", type=float, default=1.0, help="sensor noise multiplier (0 = constant values)")
+    parser.add_argument("--garbage", type=float, default=0.0, help="chance of a garbage line before each sample")
+    parser.add_argument("--disconnect-every", type=float, default=0.0, help="drop the link every N seconds")
+    parser.add_argument("--downtime", type=float, default=0.0, help="seconds the port is gone after a drop")
+    parser.add_argument("--no-bin1", action="store_true", help="advertise JSON only, like an old sketch")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable runs")
+    args = parser.parse_args()
+
+    sim = VirtualArduino(
+        link=args.link or None, device=args.device, rate=args.rate, binary_rate=args.binary_rate,
+        jitter=args.jitter, noise=args.noise, garbage=args.garbage, disconnect_every=args.disconnect_every,
+        downtime=args.downtime, bin1=not args.no_bin1, seed=args.seed,
+    )
+    sim.start()
+    while sim.path is None:
+        time.sleep(0.01)
+    port = args.link or sim.path
+    print(f"Virtual Arduino '{args.device}' on {sim.path}" + (f" (link {args.link})" if args.link else ""))
+    print(f"Start the backend with: ARDUINO_EXTRA_PORTS={port} python backend/app.py")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"   {'bin1' if sim.binary else 'json'}: {sim.stats}", flush=True)
+    except KeyboardInterrupt:
+        sim.stop()
+        time.sleep(0.2)
+        print(f"\nStopped: {sim.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,21 @@
 // PIN CONFIGURATION (change if using different pins)
 #define DHT_PIN 2
 
+// Board name reported to the Pi. Give each board its own name when the robot
+// has several (e.g. "scale", "oximeter", "thermometer").
+#define DEVICE_NAME "vitals"
+
 // Timing
 unsigned long lastSampleTime = 0;
 const unsigned long SAMPLE_INTERVAL = 1000;  // Send data every 1 second
+const unsigned long BINARY_SAMPLE_INTERVAL = 20;  // 50 samples/second in binary mode
+
+// Link protocol. Starts as JSON at 9600 baud; the Pi may ask for binary
+// frames at a higher baud (set ARDUINO_PROTOCOL=binary on the Pi).
+const long MAX_BAUD = 115200;
+bool binaryMode = false;
+uint16_t frameSeq = 0;
+String commandLine = "";
 
 // ============================================================================
 // SETUP - Runs once when Arduino starts
@@ -19,7 +31,8 @@ const unsigned long SAMPLE_INTERVAL = 1000;  // Send data every 1 second
 void setup() {
   Serial.begin(9600);  // Start serial at 9600 baud (IMPORTANT!)
   delay(2000);         // Wait for Arduino to initialize
-  Serial.println("{\"status\": \"Arduino started\"}");
+  // The Pi only accepts this port once it sees this banner (keep "status" as is)
+  Serial.println("{\"status\": \"Arduino started\", \"device\": \"" DEVICE_NAME "\", \"proto\": [\"json\", \"bin1\"], \"max_baud\": 115200}");
 }
 
 // ============================================================================
@@ -27,9 +40,11 @@ void setup() {
 // ============================================================================
 void loop() {
   unsigned long currentTime = millis();
-  
-  // Check if 1 second has passed
-  if (currentTime - lastSampleTime >= SAMPLE_INTERVAL) {
+
+  readCommands();
+
+  // Check if 1 second has passed (20 ms in binary mode)
+  if (currentTime - lastSampleTime >= (binaryMode ? BINARY_SAMPLE_INTERVAL : SAMPLE_INTERVAL)) {
     lastSampleTime = currentTime;
     
     // Read sensors (or use fake data for testing)
@@ -61,6 +76,12 @@ void readAndSendSensorData() {
   // DHT dht(DHT_PIN, DHT22);
   // float temperature = dht.readTemperature();
   
+  // ========== BINARY MODE ==========
+  if (binaryMode) {
+    sendBinaryFrame(heartRate, spo2, temperature, weight, height);
+    return;
+  }
+
   // ========== BUILD JSON STRING ==========
   // Format MUST match what Python backend expects:
   // {"hr": X, "spo2": Y, "temp": Z, "weight": W, "height": H}
@@ -81,6 +102,88 @@ void readAndSendSensorData() {
   // Serial.println(jsonData);
 }
 
+// ============================================================================
+// PROTOCOL NEGOTIATION - The Pi may send one line:
+//   {"cmd": "proto", "mode": "bin1", "baud": 115200}
+// We answer in JSON at the current baud, then switch baud and send binary.
+// ============================================================================
+void readCommands() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\n') {
+      handleCommand(commandLine);
+      commandLine = "";
+    } else if (commandLine.length() < 96) {
+      commandLine += c;
+    }
+  }
+}
+
+void handleCommand(String cmd) {
+  if (cmd.indexOf("\"proto\"") < 0 || cmd.indexOf("\"bin1\"") < 0) return;
+
+  long baud = MAX_BAUD;
+  int pos = cmd.indexOf("\"baud\":");
+  if (pos >= 0) baud = cmd.substring(pos + 7).toInt();
+  if (baud <= 0 || baud > MAX_BAUD) baud = MAX_BAUD;
+
+  Serial.print("{\"status\": \"ok\", \"mode\": \"bin1\", \"baud\": ");
+  Serial.print(baud);
+  Serial.println("}");
+  Serial.flush();     // Make sure the reply leaves at the old baud
+  Serial.end();
+  Serial.begin(baud);
+  binaryMode = true;
+}
+
+// ============================================================================
+// BINARY FRAMES - Must match VITALS_FRAME in backend/app.py
+//   A5 5A | len | payload | CRC-16/CCITT-FALSE (little-endian)
+//   payload: type=0x01, seq (u16), present mask (u8), hr (u16), spo2 (u8),
+//            temp (i16, 0.01 C), weight (u16, 0.1 kg), height (u16, 0.1 cm),
+//            bp systolic (u8), bp diastolic (u8)
+// All multi-byte fields are little-endian.
+// ============================================================================
+uint16_t crc16(const uint8_t *data, uint8_t len) {
+  uint16_t crc = 0xFFFF;
+  for (uint8_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
+void putU16(uint8_t *buf, uint8_t pos, uint16_t v) {
+  buf[pos] = v & 0xFF;
+  buf[pos + 1] = v >> 8;
+}
+
+void sendBinaryFrame(int heartRate, int spo2, float temperature, float weight, float height) {
+  const uint8_t PAYLOAD_LEN = 15;
+  uint8_t body[1 + PAYLOAD_LEN];   // length byte + payload (what the CRC covers)
+
+  body[0] = PAYLOAD_LEN;
+  body[1] = 0x01;                  // vitals sample
+  putU16(body, 2, frameSeq++);
+  body[4] = 0x1F;                  // hr, spo2, temp, weight, height present (no BP)
+  putU16(body, 5, heartRate);
+  body[7] = spo2;
+  putU16(body, 8, (uint16_t)(int16_t)(temperature * 100 + (temperature >= 0 ? 0.5 : -0.5)));
+  putU16(body, 10, (uint16_t)(weight * 10 + 0.5));
+  putU16(body, 12, (uint16_t)(height * 10 + 0.5));
+  body[14] = 0;                    // bp systolic
+  body[15] = 0;                    // bp diastolic
+
+  uint16_t crc = crc16(body, sizeof(body));
+  Serial.write(0xA5);
+  Serial.write(0x5A);
+  Serial.write(body, sizeof(body));
+  Serial.write(crc & 0xFF);
+  Serial.write(crc >> 8);
+}
+
 // ============================================================================
 // HELPER FUNCTIONS - Add these as you add sensors
 // ============================================================================
@@ -142,6 +245,8 @@ AFTER UPLOADING:
 2. ✅ Set baud rate to 9600 (bottom right corner)
 3. ✅ You should see JSON data like:
       {"hr": 72, "spo2": 98, "temp": 36.8, "weight": 70.5, "height": 170.0}
+   (The Serial Monitor always sees JSON; binary mode only starts when the
+    Pi asks for it with ARDUINO_PROTOCOL=binary.)
 
 IF YOU DON'T SEE DATA:
 - Check USB cable is connected
@@ -7,17 +7,42 @@ All data stored locally. AI calls go to Gemini API (requires internet).
 """
 
 import os
+import re
+import sys
 import sqlite3
 import json
 import io
 import serial
 import glob
+import gzip
+import fnmatch
+import select
+import struct
+import zlib
+import base64
+import binascii
+import ctypes
+import ctypes.util
 import threading
 import time
+import uuid
+import statistics
+import math
+import copy
+import atexit
+import functools
+import hmac
+import queue
+import logging
+import logging.handlers
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
 from pathlib import Path
 from datetime import datetime
 
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify, send_from_directory, send_file, stream_with_context
 
 # -----------------------------------------------------------------------------
 # CONFIGURATION
@@ -37,125 +62,1524 @@ DOCTOR_PASSWORD = "demo123"
 
 app = Flask(__name__, static_folder=str(FRONTEND_DIR), static_url_path="")
 
+# =============================================================================
+# LOGGING
+# =============================================================================
+
+# Log records are queued by the calling thread and written by one background
+# thread, so request handlers and the serial readers never wait on the SD card.
+LOG_PATH = Path(os.environ.get("LOG_FILE", APP_ROOT / "logs" / "backend.log"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Rotate by size: backend.log plus LOG_BACKUP_COUNT old files at most
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# Records waiting for the writer thread; beyond this new records are dropped
+LOG_QUEUE_SIZE = 10000
+# One summary line per device per this many seconds instead of a line per sample
+LOG_SAMPLE_SUMMARY_SECONDS = 60
+
+logger = logging.getLogger("triage")
+arduino_log = logger.getChild("arduino")
+gemini_log = logger.getChild("gemini")
+
+
+def log_event(log, level, event, **fields):
+    """Log a structured record: an event name plus key=value fields."""
+    log.log(level, event, extra={"fields": fields})
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`2026-01-01T12:00:00 INFO triage.arduino event=connected device=vitals port=/dev/ttyACM0`"""
+
+    def format(self, record):
+        parts = [
+            datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            record.levelname,
+            record.name,
+            f"event={self._value(record.getMessage())}",
+        ]
+        for key, value in getattr(record, "fields", {}).items():
+            parts.append(f"{key}={self._value(value)}")
+        line = " ".join(parts)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+    @staticmethod
+    def _value(value):
+        text = str(value)
+        if not text or any(c in text for c in ' ="\n'):
+            return json.dumps(text)
+        return text
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback now, in the calling thread, but
+        # leave the formatting of the line to the writer thread
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = KeyValueFormatter().formatException(record.exc_info)
+            record.exc_info = None
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {k: v if isinstance(v, (str, int, float, type(None))) else str(v) for k, v in fields.items()}
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampleLogSummary:
+    """
+    Rate-limits the per-sample log: counts samples per device and logs one
+    summary (count and latest values) every LOG_SAMPLE_SUMMARY_SECONDS.
+    """
+
+    def __init__(self, interval=LOG_SAMPLE_SUMMARY_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._last_logged = {}
+
+    def add(self, device_id, snap):
+        now = time.monotonic()
+        with self._lock:
+            count = self._counts.get(device_id, 0) + 1
+            if now - self._last_logged.get(device_id, 0.0) < self.interval:
+                self._counts[device_id] = count
+                return
+            self._counts[device_id] = 0
+            self._last_logged[device_id] = now
+        log_event(
+            arduino_log, logging.INFO, "vitals_summary", device=device_id, samples=count,
+            hr=snap.heart_rate, spo2=snap.spo2, temp=snap.temperature, weight=snap.weight, height=snap.height,
+        )
+
+
+_log_listener = None
+
+
+def setup_logging():
+    """
+    Send all log records (ours, Flask's and werkzeug's) through a queue to a
+    size-rotated file, plus the console when running in a terminal.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    formatter = KeyValueFormatter()
+    handlers = [logging.handlers.RotatingFileHandler(
+        LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8",
+    )]
+    if sys.stderr.isatty():
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _log_listener = logging.handlers.QueueListener(queue.Queue(LOG_QUEUE_SIZE), *handlers)
+    root = logging.getLogger()
+    root.addHandler(DroppingQueueHandler(_log_listener.queue))
+    root.setLevel(LOG_LEVEL)
+    _log_listener.start()
+
 # =============================================================================
 # ARDUINO SERIAL CONFIGURATION & LIVE VITALS READING
 # =============================================================================
 
-# Global variable to store latest Arduino data
-latest_arduino_data = {
-    "heart_rate": None,
-    "spo2": None,
-    "temperature": None,
-    "weight": None,
-    "height": None,
-    "timestamp": None,
-    "status": "disconnected"
-}
+class VitalsSnapshot(namedtuple(
+    "VitalsSnapshot",
+    "seq heart_rate spo2 temperature weight height blood_pressure timestamp status",
+    defaults=(0, None, None, None, None, None, None, None, "disconnected"),
+)):
+    """
+    One complete, immutable reading of the live vitals. Writers build the
+    next snapshot (seq + 1) and publish it with a single reference swap, so
+    request threads always see values that belong together, without locks.
+    """
+
+    __slots__ = ()
+
+    def advance(self, **changes):
+        """Return the next snapshot with `changes` applied."""
+        return self._replace(seq=self.seq + 1, **changes)
+
+    def as_dict(self):
+        return self._asdict()
 
-def read_arduino_data():
+
+# Latest Arduino data (merged across boards). Replaced, never mutated.
+latest_vitals = VitalsSnapshot()
+# Serialises writers building the next snapshot; readers never take it
+_vitals_lock = threading.Lock()
+# Distinguishes snapshot seq numbers across server restarts (used in ETags)
+_VITALS_BOOT_ID = format(int(time.time()), "x")
+
+# Numeric sensor channels kept in the sample history (blood pressure is text)
+VITALS_CHANNELS = ("heart_rate", "spo2", "temperature", "weight", "height")
+
+# Samples kept per channel. At 1 sample/s this is over an hour of history,
+# and still several minutes if the sketch streams much faster.
+VITALS_BUFFER_CAPACITY = 4096
+
+
+class SampleRing:
     """
-    Read vitals from Arduino via USB serial.
-    Expects JSON format from Arduino: {"hr": 72, "spo2": 98, "temp": 36.5, "weight": 70, "height": 170}
-    Runs in background thread.
+    Fixed-capacity ring of (timestamp, value) samples for one sensor channel.
+    Backed by two preallocated float arrays, so appending never allocates.
     """
-    ser = None
-    while True:
+
+    __slots__ = ("capacity", "_ts", "_values", "_head", "_count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._ts = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._head = 0  # index of the next slot to write
+        self._count = 0
+
+    def append(self, ts, value):
+        self._ts[self._head] = ts
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def values_since(self, since, until=None):
+        """Return values with since <= timestamp (<= until), oldest first."""
+        out = []
+        idx = self._head
+        for _ in range(self._count):
+            idx = (idx - 1) % self.capacity
+            ts = self._ts[idx]
+            if ts < since:
+                break
+            if until is None or ts <= until:
+                out.append(self._values[idx])
+        out.reverse()
+        return out
+
+    def latest_ts(self):
+        """Timestamp of the newest sample, or None if empty."""
+        return self._ts[(self._head - 1) % self.capacity] if self._count else None
+
+
+class VitalsBuffer:
+    """Per-channel sample history for live Arduino vitals, safe across threads."""
+
+    def __init__(self, channels=VITALS_CHANNELS, capacity=VITALS_BUFFER_CAPACITY):
+        self._lock = threading.Lock()
+        self._rings = {name: SampleRing(capacity) for name in channels}
+
+    def add_sample(self, ts, values):
+        """Record one sample. `values` maps channel name -> number (None is skipped)."""
+        with self._lock:
+            for name, value in values.items():
+                ring = self._rings.get(name)
+                if ring is not None and value is not None:
+                    ring.append(ts, float(value))
+
+    def window(self, since, until=None):
+        """
+        Values per channel recorded between `since` and `until`, plus the
+        timestamp of each channel's newest sample in that range.
+        """
+        with self._lock:
+            values = {name: ring.values_since(since, until) for name, ring in self._rings.items()}
+            newest = {name: ring.latest_ts() for name, ring in self._rings.items()}
+        if until is not None:
+            # Newest sample may lie after the window; only report it if inside
+            newest = {name: ts if ts is not None and ts <= until else None for name, ts in newest.items()}
+        return values, newest
+
+    def window_stats(self, seconds, now=None):
+        """Mean, median, min, max and count per channel over the last `seconds`."""
+        since = (now if now is not None else time.time()) - seconds
+        with self._lock:
+            windows = {name: ring.values_since(since) for name, ring in self._rings.items()}
+
+        stats = {}
+        for name, values in windows.items():
+            if values:
+                stats[name] = {
+                    "mean": sum(values) / len(values),
+                    "median": statistics.median(values),
+                    "min": min(values),
+                    "max": max(values),
+                    "count": len(values),
+                }
+            else:
+                stats[name] = {"mean": None, "median": None, "min": None, "max": None, "count": 0}
+        return stats
+
+
+vitals_buffer = VitalsBuffer()
+
+
+# Events kept for Last-Event-ID replay, and per-client queue depth. A client
+# that falls further behind than the queue loses its oldest events, so a slow
+# kiosk browser can never block the serial reader.
+VITALS_EVENT_LOG_SIZE = 512
+VITALS_CLIENT_QUEUE_SIZE = 64
+
+
+class _StreamClient:
+    """Pending events for one connected SSE client."""
+
+    __slots__ = ("events", "wakeup", "dropped")
+
+    def __init__(self, maxlen):
+        self.events = deque(maxlen=maxlen)
+        self.wakeup = threading.Event()
+        self.dropped = 0
+
+
+class VitalsEventBroker:
+    """
+    Fan-out of live Arduino events (vitals samples and status changes) to
+    Server-Sent Events clients. Publishing never blocks: each client has a
+    bounded queue that drops its oldest entries when the client is slow.
+    """
+
+    def __init__(self, log_size=VITALS_EVENT_LOG_SIZE, queue_size=VITALS_CLIENT_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._log = deque(maxlen=log_size)
+        self._clients = set()
+        self._queue_size = queue_size
+        self._next_id = 1
+
+    def publish(self, event, data):
+        """Record an event and hand it to every connected client."""
+        payload = json.dumps(data)
+        with self._lock:
+            item = (self._next_id, event, payload)
+            self._next_id += 1
+            self._log.append(item)
+            clients = list(self._clients)
+        for client in clients:
+            if len(client.events) == client.events.maxlen:
+                client.dropped += 1
+            client.events.append(item)
+            client.wakeup.set()
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a client. Returns (client, backlog) where backlog holds the
+        logged events after `last_event_id`, or None if they are no longer
+        available (the caller should then send a fresh snapshot).
+        """
+        client = _StreamClient(self._queue_size)
+        with self._lock:
+            self._clients.add(client)
+            backlog = None
+            if last_event_id is not None and self._log:
+                oldest, newest = self._log[0][0], self._log[-1][0]
+                if oldest - 1 <= last_event_id <= newest:
+                    backlog = [item for item in self._log if item[0] > last_event_id]
+        return client, backlog
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def client_count(self):
+        with self._lock:
+            return len(self._clients)
+
+
+vitals_events = VitalsEventBroker()
+
+
+def _set_arduino_status(status):
+    """Update the connection status and notify stream clients when it changes."""
+    global latest_vitals
+    with _vitals_lock:
+        if latest_vitals.status != status:
+            latest_vitals = latest_vitals.advance(status=status)
+            vitals_events.publish("status", {"status": status, "seq": latest_vitals.seq})
+
+
+# Serial settings for the Arduino link
+ARDUINO_BAUD = 9600
+# Upper bound on how long a read blocks while the Arduino is idle. The reader
+# sleeps in the OS for this long instead of polling in_waiting.
+ARDUINO_READ_TIMEOUT = 1.0
+# A "line" longer than this without a newline is garbage (wrong baud, noise)
+ARDUINO_MAX_LINE = 1024
+# Wire protocol: "json" (default, one JSON object per line) or "binary"
+# (CRC-checked frames at ARDUINO_FAST_BAUD). Binary is only used when the
+# sketch advertises it in its startup banner; otherwise we stay on JSON.
+ARDUINO_PROTOCOL = os.environ.get("ARDUINO_PROTOCOL", "json").lower()
+ARDUINO_FAST_BAUD = int(os.environ.get("ARDUINO_FAST_BAUD", "115200"))
+
+
+class LineFramer:
+    """
+    Incremental newline framing for a byte stream. Bytes are fed as they
+    arrive; complete lines are returned and a trailing partial line is kept
+    until the rest of it shows up.
+    """
+
+    __slots__ = ("_buf", "max_line")
+
+    def __init__(self, max_line=ARDUINO_MAX_LINE):
+        self._buf = bytearray()
+        self.max_line = max_line
+
+    def feed(self, chunk):
+        """Add received bytes and return the list of complete lines (without b"\n")."""
+        self._buf += chunk
+        if b"\n" not in chunk:
+            if len(self._buf) > self.max_line:
+                self._buf.clear()
+            return []
+        *lines, rest = self._buf.split(b"\n")
+        self._buf = bytearray(rest if len(rest) <= self.max_line else b"")
+        return lines
+
+    def clear(self):
+        self._buf.clear()
+
+
+# How long a candidate port gets to print the sketch's startup banner. Opening
+# the port resets the board, and the sketch waits 2 s before printing it.
+ARDUINO_HANDSHAKE_TIMEOUT = 4.0
+ARDUINO_BANNER_STATUS = "Arduino started"
+# Ports probed at once during discovery
+ARDUINO_PROBE_WORKERS = 16
+# How long a probe blocks on a silent port before it checks again whether it
+# was cancelled or the board was unplugged
+ARDUINO_PROBE_POLL = 0.25
+# Times a board whose device node is still present gets reopened by its own
+# reader before it is handed back to discovery
+ARDUINO_REOPEN_ATTEMPTS = 3
+# Device nodes that appear when a USB board is plugged in
+ARDUINO_HOTPLUG_PATTERNS = ("ttyACM*", "ttyUSB*")
+# Rescan interval with no device: long when /dev is watched for hotplug,
+# short when we have to fall back to polling
+ARDUINO_RESCAN_INTERVAL = 30
+ARDUINO_RESCAN_INTERVAL_NO_HOTPLUG = 3
+# Extra ports to probe first, comma-separated (e.g. a virtual Arduino from
+# arduino_simulator.py: ARDUINO_EXTRA_PORTS=/tmp/ttyVIRT0)
+ARDUINO_EXTRA_PORTS = [p.strip() for p in os.environ.get("ARDUINO_EXTRA_PORTS", "").split(",") if p.strip()]
+
+
+def _candidate_ports():
+    """Serial ports that might be the Arduino (Linux/Windows)."""
+    ports = []
+    try:
+        ports = sorted(glob.glob('/dev/ttyACM*') + glob.glob('/dev/ttyUSB*') + glob.glob('/dev/ttyS*'))
+    except Exception:
+        ports = ['/dev/ttyUSB0', '/dev/ttyACM0', '/dev/ttyAMA0', 'COM3', 'COM4']
+    return ARDUINO_EXTRA_PORTS + [p for p in ports if p not in ARDUINO_EXTRA_PORTS]
+
+
+def _json_object(raw):
+    """Decode one line as a JSON object, or return None."""
+    try:
+        data = json.loads(raw.decode('utf-8', errors='ignore').strip())
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _port_present(port):
+    """False once the device node behind `port` is gone (COM names can't be checked)."""
+    return not os.path.isabs(port) or os.path.exists(port)
+
+
+def _probe_arduino_port(port, cancel=None):
+    """
+    Open `port` and wait for the {"status": "Arduino started"} banner.
+    Returns (serial.Serial, banner dict) on success, otherwise None.
+    Gives up within ARDUINO_PROBE_POLL when the optional `cancel` event is
+    set or the port's device node disappears (board unplugged mid-probe).
+    """
+    try:
+        ser = serial.Serial(port, ARDUINO_BAUD, timeout=ARDUINO_PROBE_POLL)
+    except (serial.SerialException, OSError, ValueError):
+        return None
+
+    framer = LineFramer()
+    deadline = time.monotonic() + ARDUINO_HANDSHAKE_TIMEOUT
+    try:
+        while time.monotonic() < deadline:
+            if (cancel is not None and cancel.is_set()) or not _port_present(port):
+                break
+            chunk = ser.read(ser.in_waiting or 1)
+            for line in framer.feed(chunk) if chunk else ():
+                banner = _json_object(line)
+                if banner and banner.get("status") == ARDUINO_BANNER_STATUS:
+                    ser.timeout = ARDUINO_READ_TIMEOUT
+                    return ser, banner
+    except (serial.SerialException, OSError):
+        pass
+    ser.close()
+    return None
+
+
+def _probe_ports(ports, cancel=None):
+    """
+    Probe all `ports` concurrently. Returns [(port, serial.Serial, banner)]
+    for every port that completed the handshake, or [] if `cancel` was set
+    meanwhile (ports that did answer are closed again).
+    """
+    if not ports:
+        return []
+    probe = functools.partial(_probe_arduino_port, cancel=cancel)
+    with ThreadPoolExecutor(max_workers=min(len(ports), ARDUINO_PROBE_WORKERS)) as pool:
+        results = list(pool.map(probe, ports))
+    found = [(port, *result) for port, result in zip(ports, results) if result is not None]
+    if cancel is not None and cancel.is_set():
+        for _, ser, _ in found:
+            ser.close()
+        return []
+    return found
+
+
+class DeviceNodeWatcher:
+    """
+    Wait for serial device nodes to show up in /dev, using inotify on Linux.
+    Elsewhere (or if inotify is unavailable) wait() just sleeps, which keeps
+    the old timed-rescan behaviour.
+    """
+
+    IN_ATTRIB = 0x004
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    _EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self, directory="/dev", patterns=ARDUINO_HOTPLUG_PATTERNS):
+        self.directory = directory
+        self.patterns = patterns
+        self._fd = None
         try:
-            if ser is None or not ser.is_open:
-                # Auto-detect common serial ports (Linux/Windows)
-                ports = []
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return
+            mask = self.IN_CREATE | self.IN_ATTRIB | self.IN_MOVED_TO
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                return
+            self._fd = fd
+        except (OSError, AttributeError, TypeError):
+            self._fd = None
+
+    @property
+    def available(self):
+        return self._fd is not None
+
+    def wait(self, timeout, cancel=None):
+        """
+        Block until a matching device node appears, `timeout` passes or the
+        optional `cancel` event is set. Returns the set of new node paths
+        (empty if nothing was plugged in).
+        """
+        cancel = cancel or threading.Event()
+        if self._fd is None:
+            cancel.wait(timeout)
+            return set()
+        deadline = time.monotonic() + timeout
+        while not cancel.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            ready, _, _ = select.select([self._fd], [], [], min(remaining, ARDUINO_PROBE_POLL))
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 4096)
+            except BlockingIOError:
+                continue
+            found = {
+                os.path.join(self.directory, name) for name in self._names(data)
+                if any(fnmatch.fnmatch(name, pat) for pat in self.patterns)
+            }
+            if found:
+                # udev fixes up permissions just after creating the node
+                cancel.wait(0.5)
+                return found
+        return set()
+
+    def _names(self, data):
+        offset = 0
+        while offset + self._EVENT_HEADER.size <= len(data):
+            _, _, _, length = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += self._EVENT_HEADER.size
+            yield data[offset:offset + length].rstrip(b"\0").decode(errors="ignore")
+            offset += length
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# -----------------------------------------------------------------------------
+# Binary frame protocol ("bin1")
+#   A5 5A | len (1 byte) | payload (len bytes) | CRC-16/CCITT-FALSE (2 bytes, LE)
+# The CRC covers the length byte and the payload. Payload type 0x01 is a
+# vitals sample, see VITALS_FRAME below. Must match arduino_test_sketch.ino.
+# -----------------------------------------------------------------------------
+FRAME_SYNC = b"\xa5\x5a"
+FRAME_TYPE_VITALS = 0x01
+# type, seq, present-mask, hr (bpm), spo2 (%), temp (0.01 °C),
+# weight (0.1 kg), height (0.1 cm), bp systolic, bp diastolic (mmHg)
+VITALS_FRAME = struct.Struct("<BHBHBhHHBB")
+_PRESENT_HR, _PRESENT_SPO2, _PRESENT_TEMP = 0x01, 0x02, 0x04
+_PRESENT_WEIGHT, _PRESENT_HEIGHT, _PRESENT_BP = 0x08, 0x10, 0x20
+
+
+def _frame_crc(body):
+    return binascii.crc_hqx(body, 0xFFFF)
+
+
+def encode_vitals_frame(sample, seq=0):
+    """Build a bin1 vitals frame from a sample dict (used by tests and simulators)."""
+    mask = 0
+    hr = spo2 = temp = weight = height = sys_bp = dia_bp = 0
+    if sample.get("heart_rate") is not None:
+        mask |= _PRESENT_HR
+        hr = int(sample["heart_rate"])
+    if sample.get("spo2") is not None:
+        mask |= _PRESENT_SPO2
+        spo2 = int(sample["spo2"])
+    if sample.get("temperature") is not None:
+        mask |= _PRESENT_TEMP
+        temp = round(sample["temperature"] * 100)
+    if sample.get("weight") is not None:
+        mask |= _PRESENT_WEIGHT
+        weight = round(sample["weight"] * 10)
+    if sample.get("height") is not None:
+        mask |= _PRESENT_HEIGHT
+        height = round(sample["height"] * 10)
+    if sample.get("blood_pressure"):
+        mask |= _PRESENT_BP
+        sys_bp, dia_bp = (int(x) for x in str(sample["blood_pressure"]).split("/"))
+    payload = VITALS_FRAME.pack(FRAME_TYPE_VITALS, seq & 0xFFFF, mask, hr, spo2, temp, weight, height, sys_bp, dia_bp)
+    body = bytes([len(payload)]) + payload
+    return FRAME_SYNC + body + _frame_crc(body).to_bytes(2, "little")
+
+
+def decode_vitals_frame(payload):
+    """Turn a bin1 vitals payload into a sample dict, or None for other frame types."""
+    if len(payload) != VITALS_FRAME.size or payload[0] != FRAME_TYPE_VITALS:
+        return None
+    _, _, mask, hr, spo2, temp, weight, height, sys_bp, dia_bp = VITALS_FRAME.unpack(payload)
+    sample = {}
+    if mask & _PRESENT_HR:
+        sample["heart_rate"] = hr
+    if mask & _PRESENT_SPO2:
+        sample["spo2"] = spo2
+    if mask & _PRESENT_TEMP:
+        sample["temperature"] = temp / 100
+    if mask & _PRESENT_WEIGHT:
+        sample["weight"] = weight / 10
+    if mask & _PRESENT_HEIGHT:
+        sample["height"] = height / 10
+    if mask & _PRESENT_BP:
+        sample["blood_pressure"] = f"{sys_bp}/{dia_bp}"
+    return sample
+
+
+class BinaryFrameDecoder:
+    """
+    Incremental decoder for bin1 frames. Like LineFramer, feed() takes raw
+    bytes and returns complete frame payloads; noise and frames with a bad
+    CRC are skipped by resynchronising on the next sync marker.
+    """
+
+    __slots__ = ("_buf", "crc_errors")
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.crc_errors = 0
+
+    def feed(self, chunk):
+        buf = self._buf
+        buf += chunk
+        payloads = []
+        while True:
+            start = buf.find(FRAME_SYNC)
+            if start < 0:
+                # Keep a trailing first sync byte; the second may be in the next chunk
+                del buf[:-1 if buf.endswith(FRAME_SYNC[:1]) else len(buf)]
+                break
+            if start:
+                del buf[:start]
+            if len(buf) < 3:
+                break
+            end = 3 + buf[2] + 2
+            if len(buf) < end:
+                break
+            body = bytes(buf[2:end - 2])
+            if _frame_crc(body) == int.from_bytes(buf[end - 2:end], "little"):
+                payloads.append(body[1:])
+                del buf[:end]
+            else:
+                self.crc_errors += 1
+                del buf[:2]
+        return payloads
+
+    def clear(self):
+        self._buf.clear()
+
+
+def parse_arduino_json(raw):
+    """
+    Parse one JSON line from the Arduino into a sample dict, or None.
+    Expects JSON format from Arduino: {"hr": 72, "spo2": 98, "temp": 36.5, "weight": 70, "height": 170}
+    """
+    data = _json_object(raw)
+    if data is None:
+        return None
+
+    # Support multiple key formats from Arduino (hr vs heart_rate, temp vs temperature)
+    hr = data.get('hr') or data.get('heart_rate') or data.get('heartRate')
+    spo2 = data.get('spo2') or data.get('SpO2') or data.get('spo2_percent')
+    temp = data.get('temp') or data.get('temperature')
+    weight = data.get('weight')
+    height = data.get('height')
+    bp = data.get('blood_pressure') or data.get('bp')
+
+    # Only lines with at least one core sensor value count as a sample
+    if hr is None and spo2 is None and temp is None:
+        return None
+    sample = {}
+    try:
+        if hr is not None:
+            sample['heart_rate'] = int(hr)
+        if spo2 is not None:
+            sample['spo2'] = int(spo2)
+        if temp is not None:
+            sample['temperature'] = float(temp)
+        if weight is not None:
+            sample['weight'] = float(weight)
+        if height is not None:
+            sample['height'] = float(height)
+        if bp is not None:
+            sample['blood_pressure'] = str(bp)
+    except (ValueError, TypeError):
+        # Skip invalid numeric conversions
+        return None
+    return sample
+
+
+_sample_log = SampleLogSummary()
+
+
+def _apply_arduino_sample(sample, device=None):
+    """
+    Update the live vitals state from one decoded sample: the sending
+    device's own state, and the merged kiosk view where the newest value of
+    each channel wins, whichever board it came from.
+    """
+    global latest_vitals
+    ts = time.time()
+    now = datetime.now().isoformat()
+    # Keep only the channels present in this sample in the history
+    if device is not None:
+        device.record_sample(sample, ts, now)
+    vitals_recorder.record(device.device_id if device is not None else "kiosk", ts, sample)
+    with _vitals_lock:
+        previous = latest_vitals
+        snap = latest_vitals = previous.advance(timestamp=now, status="connected", **sample)
+        if previous.status != "connected":
+            vitals_events.publish("status", {"status": "connected", "seq": snap.seq})
+        vitals_buffer.add_sample(ts, sample)
+        payload = _arduino_vitals_payload(snap)
+        payload["device"] = device.device_id if device is not None else None
+        vitals_events.publish("vitals", payload)
+    _sample_log.add(device.device_id if device is not None else "kiosk", snap)
+
+
+def handle_arduino_line(raw, device=None):
+    """Parse one JSON line from the Arduino and update the live vitals state."""
+    sample = parse_arduino_json(raw)
+    if sample is not None:
+        _apply_arduino_sample(sample, device)
+    return sample
+
+
+def handle_arduino_frame(payload, device=None):
+    """Decode one bin1 frame payload and update the live vitals state."""
+    sample = decode_vitals_frame(payload)
+    if sample is not None:
+        _apply_arduino_sample(sample, device)
+    return sample
+
+
+def _negotiate_protocol(ser, banner):
+    """
+    Ask the sketch to switch to binary frames at a higher baud rate, if
+    ARDUINO_PROTOCOL is "binary" and the banner says the sketch supports it.
+    Returns "binary" once the sketch acknowledges, otherwise "json".
+    """
+    if ARDUINO_PROTOCOL != "binary" or "bin1" not in (banner.get("proto") or []):
+        return "json"
+    baud = min(ARDUINO_FAST_BAUD, int(banner.get("max_baud") or ARDUINO_BAUD))
+    ser.write(json.dumps({"cmd": "proto", "mode": "bin1", "baud": baud}).encode() + b"\n")
+
+    framer = LineFramer()
+    deadline = time.monotonic() + ARDUINO_HANDSHAKE_TIMEOUT
+    while time.monotonic() < deadline:
+        chunk = ser.read(ser.in_waiting or 1)
+        for line in framer.feed(chunk) if chunk else ():
+            reply = _json_object(line)
+            if reply and reply.get("status") == "ok" and reply.get("mode") == "bin1":
+                ser.baudrate = baud
+                ser.reset_input_buffer()
+                log_event(arduino_log, logging.INFO, "protocol_switched", mode="bin1", baud=baud)
+                return "binary"
+    log_event(arduino_log, logging.WARNING, "protocol_not_acknowledged", mode="json")
+    return "json"
+
+
+class ArduinoDevice:
+    """
+    One board on one serial port: its own reader thread, latest reading,
+    sample history and health counters. A slow or failing board only ever
+    blocks its own thread.
+    """
+
+    def __init__(self, manager, device_id, port):
+        self.manager = manager
+        self.device_id = device_id
+        self.port = port
+        self.protocol = None
+        # Only this device's reader thread replaces the snapshot
+        self.snapshot = VitalsSnapshot()
+        self.buffer = VitalsBuffer()
+        self.health = {
+            "samples": 0,
+            "skipped_frames": 0,  # lines/frames that were not a vitals sample
+            "crc_errors": 0,
+            "bytes_read": 0,
+            "reconnects": 0,
+            "connected_since": None,
+            "last_sample_at": None,
+            "last_error": None,
+        }
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def status(self):
+        return self.snapshot.status
+
+    def attach(self, ser, banner):
+        """Start reading from a port that has already sent the banner."""
+        if self.health["connected_since"] is not None:
+            self.health["reconnects"] += 1
+        self._thread = threading.Thread(
+            target=self._run, args=(ser, banner), name=f"arduino-{self.device_id}", daemon=True
+        )
+        self._thread.start()
+
+    def record_sample(self, sample, ts, now):
+        self.snapshot = self.snapshot.advance(timestamp=now, **sample)
+        self.buffer.add_sample(ts, sample)
+        self.health["samples"] += 1
+        self.health["last_sample_at"] = now
+
+    def describe(self):
+        """Status, health counters and latest reading, for the API."""
+        return {
+            "device": self.device_id,
+            "port": self.port,
+            "status": self.status,
+            "protocol": self.protocol,
+            "health": dict(self.health),
+            "vitals": self.snapshot.as_dict(),
+        }
+
+    def _set_status(self, status):
+        self.snapshot = self.snapshot.advance(status=status)
+        self.manager.refresh_status()
+
+    def _run(self, ser, banner):
+        while ser is not None:
+            try:
+                self._read_loop(ser, banner)
+            except (serial.SerialException, OSError) as e:
+                # Unplugged boards surface as SerialException or EIO
+                log_event(arduino_log, logging.WARNING, "disconnected", device=self.device_id, error=e)
+                self.health["last_error"] = str(e)
+            except Exception as e:
+                arduino_log.exception("read_error", extra={"fields": {"device": self.device_id}})
+                self.health["last_error"] = str(e)
+            finally:
                 try:
-                    ports = sorted(glob.glob('/dev/ttyACM*') + glob.glob('/dev/ttyUSB*') + glob.glob('/dev/ttyS*'))
+                    ser.close()
                 except Exception:
-                    ports = ['/dev/ttyUSB0', '/dev/ttyACM0', '/dev/ttyAMA0', 'COM3', 'COM4']
-
-                connected = False
-                for port in ports:
-                    try:
-                        ser = serial.Serial(port, 9600, timeout=2)
-                        time.sleep(2)  # Wait for Arduino to initialize
-                        print(f"✓ Arduino connected on {port}")
-                        latest_arduino_data["status"] = "connected"
-                        connected = True
-                        break
-                    except serial.SerialException:
-                        ser = None
-                        continue
+                    pass
+            self._set_status("disconnected")
 
-                if not connected:
-                    latest_arduino_data["status"] = "disconnected"
-                    time.sleep(3)
-                    continue
-            
-            if ser.in_waiting > 0:
-                try:
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        data = json.loads(line)
-                        # Support multiple key formats from Arduino (hr vs heart_rate, temp vs temperature)
-                        hr = data.get('hr') or data.get('heart_rate') or data.get('heartRate')
-                        spo2 = data.get('spo2') or data.get('SpO2') or data.get('spo2_percent')
-                        temp = data.get('temp') or data.get('temperature')
-                        weight = data.get('weight')
-                        height = data.get('height')
-                        bp = data.get('blood_pressure') or data.get('bp')
-
-                        # Update global data if at least one core sensor value exists
-                        if hr is not None or spo2 is not None or temp is not None:
-                            try:
-                                if hr is not None:
-                                    latest_arduino_data['heart_rate'] = int(hr)
-                                if spo2 is not None:
-                                    latest_arduino_data['spo2'] = int(spo2)
-                                if temp is not None:
-                                    latest_arduino_data['temperature'] = float(temp)
-                                if weight is not None:
-                                    latest_arduino_data['weight'] = float(weight)
-                                if height is not None:
-                                    latest_arduino_data['height'] = float(height)
-                                if bp is not None:
-                                    latest_arduino_data['blood_pressure'] = str(bp)
-
-                                latest_arduino_data['timestamp'] = datetime.now().isoformat()
-                                latest_arduino_data['status'] = 'connected'
-                                print(f"✓ Arduino vitals: HR={latest_arduino_data.get('heart_rate')} SpO2={latest_arduino_data.get('spo2')}% Temp={latest_arduino_data.get('temperature')}°C W={latest_arduino_data.get('weight')}kg H={latest_arduino_data.get('height')}cm")
-                            except (ValueError, TypeError):
-                                # Skip invalid numeric conversions but keep status connected
-                                latest_arduino_data['status'] = 'connected'
-                except (json.JSONDecodeError, ValueError, KeyError) as e:
-                    # If JSON can't be parsed, still mark port connected
-                    latest_arduino_data['status'] = 'connected'
-        except serial.SerialException as e:
-            print(f"Arduino disconnected: {e}")
-            latest_arduino_data["status"] = "disconnected"
+            # If the device node is still there the error was transient: reopen
+            # it ourselves. Otherwise leave it to discovery and hotplug events.
             ser = None
-            time.sleep(2)
-        except Exception as e:
-            print(f"Arduino read error: {e}")
-            time.sleep(2)
+            stopping = self.manager.stopping
+            for _ in range(ARDUINO_REOPEN_ATTEMPTS):
+                if not _port_present(self.port) or stopping.wait(2):
+                    break
+                result = _probe_arduino_port(self.port, cancel=stopping)
+                if result is not None:
+                    ser, banner = result
+                    self.health["reconnects"] += 1
+                    break
+
+    def _read_loop(self, ser, banner):
+        self.protocol = _negotiate_protocol(ser, banner)
+        if self.protocol == "binary":
+            framer, handle = BinaryFrameDecoder(), handle_arduino_frame
+        else:
+            framer, handle = LineFramer(), handle_arduino_line
+        self.health["connected_since"] = datetime.now().isoformat()
+        self._set_status("connected")
+
+        crc_errors = 0
+        while not self.manager.stopping.is_set():
+            # Take everything already buffered, or block for the next byte
+            chunk = ser.read(ser.in_waiting or 1)
+            if not chunk:
+                continue
+            self.health["bytes_read"] += len(chunk)
+            for item in framer.feed(chunk):
+                if handle(item, self) is None:
+                    self.health["skipped_frames"] += 1
+            if self.protocol == "binary" and framer.crc_errors != crc_errors:
+                self.health["crc_errors"] += framer.crc_errors - crc_errors
+                crc_errors = framer.crc_errors
+
+
+class ArduinoDeviceManager:
+    """
+    Finds Arduino boards and runs one ArduinoDevice reader per port (e.g.
+    separate scale, pulse oximeter and thermometer boards). Devices are named
+    by the "device" field of their banner, or by port if the sketch has none.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}
+        # Set by stop(): cancels probes in flight and ends every reader
+        self.stopping = threading.Event()
+
+    def get(self, device_id):
+        with self._lock:
+            return self._devices.get(device_id)
+
+    def devices(self):
+        with self._lock:
+            return list(self._devices.values())
 
-# Start Arduino reading in background thread (daemon mode)
-arduino_thread = threading.Thread(target=read_arduino_data, daemon=True)
-arduino_thread.start()
-print("Arduino reader thread started...")
+    def refresh_status(self):
+        """The kiosk counts as connected while any board is."""
+        connected = any(d.status == "connected" for d in self.devices())
+        _set_arduino_status("connected" if connected else "disconnected")
+
+    def discover(self, ports=None):
+        """
+        Probe unclaimed ports (all candidates by default) and attach every
+        board that answers. The last good port of each board seen before is
+        probed on its own first: a board that comes back there is reading
+        again in about the time of its banner, instead of waiting out the
+        handshake timeout of every silent candidate.
+        """
+        if ports is None:
+            ports = _candidate_ports()
+        claimed = {d.port for d in self.devices() if d.active}
+        last_good = {d.port for d in self.devices() if not d.active}
+        ports = [p for p in ports if p not in claimed]
+        for batch in ([p for p in ports if p in last_good], [p for p in ports if p not in last_good]):
+            for port, ser, banner in _probe_ports(batch, cancel=self.stopping):
+                self._attach(port, ser, banner)
+
+    def _attach(self, port, ser, banner):
+        name = str(banner.get("device") or os.path.basename(port))
+        with self._lock:
+            device = self._devices.get(name)
+            if device is not None and device.active and device.port != port:
+                # Two boards flashed with the same name: keep them apart by port
+                name = f"{name}@{os.path.basename(port)}"
+                device = self._devices.get(name)
+            if device is None:
+                device = ArduinoDevice(self, name, port)
+                self._devices[name] = device
+            device.port = port
+        log_event(arduino_log, logging.INFO, "connected", device=name, port=port)
+        device.attach(ser, banner)
+
+    def run(self):
+        """Discovery loop, until stop(). Runs in background thread."""
+        watcher = DeviceNodeWatcher()
+        rescan = ARDUINO_RESCAN_INTERVAL if watcher.available else ARDUINO_RESCAN_INTERVAL_NO_HOTPLUG
+        ports = None
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self.discover(ports)
+                except Exception as e:
+                    arduino_log.exception("discovery_error")
+                self.refresh_status()
+
+                # Sleep until a board is plugged in (or the periodic full rescan).
+                # On hotplug, ports of boards we have seen before are tried along
+                # with the new nodes instead of probing every candidate.
+                new_nodes = watcher.wait(rescan, cancel=self.stopping)
+                if new_nodes:
+                    known = {d.port for d in self.devices() if not d.active}
+                    ports = sorted(known | new_nodes)
+                else:
+                    ports = None
+        finally:
+            watcher.close()
+
+    def stop(self, timeout=None):
+        """Cancel discovery and probes, and wait for every reader to close its port."""
+        self.stopping.set()
+        for device in self.devices():
+            thread = device._thread
+            if thread is not None:
+                thread.join(timeout)
+
+
+arduino_devices = ArduinoDeviceManager()
+
+
+def start_arduino_reader():
+    """Start Arduino discovery and reading in background thread (daemon mode)."""
+    thread = threading.Thread(target=arduino_devices.run, name="arduino-discovery", daemon=True)
+    thread.start()
+    vitals_recorder.start()
+    log_event(arduino_log, logging.INFO, "reader_started")
+    return thread
 
 # =============================================================================
 # DATABASE HELPERS
 # =============================================================================
 
 
+# Idle connections kept open for reuse; extra ones are closed when released
+DB_POOL_SIZE = 8
+# Seconds a writer waits for another writer's lock before "database is locked"
+DB_BUSY_TIMEOUT = 5.0
+# Prepared statements cached per connection (sqlite3 default is 128)
+DB_STATEMENT_CACHE = 256
+# Applied to every new connection. WAL lets dashboard reads run while the
+# kiosk writes; NORMAL only fsyncs at checkpoints, which is safe in WAL mode.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",  # KiB, i.e. 8 MB page cache per connection
+    "PRAGMA mmap_size=67108864",  # 64 MB
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _connect_db(path, **kwargs):
+    """Open a new connection with DB_PRAGMAS applied."""
+    conn = sqlite3.connect(
+        path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE, **kwargs,
+    )
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PooledConnection:
+    """
+    A pooled sqlite3 connection. Behaves like the connection itself, except
+    that close() hands it back to the pool instead of closing the file.
+    """
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def __setattr__(self, name, value):
+        if name in PooledConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw(), name, value)
+
+    def __enter__(self):
+        return self._raw().__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def _raw(self):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        # A route that forgot close() still returns its connection
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of tuned SQLite connections to one database file."""
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle = []
+        self._in_use = 0
+        self.stats = {"opened": 0, "reused": 0, "closed": 0, "rolled_back": 0, "detached": 0, "peak_in_use": 0}
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self.stats["peak_in_use"] = max(self.stats["peak_in_use"], self._in_use)
+            if conn is not None:
+                self.stats["reused"] += 1
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._in_use -= 1
+                raise
+        return PooledConnection(self, conn)
+
+    def _open(self):
+        conn = _connect_db(self.path)
+        with self._lock:
+            self.stats["opened"] += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                # Same as closing: uncommitted changes are discarded
+                conn.rollback()
+                self.stats["rolled_back"] += 1
+            conn.row_factory = sqlite3.Row
+            # Archives left attached (history_source could not detach them)
+            # must not reach the next user; if they still won't go, neither does the connection
+            for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+                if schema not in ("main", "temp"):
+                    conn.execute(f"DETACH DATABASE {schema}")
+                    self.stats["detached"] += 1
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+        with self._lock:
+            self._in_use -= 1
+            if conn is not None and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+            self.stats["closed"] += 1
+        if conn is not None:
+            conn.close()
+
+    def describe(self):
+        with self._lock:
+            return {**self.stats, "in_use": self._in_use, "idle": len(self._idle), "size": self.size}
+
+
+_db_pools = {}
+_db_pools_lock = threading.Lock()
+
+
+def _db_pool():
+    # Keyed by path so tests and tools can point DB_PATH at another file
+    with _db_pools_lock:
+        pool = _db_pools.get(DB_PATH)
+        if pool is None:
+            pool = _db_pools[DB_PATH] = ConnectionPool(DB_PATH)
+        return pool
+
+
 def get_db():
-    """Create a SQLite connection. Uses local file only (no cloud)."""
-    conn = sqlite3.connect(DB_PATH)
+    """
+    Get a SQLite connection from the pool. Uses local file only (no cloud).
+    Call conn.close() when done, as before: it returns the connection.
+    """
+    conn = _db_pool().acquire()
     conn.row_factory = sqlite3.Row  # Access columns by name
     return conn
 
 
-def init_db():
-    """Create all tables if they do not exist."""
-    conn = get_db()
-    cur = conn.cursor()
+# Keyset pagination (?limit=N&after=<cursor>): the cursor holds the sort key
+# and id of the last row sent, so each page is an index range scan no matter
+# how deep into the history it is.
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 500
+
+
+def encode_cursor(key):
+    """Opaque, URL-safe cursor for a JSON-serialisable position."""
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _is_sort_value(value):
+    """True for a value a cursor may compare rows against: text, or a number SQLite can bind."""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return isinstance(value, (str, float))
+
+
+def keyset_position(value):
+    """A (sort key, id) page position, as _keyset_page encodes it. Raises ValueError otherwise."""
+    if not (isinstance(value, list) and len(value) == 2 and all(_is_sort_value(v) for v in value)):
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def decode_cursor(token, shape=keyset_position):
+    """
+    Inverse of encode_cursor, checked by `shape` (a keyset position unless
+    the caller has its own cursor format). Raises ValueError for a malformed
+    cursor, so clients get a 400 rather than a failing query.
+    """
+    try:
+        value = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+    return shape(value)
+
+
+def _page_args(shape=keyset_position):
+    """
+    Read ?limit= and ?after= from the request. Returns (limit, after); both
+    are None when the client does not paginate (whole list, as before).
+    Raises ValueError for bad values.
+    """
+    limit, after = request.args.get("limit"), request.args.get("after")
+    if limit is None and after is None:
+        return None, None
+    limit = PAGE_DEFAULT_LIMIT if limit is None else int(limit)
+    if not 1 <= limit <= PAGE_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {PAGE_MAX_LIMIT}")
+    return limit, (decode_cursor(after, shape) if after else None)
+
+
+def _keyset_sql(sql, params, limit, after, key="timestamp", id_col="id", descending=True):
+    """
+    `sql` (SELECT ... FROM ... WHERE ...) with the keyset range, ORDER BY
+    and LIMIT of one page added. Returns (sql, params). test_query_plans.py
+    checks the query plans of what this builds.
+    """
+    direction, op = ("DESC", "<") if descending else ("ASC", ">")
+    if after is not None:
+        sql += f" AND ({key}, {id_col}) {op} (?, ?)"
+        params = (*params, *after)
+    sql += f" ORDER BY {key} {direction}, {id_col} {direction}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = (*params, limit + 1)  # one extra row tells us whether there is a next page
+    return sql, params
+
+
+def _keyset_page(cur, sql, params, limit, after, key="timestamp", id_col="id", descending=True):
+    """
+    Run `sql` (SELECT ... FROM ... WHERE ..., selecting `key` and `id_col`)
+    one page at a time, ordered by (key, id_col). Returns (rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    cur.execute(*_keyset_sql(sql, params, limit, after, key, id_col, descending))
+    rows = cur.fetchall()
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][key], rows[-1][id_col]])
+
+
+def _without_id(row):
+    """A result row as a dict, minus the id selected only for the page cursor."""
+    data = dict(row)
+    data.pop("id", None)
+    return data
+
 
+# A history request without ?limit= returns the patient's whole history. It is
+# streamed from the cursor STREAM_FETCH_ROWS rows at a time, so memory stays
+# flat however long the history is. Same JSON shape as before; clients that
+# Accept application/x-ndjson get one row per line instead.
+STREAM_FETCH_ROWS = 256
+NDJSON_MIMETYPE = "application/x-ndjson"
+# Same output as jsonify (compact, sorted keys) through the C encoder, minus
+# the per-call setup of json.dumps
+_encode_json = json.JSONEncoder(separators=(",", ":"), sort_keys=True).encode
+
+
+def _keyset_rows(cur, sql, params, key="timestamp", id_col="id", descending=True):
+    """_keyset_page without a limit, leaving the rows on the cursor for stream_history."""
+    return cur.execute(*_keyset_sql(sql, params, None, None, key, id_col, descending))
+
+
+def stream_history(lists, close, nest=None):
+    """
+    Stream one or more result lists as a chunked response. `lists` maps a
+    name to (cursor, row_to_dict) with the query already executed; the
+    cursors are closed, then close() runs, when the stream ends or the
+    client goes away (even before the first chunk).
+
+    JSON: {"ok": true, <name>: [...], "next": null}, the lists nested under
+    `nest` if given. NDJSON: one row per line, with a "list" field naming
+    its list when there is more than one.
+    """
+    ndjson = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+    tagged = ndjson and len(lists) > 1
+    finished = []
+
+    def finish():
+        if finished:
+            return
+        finished.append(True)
+        # Open statements keep attached archives locked (see history_source)
+        for cur, _ in lists.values():
+            cur.close()
+        close()
+
+    def chunks(cur, to_dict, name):
+        while True:
+            rows = cur.fetchmany(STREAM_FETCH_ROWS)
+            if not rows:
+                return
+            if tagged:
+                yield [{"list": name, **to_dict(row)} for row in rows]
+            else:
+                yield [to_dict(row) for row in rows]
+
+    def generate():
+        try:
+            if not ndjson:
+                yield '{"ok":true,' + (f'"{nest}":{{' if nest else "")
+            for i, (name, (cur, to_dict)) in enumerate(lists.items()):
+                if ndjson:
+                    for chunk in chunks(cur, to_dict, name):
+                        yield "".join(_encode_json(row) + "\n" for row in chunk)
+                    continue
+                yield ("," if i else "") + f'"{name}":['
+                separator = ""
+                for chunk in chunks(cur, to_dict, name):
+                    # One encoder call per chunk; [1:-1] strips the list's brackets
+                    yield separator + _encode_json(chunk)[1:-1]
+                    separator = ","
+                yield "]"
+            if not ndjson:
+                yield ("}" if nest else "") + ',"next":null}'
+        finally:
+            finish()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype=NDJSON_MIMETYPE if ndjson else "application/json",
+        headers={"Vary": "Accept", "X-Accel-Buffering": "no"},
+    )
+    # A generator closed before it started never runs its finally
+    response.call_on_close(finish)
+    return response
+
+
+# Writes waiting for the writer thread are committed together, up to this many
+# per transaction
+DB_WRITE_BATCH_MAX = 64
+# Seconds a request waits for its write before giving up
+DB_WRITE_TIMEOUT = 30
+
+
+class DatabaseWriter:
+    """
+    Single writer thread with group commit. Request threads hand it a
+    function that does their writes with a cursor; whatever is queued while
+    a transaction commits goes into the next one, so a burst of saves costs
+    one commit (one fsync) instead of one each. Each operation runs in its
+    own savepoint: a failing one is rolled back alone and its exception is
+    raised in the thread that submitted it.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._conn = None
+        self._conn_path = None
+        self.stats = {"ops": 0, "failed_ops": 0, "commits": 0, "max_batch": 0, "latency_ms_total": 0.0}
+
+    def write(self, operation, timeout=DB_WRITE_TIMEOUT):
+        """Run operation(cur) in the writer thread; return its result once committed."""
+        return self.submit(operation).result(timeout)
+
+    def submit(self, operation):
+        """Queue operation(cur). Returns a Future for its result."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Database writer is closed")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((operation, future, time.perf_counter()))
+        return future
+
+    def close(self, timeout=DB_WRITE_TIMEOUT):
+        """
+        Stop taking writes, commit everything already queued and close the
+        connection. Later write() calls raise RuntimeError.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put(None)  # after every accepted write
+        thread.join(timeout)
+
+    def run(self):
+        """Writer loop, until close(). Runs in background thread."""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < DB_WRITE_BATCH_MAX and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = batch[-1] is None
+            if closing:
+                batch.pop()
+            if batch:
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    log_event(logger, logging.ERROR, "write_batch_failed", ops=len(batch), error=e)
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+            if closing:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                return
+
+    def _connection(self):
+        # Reopened if DB_PATH changes (tests and tools point it at scratch files)
+        if self._conn is None or self._conn_path != DB_PATH:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = _connect_db(DB_PATH, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn_path = DB_PATH
+        return self._conn
+
+    def _commit(self, batch):
+        conn = self._connection()
+        cur = conn.cursor()
+        results = []
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for operation, _, _ in batch:
+                cur.execute("SAVEPOINT op")
+                try:
+                    results.append((True, operation(cur)))
+                    cur.execute("RELEASE op")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO op")
+                    cur.execute("RELEASE op")
+                    results.append((False, e))
+            cur.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                cur.execute("ROLLBACK")
+            raise
+
+        done = time.perf_counter()
+        self.stats["commits"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        for (_, future, queued_at), (ok, value) in zip(batch, results):
+            self.stats["ops"] += 1
+            self.stats["latency_ms_total"] += (done - queued_at) * 1000
+            if ok:
+                future.set_result(value)
+            else:
+                self.stats["failed_ops"] += 1
+                future.set_exception(value)
+
+    def describe(self):
+        stats = dict(self.stats)
+        total = stats.pop("latency_ms_total")
+        stats["mean_latency_ms"] = round(total / stats["ops"], 3) if stats["ops"] else None
+        stats["ops_per_commit"] = round(stats["ops"] / stats["commits"], 2) if stats["commits"] else None
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+db_writer = DatabaseWriter()
+
+
+# Secondary indexes for the per-patient history queries, which all filter on
+# fingerprint_id and page through (timestamp, id) (see _keyset_page), as
+# created by _schema_v4. A change here needs a new migration step that drops
+# and recreates the index. test_query_plans.py checks that SQLite uses them.
+DB_INDEXES = (
+    # Covers every vitals history query: no table lookups, no sort
+    """CREATE INDEX IF NOT EXISTS idx_vitals_patient_time ON vitals (
+        fingerprint_id, timestamp, id, weight, height, heart_rate, spo2, temperature, blood_pressure
+    )""",
+    # Q&A and AI text stay in the table; the timeline query is covered
+    """CREATE INDEX IF NOT EXISTS idx_pain_patient_time ON pain_analysis (
+        fingerprint_id, timestamp, id, body_part, specific_area, severity
+    )""",
+    # Analyses still waiting for an AI result (_save_analysis_result)
+    """CREATE INDEX IF NOT EXISTS idx_pain_pending ON pain_analysis (
+        fingerprint_id, body_part, timestamp
+    ) WHERE severity IS NULL""",
+    # Doctor dashboard patient list, newest first
+    """CREATE INDEX IF NOT EXISTS idx_patients_created ON patients (
+        created_at, fingerprint_id, name, age, sex
+    )""",
+)
+
+
+def _add_missing_columns(cur, table, columns):
+    """ALTER TABLE ... ADD COLUMN for each (name, type) the table does not have yet."""
+    existing = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _schema_v1(cur):
+    """Base schema. Also brings databases from before migrations up to date."""
     # Patients: identity via Fingerprint ID (simulated; replace with sensor later)
     cur.execute("""
         CREATE TABLE IF NOT EXISTS patients (
@@ -229,32 +1653,1356 @@ def init_db():
             (DOCTOR_ID, DOCTOR_PASSWORD),
         )
 
-    # Add specific_area column if missing (for existing DBs)
+    # Columns added after the first release (databases created before them)
+    _add_missing_columns(cur, "pain_analysis", (
+        ("specific_area", "TEXT"),
+        ("image_path", "TEXT"),  # body part image
+        ("recommendation", "TEXT"),
+    ))
+
+
+def _schema_v2(cur):
+    """Doctor-uploaded PDF documents (previously created on first upload)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS doctor_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fingerprint_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            filepath TEXT NOT NULL,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (fingerprint_id) REFERENCES patients(fingerprint_id)
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documents_patient_time
+        ON doctor_documents (fingerprint_id, uploaded_at)
+    """)
+
+
+def _schema_v3(cur):
+    """Raw Arduino sample store and its rollups."""
+    # Raw Arduino samples: one row per (device, channel, flush batch), with
+    # the samples packed into a blob (see SampleRecorder)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS vitals_samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device TEXT NOT NULL,
+            channel INTEGER NOT NULL,
+            start_ts REAL NOT NULL,
+            end_ts REAL NOT NULL,
+            sample_count INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vitals_samples_end ON vitals_samples(end_ts)")
+
+    # Per-minute and per-hour rollups of the raw samples (kept after raw data expires)
+    for table in ("vitals_rollup_1m", "vitals_rollup_1h"):
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                channel INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                device TEXT NOT NULL,
+                sample_count INTEGER NOT NULL,
+                total REAL NOT NULL,
+                min_value REAL NOT NULL,
+                max_value REAL NOT NULL,
+                PRIMARY KEY (channel, bucket, device)
+            ) WITHOUT ROWID
+        """)
+
+
+def _schema_v4(cur):
+    """Indexes for the per-patient history queries (DB_INDEXES)."""
+    for statement in DB_INDEXES:
+        cur.execute(statement)
+
+
+# Archiving an analysis deletes it from the hot database, which would drop its
+# complaint from the patient's search document. Its text is kept in
+# archived_complaints instead (appended as rows move, see _archive_batch),
+# and the search document includes it. No triggers on archived_complaints: it
+# only grows when the archive move deletes analyses, and their delete trigger
+# refreshes the document.
+COMPLAINT_TEXT = "coalesce(body_part, '') || ' ' || coalesce(specific_area, '') || ' ' || coalesce(ai_summary, '')"
+ARCHIVED_COMPLAINTS_ADD = """
+    INSERT INTO archived_complaints (fingerprint_id, complaints) VALUES (?, ?)
+    ON CONFLICT (fingerprint_id) DO UPDATE SET complaints = complaints || ' ' || excluded.complaints
+"""
+
+
+def _schema_v5(cur):
+    """
+    Cold archive bookkeeping: archive_index records which archive files hold
+    each patient's old rows, archived_complaints the text of its archived
+    analyses. Ahead of the search and summary steps, whose triggers read them.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archive_index (
+            fingerprint_id INTEGER NOT NULL,
+            table_name TEXT NOT NULL,
+            period TEXT NOT NULL,
+            min_ts TIMESTAMP NOT NULL,
+            max_ts TIMESTAMP NOT NULL,
+            rows INTEGER NOT NULL,
+            PRIMARY KEY (fingerprint_id, table_name, period)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archived_complaints (
+            fingerprint_id INTEGER PRIMARY KEY,
+            complaints TEXT NOT NULL
+        )
+    """)
+
+
+# Full-text search: one FTS5 document per patient (rowid = fingerprint_id)
+# holding their name, history and complaints, so a query like "warfarin
+# chest pain" can match terms from different tables. Triggers rebuild a
+# patient's document whenever one of its source rows changes.
+PATIENT_SEARCH_DOC = f"""
+    INSERT INTO patient_search (rowid, patient_id, name, allergies, medications, past_medications, complaints)
+    SELECT p.fingerprint_id, p.fingerprint_id, p.name,
+           coalesce(h.current_allergies, '') || ' ' || coalesce(h.past_allergies, ''),
+           h.current_medications,
+           h.past_medications,
+           coalesce((SELECT group_concat({COMPLAINT_TEXT}, ' ') FROM pain_analysis a
+                     WHERE a.fingerprint_id = p.fingerprint_id), '')
+           || coalesce(' ' || c.complaints, '')
+    FROM patients p LEFT JOIN medical_history h ON h.fingerprint_id = p.fingerprint_id
+         LEFT JOIN archived_complaints c ON c.fingerprint_id = p.fingerprint_id
+    WHERE p.fingerprint_id = {{fid}}
+"""
+# bm25 weights, in column order: patient_id, name, allergies, medications,
+# past_medications, complaints
+PATIENT_SEARCH_WEIGHTS = (10.0, 10.0, 2.0, 3.0, 1.0, 2.0)
+# Source tables -> the changes that refresh a patient's document
+PATIENT_SEARCH_TRIGGERS = {
+    "patients": ("INSERT", "UPDATE OF name", "DELETE"),
+    "medical_history": ("INSERT", "UPDATE", "DELETE"),
+    "pain_analysis": ("INSERT", "UPDATE OF fingerprint_id, body_part, specific_area, ai_summary", "DELETE"),
+}
+
+
+def _schema_v6(cur):
+    """Full-text patient search (patient_search) and the triggers that keep it in sync."""
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5(
+            patient_id, name, allergies, medications, past_medications, complaints,
+            tokenize = 'porter unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    _create_search_triggers(cur, PATIENT_SEARCH_DOC)
+
+
+def _create_search_triggers(cur, doc):
+    """(Re)create the patient_search triggers, building documents with `doc`, and rebuild every document."""
+    def refresh(fid):
+        return f"DELETE FROM patient_search WHERE rowid = {fid};" + doc.format(fid=fid) + ";"
+
+    for table, events in PATIENT_SEARCH_TRIGGERS.items():
+        for event in events:
+            name = f"trg_search_{table}_{event.split()[0].lower()}"
+            # Rows that move patient (or are deleted) refresh the old one too
+            body = ""
+            if event != "INSERT":
+                body += refresh("OLD.fingerprint_id")
+            if event != "DELETE":
+                body += refresh("NEW.fingerprint_id")
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cur.execute(f"CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN {body} END")
+
+    cur.execute("DELETE FROM patient_search")
+    cur.execute(doc.format(fid="p.fingerprint_id"))
+
+
+# Per-patient dashboard summary (patient_summary): latest vitals, latest
+# finished analysis, analysis count, worst severity in the last 30 days and
+# last visit, kept current by triggers so the doctor list is one indexed read.
+SEVERITY_LEVELS = ("LOW", "MEDIUM", "HIGH", "EMERGENCY")
+SUMMARY_PEAK_DAYS = 30
+# The 30-day peak also changes as old analyses age out; a background job
+# recomputes stale peaks this often (see start_summary_expiry)
+SUMMARY_EXPIRE_SECONDS = 300
+
+_SEVERITY_RANK = (
+    "CASE severity "
+    + " ".join(f"WHEN '{level}' THEN {rank}" for rank, level in enumerate(SEVERITY_LEVELS, 1))
+    + " ELSE 0 END"
+)
+_SUMMARY_PEAK = f"""
+    (peak_severity, peak_severity_rank, peak_severity_at) = (
+        SELECT severity, rank, timestamp FROM (
+            SELECT severity, {_SEVERITY_RANK} AS rank, timestamp FROM pain_analysis
+            WHERE fingerprint_id = {{fid}} AND severity IS NOT NULL
+              AND timestamp >= datetime('now', '-{SUMMARY_PEAK_DAYS} days')
+            UNION ALL SELECT NULL, 0, NULL
+        )
+        ORDER BY rank DESC, timestamp DESC LIMIT 1
+    )
+"""
+SUMMARY_REFRESH_VITALS = """
+    UPDATE patient_summary SET
+        (weight, height, heart_rate, spo2, temperature, blood_pressure, vitals_at) = (
+            SELECT weight, height, heart_rate, spo2, temperature, blood_pressure, timestamp FROM vitals
+            WHERE fingerprint_id = {fid} ORDER BY timestamp DESC, id DESC LIMIT 1
+        )
+    WHERE fingerprint_id = {fid}
+"""
+SUMMARY_REFRESH_ANALYSES = f"""
+    UPDATE patient_summary SET
+        (latest_severity, latest_recommendation, analysis_at) = (
+            SELECT severity, recommendation, timestamp FROM pain_analysis
+            WHERE fingerprint_id = {{fid}} AND severity IS NOT NULL ORDER BY timestamp DESC, id DESC LIMIT 1
+        ),
+        analysis_count = (
+            SELECT count(*) FROM pain_analysis WHERE fingerprint_id = {{fid}} AND severity IS NOT NULL
+        ),
+        {_SUMMARY_PEAK}
+    WHERE fingerprint_id = {{fid}}
+"""
+SUMMARY_REFRESH_LAST_VISIT = """
+    UPDATE patient_summary SET last_visit = max(
+        coalesce((SELECT created_at FROM patients WHERE fingerprint_id = {fid}), ''),
+        coalesce(vitals_at, ''),
+        coalesce(analysis_at, '')
+    )
+    WHERE fingerprint_id = {fid}
+"""
+# A new vitals row is usually the latest one: apply it without re-reading.
+# Rows inserted out of order (dataset imports) with the summary's timestamp:
+# the one with the highest id is the latest, as in SUMMARY_REFRESH_VITALS
+SUMMARY_ADD_VITALS = """
+    UPDATE patient_summary SET
+        weight = NEW.weight, height = NEW.height, heart_rate = NEW.heart_rate, spo2 = NEW.spo2,
+        temperature = NEW.temperature, blood_pressure = NEW.blood_pressure,
+        vitals_at = NEW.timestamp, last_visit = max(last_visit, NEW.timestamp)
+    WHERE fingerprint_id = NEW.fingerprint_id AND (
+        vitals_at IS NULL OR NEW.timestamp > vitals_at OR (
+            NEW.timestamp = vitals_at AND NOT EXISTS (
+                SELECT 1 FROM vitals WHERE fingerprint_id = NEW.fingerprint_id AND timestamp = NEW.timestamp AND id > NEW.id
+            )
+        )
+    )
+"""
+# Archived analyses still count towards patient_summary.analysis_count
+SUMMARY_ARCHIVED_COUNT = """
+    UPDATE patient_summary SET analysis_count = analysis_count + (
+        SELECT coalesce(sum(rows), 0) FROM archive_index
+        WHERE fingerprint_id = {fid} AND table_name = 'pain_analysis'
+    )
+    WHERE fingerprint_id = {fid}
+"""
+
+
+def _summary_refresh(fid, *parts):
+    return "".join(part.format(fid=fid) + ";" for part in parts)
+
+
+def _summary_analysis_triggers(*parts):
+    """patient_summary trigger bodies for pain_analysis changes, running `parts`."""
+    return {
+        ("pain_analysis", "INSERT"): _summary_refresh("NEW.fingerprint_id", *parts),
+        ("pain_analysis", "UPDATE OF fingerprint_id, severity, recommendation, timestamp"): (
+            _summary_refresh("OLD.fingerprint_id", *parts) + _summary_refresh("NEW.fingerprint_id", *parts)
+        ),
+        ("pain_analysis", "DELETE"): _summary_refresh("OLD.fingerprint_id", *parts),
+    }
+
+
+def _create_summary_triggers(cur, triggers):
+    for (table, event), body in triggers.items():
+        name = f"trg_summary_{table}_{event.split()[0].lower()}"
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN {body} END")
+
+
+def _schema_v7(cur):
+    """Per-patient dashboard summary (patient_summary) and the triggers that maintain it."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS patient_summary (
+            fingerprint_id INTEGER PRIMARY KEY,
+            weight REAL,
+            height REAL,
+            heart_rate INTEGER,
+            spo2 INTEGER,
+            temperature REAL,
+            blood_pressure TEXT,
+            vitals_at TIMESTAMP,
+            latest_severity TEXT,
+            latest_recommendation TEXT,
+            analysis_at TIMESTAMP,
+            analysis_count INTEGER NOT NULL DEFAULT 0,
+            peak_severity TEXT,
+            peak_severity_rank INTEGER NOT NULL DEFAULT 0,
+            peak_severity_at TIMESTAMP,
+            last_visit TIMESTAMP NOT NULL DEFAULT ''
+        )
+    """)
+    # Sort orders offered by get_all_patients, plus the stale-peak sweep
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_last_visit ON patient_summary (last_visit, fingerprint_id)")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_summary_severity ON patient_summary (peak_severity_rank, fingerprint_id)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_summary_peak_at ON patient_summary (peak_severity_at) "
+        "WHERE peak_severity_at IS NOT NULL"
+    )
+
+    everything = (SUMMARY_REFRESH_VITALS, SUMMARY_REFRESH_ANALYSES, SUMMARY_ARCHIVED_COUNT, SUMMARY_REFRESH_LAST_VISIT)
+    triggers = {
+        ("patients", "INSERT"): (
+            "INSERT OR REPLACE INTO patient_summary (fingerprint_id) VALUES (NEW.fingerprint_id);"
+            + _summary_refresh("NEW.fingerprint_id", *everything)
+        ),
+        ("patients", "DELETE"): "DELETE FROM patient_summary WHERE fingerprint_id = OLD.fingerprint_id;",
+        ("vitals", "INSERT"): SUMMARY_ADD_VITALS + ";",
+        ("vitals", "UPDATE"): _summary_refresh("OLD.fingerprint_id", SUMMARY_REFRESH_VITALS, SUMMARY_REFRESH_LAST_VISIT)
+        + _summary_refresh("NEW.fingerprint_id", SUMMARY_REFRESH_VITALS, SUMMARY_REFRESH_LAST_VISIT),
+        ("vitals", "DELETE"): _summary_refresh("OLD.fingerprint_id", SUMMARY_REFRESH_VITALS, SUMMARY_REFRESH_LAST_VISIT),
+        **_summary_analysis_triggers(SUMMARY_REFRESH_ANALYSES, SUMMARY_ARCHIVED_COUNT, SUMMARY_REFRESH_LAST_VISIT),
+    }
+    _create_summary_triggers(cur, triggers)
+
+    cur.execute("DELETE FROM patient_summary")
+    cur.execute("INSERT INTO patient_summary (fingerprint_id) SELECT fingerprint_id FROM patients")
+    for part in everything:
+        cur.execute(part.format(fid="patient_summary.fingerprint_id"))
+
+
+def expire_summary_peaks(cur):
+    """Recompute 30-day peaks whose analysis has aged out of the window. Returns the number recomputed."""
+    cur.execute(
+        f"UPDATE patient_summary SET {_SUMMARY_PEAK.format(fid='patient_summary.fingerprint_id')} "
+        f"WHERE peak_severity_at < datetime('now', '-{SUMMARY_PEAK_DAYS} days')"
+    )
+    return cur.rowcount
+
+
+def refresh_summary_peaks():
+    """Recompute aged-out 30-day peaks through the writer. Returns the number recomputed."""
+    n = db_writer.write(expire_summary_peaks)
+    if n:
+        # No patient's data changed, so data versions don't move: drop cached lists
+        response_cache.invalidate("patients")
+    return n
+
+
+def _summary_expiry_loop():
+    while True:
+        try:
+            refresh_summary_peaks()
+        except Exception as e:
+            log_event(logger, logging.ERROR, "summary_expire_failed", error=e)
+        time.sleep(SUMMARY_EXPIRE_SECONDS)
+
+
+def start_summary_expiry():
+    """Keep patient_summary's 30-day peaks current, so the patient list never has to write."""
+    threading.Thread(target=_summary_expiry_loop, name="summary-peaks", daemon=True).start()
+
+
+def _schema_v8(cur):
+    """Question catalog; pain_analysis Q&A moves from two JSON arrays to the compact qa column."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS question_catalog (
+            id INTEGER PRIMARY KEY,
+            lang TEXT NOT NULL,
+            text TEXT NOT NULL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (lang, text)
+        )
+    """)
+    _add_missing_columns(cur, "pain_analysis", (("qa", "BLOB"),))
+
+    # The old columns stay (emptied) so older SQLite versions need no table rebuild
+    rows = cur.execute(
+        "SELECT id, questions, answers FROM pain_analysis WHERE questions IS NOT NULL OR answers IS NOT NULL"
+    ).fetchall()
+    catalog = {}
+    for row_id, questions, answers in rows:
+        questions, answers = _qa_list(questions), _qa_list(answers)
+        ids = []
+        for text in questions:
+            key = str(text)
+            if key not in catalog:
+                cur.execute(
+                    "INSERT OR IGNORE INTO question_catalog (lang, text) VALUES (?, ?)", (QUESTION_DEFAULT_LANG, key)
+                )
+                catalog[key] = cur.execute(
+                    "SELECT id FROM question_catalog WHERE lang = ? AND text = ?", (QUESTION_DEFAULT_LANG, key)
+                ).fetchone()[0]
+            ids.append(catalog[key])
+        cur.execute(
+            "UPDATE pain_analysis SET qa = ?, questions = NULL, answers = NULL WHERE id = ?",
+            (encode_qa(ids, answers), row_id),
+        )
+
+
+# Tables whose rows belong to one patient; any change bumps patient_versions
+VERSIONED_TABLES = ("patients", "vitals", "medical_history", "pain_analysis", "doctor_documents")
+# Each bump takes the next number of one database-wide sequence: still
+# increasing per patient, and max(version) changes on any write at all (the
+# patient list cache checks it, see ResponseCache)
+PATIENT_VERSION_NEXT = """
+    INSERT INTO patient_versions (fingerprint_id, version)
+    VALUES ({fid}, (SELECT coalesce(max(version), 0) + 1 FROM patient_versions))
+    ON CONFLICT (fingerprint_id) DO UPDATE SET version = excluded.version
+"""
+
+
+def _schema_v9(cur):
+    """
+    Per-patient data versions (patient_versions), bumped by triggers in the
+    same transaction as the change. Rows outlive the patient, so a deleted
+    and re-registered fingerprint never repeats an old version. Indexed on
+    version, so max(version) is one index probe.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS patient_versions (
+            fingerprint_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_patient_versions_version ON patient_versions(version)")
+    _create_version_triggers(cur, PATIENT_VERSION_NEXT)
+
+
+def _create_version_triggers(cur, bump):
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            # Rows that move patient (or are deleted) bump the old one too
+            body = ""
+            if event != "INSERT":
+                body += bump.format(fid="OLD.fingerprint_id") + ";"
+            if event != "DELETE":
+                body += bump.format(fid="NEW.fingerprint_id") + ";"
+            name = f"trg_version_{table}_{event.lower()}"
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cur.execute(f"CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN {body} END")
+
+
+# Schema migrations, applied in order. PRAGMA user_version holds how many have
+# run, so a start-up with an up-to-date database runs no DDL at all. Only
+# ever append a step; never edit one that has shipped.
+MIGRATIONS = (
+    _schema_v1, _schema_v2, _schema_v3, _schema_v4, _schema_v5, _schema_v6, _schema_v7, _schema_v8, _schema_v9,
+)
+
+
+def init_db():
+    """Bring the database schema up to date (see MIGRATIONS)."""
+    conn = get_db()
     try:
-        cur.execute("ALTER TABLE pain_analysis ADD COLUMN specific_area TEXT")
-    except sqlite3.OperationalError:
-        pass
-    
-    # Add image_path column for body part images if missing
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == len(MIGRATIONS):
+            return
+        if version > len(MIGRATIONS):
+            raise RuntimeError(
+                f"Database schema version {version} is newer than this app supports ({len(MIGRATIONS)})"
+            )
+
+        # All pending steps and the new version number commit together, or not at all
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.cursor()
+            for step in MIGRATIONS[version:]:
+                step(cur)
+            cur.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        log_event(logger, logging.INFO, "schema_migrated", from_version=version, to_version=len(MIGRATIONS))
+    finally:
+        conn.close()
+
+
+# =============================================================================
+# RAW VITALS SAMPLE STORE (time series + rollups)
+# =============================================================================
+
+# Samples are buffered in memory and written in one transaction per flush, so
+# the SD card sees a few large writes instead of one per sample.
+VITALS_RAW_FLUSH_SECONDS = 30
+VITALS_RAW_FLUSH_SAMPLES = 2000
+# Pending samples kept if the database is slow; the oldest are dropped beyond this
+VITALS_RAW_MAX_PENDING = 20000
+# Raw samples older than this are deleted; rollups are kept
+VITALS_RAW_RETENTION_DAYS = float(os.environ.get("VITALS_RAW_RETENTION_DAYS", "7"))
+VITALS_RAW_PURGE_INTERVAL = 3600
+# Rollup resolution name -> (table, bucket width in seconds)
+VITALS_ROLLUPS = {"1m": ("vitals_rollup_1m", 60), "1h": ("vitals_rollup_1h", 3600)}
+
+_CHANNEL_INDEX = {name: i for i, name in enumerate(VITALS_CHANNELS)}
+
+
+# Largest offset a batch can hold (uint32 milliseconds, about 49.7 days)
+SAMPLE_OFFSET_MAX_MS = 0xFFFFFFFF
+# Largest magnitude a float32 value can hold
+SAMPLE_VALUE_MAX = 3.4028234663852886e38
+
+
+def encode_sample_batch(start_ts, points):
+    """
+    Pack [(ts, value), ...] as little-endian uint32 millisecond offsets from
+    start_ts followed by float32 values: 8 bytes per sample. Every ts must be
+    within SAMPLE_OFFSET_MAX_MS of start_ts, and not before it (see
+    sample_batches).
+    """
+    n = len(points)
+    offsets = [round((ts - start_ts) * 1000) for ts, _ in points]
+    return struct.pack(f"<{n}I{n}f", *offsets, *(v for _, v in points))
+
+
+def sample_batches(points):
+    """
+    Split one channel's [(ts, value), ...] into time-ordered runs that
+    encode_sample_batch can pack. The wall clock can step back (NTP syncing
+    after fake-hwclock on a Pi with no RTC) or far forward within one flush,
+    which would put an offset outside the uint32 range.
+    """
+    points = sorted(points, key=lambda point: point[0])
+    start = 0
+    for i, (ts, _) in enumerate(points):
+        if round((ts - points[start][0]) * 1000) > SAMPLE_OFFSET_MAX_MS:
+            yield points[start:i]
+            start = i
+    if points:
+        yield points[start:]
+
+
+def decode_sample_batch(start_ts, count, data):
+    """Inverse of encode_sample_batch: [(ts, value), ...]."""
+    fields = struct.unpack(f"<{count}I{count}f", data)
+    return [(start_ts + off / 1000, value) for off, value in zip(fields[:count], fields[count:])]
+
+
+class SampleRecorder:
+    """
+    Persists every sample the Arduino readers decode. record() only appends
+    to a bounded in-memory queue, so the reader threads never wait on disk;
+    a background thread writes raw batches and updates the rollups.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=VITALS_RAW_MAX_PENDING)
+        self._wakeup = threading.Event()
+        self._last_purge = 0.0
+        # dropped: samples lost to a full queue; rejected: values that aren't finite or don't fit a float32
+        self.counters = {"recorded": 0, "flushed": 0, "dropped": 0, "rejected": 0, "batches": 0, "errors": 0}
+
+    def record(self, device_id, ts, sample):
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.counters["dropped"] += 1
+            self._pending.append((device_id, ts, sample))
+            self.counters["recorded"] += 1
+            full = len(self._pending) >= VITALS_RAW_FLUSH_SAMPLES
+        if full:
+            self._wakeup.set()
+
+    def run(self):
+        """Flush loop. Runs in background thread."""
+        while True:
+            self._wakeup.wait(VITALS_RAW_FLUSH_SECONDS)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.counters["errors"] += 1
+                log_event(arduino_log, logging.ERROR, "sample_flush_error", error=e,
+                          pending=len(self._pending), dropped=self.counters["dropped"])
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="vitals-recorder", daemon=True)
+        thread.start()
+        return thread
+
+    def flush(self, now=None):
+        """Write pending samples and their rollups in one transaction."""
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        if pending:
+            try:
+                raw_rows, rollups = self._batches(pending)
+            except Exception:
+                # They would fail the same way next time: drop them, counted
+                self.counters["dropped"] += len(pending)
+                raise
+            try:
+                self._write(raw_rows, rollups)
+            except Exception:
+                # The database failed, not the samples: retry them next flush
+                self._requeue(pending)
+                raise
+            self.counters["flushed"] += len(pending)
+
+        now = time.time() if now is None else now
+        if now - self._last_purge >= VITALS_RAW_PURGE_INTERVAL:
+            self._last_purge = now
+            self.purge(now)
+        return len(pending)
+
+    def _requeue(self, samples):
+        """
+        Put unwritten samples back ahead of the ones recorded since. The
+        queue keeps the newest VITALS_RAW_MAX_PENDING, so if it is full the
+        oldest of them are dropped (and counted).
+        """
+        with self._lock:
+            lost = max(0, len(samples) - (self._pending.maxlen - len(self._pending)))
+            self._pending.extendleft(reversed(samples[lost:]))
+            self.counters["dropped"] += lost
+
+    def _batches(self, pending):
+        """Raw sample rows and rollup aggregates for `pending` samples."""
+        series = {}
+        for device_id, ts, sample in pending:
+            for name, value in sample.items():
+                channel = _CHANNEL_INDEX.get(name)
+                if channel is None or value is None:
+                    continue
+                value = float(value)
+                if not math.isfinite(value) or abs(value) > SAMPLE_VALUE_MAX:
+                    self.counters["rejected"] += 1
+                    continue
+                series.setdefault((device_id, channel), []).append((ts, value))
+
+        raw_rows = []
+        rollups = {table: {} for table, _ in VITALS_ROLLUPS.values()}
+        for (device_id, channel), points in series.items():
+            for batch in sample_batches(points):
+                start = batch[0][0]
+                raw_rows.append(
+                    (device_id, channel, start, batch[-1][0], len(batch), encode_sample_batch(start, batch))
+                )
+            for table, width in VITALS_ROLLUPS.values():
+                buckets = rollups[table]
+                for ts, value in points:
+                    key = (channel, int(ts // width) * width, device_id)
+                    agg = buckets.get(key)
+                    if agg is None:
+                        buckets[key] = [1, value, value, value]
+                    else:
+                        agg[0] += 1
+                        agg[1] += value
+                        agg[2] = min(agg[2], value)
+                        agg[3] = max(agg[3], value)
+        return raw_rows, rollups
+
+    def _write(self, raw_rows, rollups):
+        def write(cur):
+            cur.executemany(
+                """INSERT INTO vitals_samples (device, channel, start_ts, end_ts, sample_count, data)
+                 VALUES (?, ?, ?, ?, ?, ?)""",
+                raw_rows,
+            )
+            for table, buckets in rollups.items():
+                cur.executemany(
+                    f"""INSERT INTO {table} (channel, bucket, device, sample_count, total, min_value, max_value)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT(channel, bucket, device) DO UPDATE SET
+                        sample_count = sample_count + excluded.sample_count,
+                        total = total + excluded.total,
+                        min_value = MIN(min_value, excluded.min_value),
+                        max_value = MAX(max_value, excluded.max_value)""",
+                    [(*key, *agg) for key, agg in buckets.items()],
+                )
+
+        db_writer.write(write)
+        self.counters["batches"] += 1
+
+    def purge(self, now=None):
+        """Delete raw samples past the retention period. Returns rows deleted."""
+        cutoff = (time.time() if now is None else now) - VITALS_RAW_RETENTION_DAYS * 86400
+        return db_writer.write(
+            lambda cur: cur.execute("DELETE FROM vitals_samples WHERE end_ts < ?", (cutoff,)).rowcount
+        )
+
+
+vitals_recorder = SampleRecorder()
+
+
+# =============================================================================
+# QUESTION CATALOG (pain questionnaire Q&A storage)
+# =============================================================================
+
+# Each distinct question wording per language is stored once in
+# question_catalog. Its id never changes and its text is never edited: a
+# reworded question gets a new id, so old analyses still show the wording
+# the patient answered. pain_analysis.qa then holds only ids and answers.
+QA_FORMAT = 1
+QA_HEADER = struct.Struct("<BHH")  # format, question count, answer count
+QA_SEPARATOR = "\x1f"  # between answers (ASCII unit separator)
+QUESTION_DEFAULT_LANG = "en"
+
+
+def encode_qa(question_ids, answers):
+    """
+    Pack question ids and answers into one BLOB: header, uint32 ids, then the
+    answers as UTF-8 joined by QA_SEPARATOR (~100 bytes for ten answers).
+    """
+    answers = ["" if a is None else str(a).replace(QA_SEPARATOR, " ") for a in answers]
+    n = len(question_ids)
+    return (
+        QA_HEADER.pack(QA_FORMAT, n, len(answers))
+        + struct.pack(f"<{n}I", *question_ids)
+        + QA_SEPARATOR.join(answers).encode("utf-8")
+    )
+
+
+def decode_qa(blob):
+    """Inverse of encode_qa: (question_ids, answers)."""
+    if not blob:
+        return [], []
+    fmt, n, m = QA_HEADER.unpack_from(blob)
+    if fmt != QA_FORMAT:
+        raise ValueError(f"Unknown Q&A format {fmt}")
+    ids = list(struct.unpack_from(f"<{n}I", blob, QA_HEADER.size))
+    text = blob[QA_HEADER.size + 4 * n:].decode("utf-8")
+    return ids, (text.split(QA_SEPARATOR) if m else [])
+
+
+def _qa_list(value):
+    """
+    Questions or answers as a list. Legacy rows hold JSON arrays, but also
+    free text that was never JSON: that is kept as a single entry.
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value else None
+        except ValueError:
+            return [value]
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _qa_arg(data, name):
+    """
+    `questions` or `answers` from a request body: a list of strings (answers
+    may also be numbers or null), or absent. Raises ValueError otherwise, so
+    a string isn't stored one character per question.
+    """
+    value = data.get(name)
+    if value is None:
+        return []
+    allowed = str if name == "questions" else (str, int, float, type(None))
+    if not isinstance(value, list) or not all(isinstance(item, allowed) for item in value):
+        raise ValueError(f"{name} must be a list of strings")
+    return value
+
+
+class QuestionCatalog:
+    """
+    In-memory copy of question_catalog for turning stored ids back into text.
+    Holds committed rows only, and ids never change, so it never goes stale;
+    an id it has not seen yet reloads the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._texts = {}  # id -> text
+        self._langs = {}  # id -> lang
+        self._ids = {}  # (lang, text) -> id
+
+    def _current(self):
+        if self._path != DB_PATH:
+            self._reload()
+
+    def _reload(self):
+        conn = get_db()
+        try:
+            rows = conn.execute("SELECT id, lang, text FROM question_catalog").fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            self._path = DB_PATH
+            self._texts = {r["id"]: r["text"] for r in rows}
+            self._langs = {r["id"]: r["lang"] for r in rows}
+            self._ids = {(r["lang"], r["text"]): r["id"] for r in rows}
+
+    def texts(self, question_ids):
+        """Question text for each id."""
+        self._current()
+        if any(qid not in self._texts for qid in question_ids):
+            self._reload()
+        return [self._texts.get(qid, "") for qid in question_ids]
+
+    def lang(self, question_ids):
+        """Language of a questionnaire (that of its first question)."""
+        if not question_ids:
+            return QUESTION_DEFAULT_LANG
+        self.texts(question_ids[:1])
+        return self._langs.get(question_ids[0], QUESTION_DEFAULT_LANG)
+
+    def ids(self, cur, lang, questions):
+        """
+        Catalog id for each question text, adding new ones. Runs inside a
+        writer operation (cur); new ids reach the cache once committed.
+        """
+        self._current()
+        out = []
+        for text in questions:
+            text = str(text)
+            qid = self._ids.get((lang, text))
+            if qid is None:
+                cur.execute("INSERT OR IGNORE INTO question_catalog (lang, text) VALUES (?, ?)", (lang, text))
+                qid = cur.execute(
+                    "SELECT id FROM question_catalog WHERE lang = ? AND text = ?", (lang, text)
+                ).fetchone()[0]
+            out.append(qid)
+        return out
+
+
+question_catalog = QuestionCatalog()
+
+
+def _qa_fields(row):
+    """{"questions": [...], "answers": [...]} from a pain_analysis row's qa column."""
+    ids, answers = decode_qa(row["qa"])
+    return {"questions": question_catalog.texts(ids), "answers": answers}
+
+
+
+# =============================================================================
+# COLD ARCHIVE (old vitals and analyses in per-year SQLite files)
+# =============================================================================
+
+# Rows older than this move out of the hot database into one archive file per
+# year, so the hot database (and every scan, backup and VACUUM of it) stays
+# small. The history routes read them back through history_source. 0 turns
+# archiving off; it never goes below the 30-day severity window.
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+# Archive files live next to the database unless ARCHIVE_DIR is set
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR")
+ARCHIVE_INTERVAL = 86400
+# Rows moved per writer operation, so saves are never held up for long
+ARCHIVE_BATCH = 2000
+# Held while rows are copied and moved, and while delete_patient clears a
+# patient's archived rows, so a move can't put rows back in the archive
+# behind a delete
+_archive_lock = threading.Lock()
+# Tables archived -> which rows may move. Each patient's newest row always stays
+# hot (patient_summary reads the latest vitals and analysis from there), and so
+# do unfinished analyses.
+ARCHIVE_TABLES = {
+    "vitals": "1",
+    "pain_analysis": "severity IS NOT NULL",
+}
+
+
+def _archive_dir():
+    return Path(ARCHIVE_DIR) if ARCHIVE_DIR else Path(DB_PATH).parent / "archive"
+
+
+def _archive_path(period):
+    return _archive_dir() / f"archive_{period}.db"
+
+
+def _archive_period(timestamp):
+    """Archive file a row goes to: the year of its timestamp."""
+    return str(timestamp)[:4]
+
+
+def _open_archive(period, table, columns):
+    """Connection to one archive file, with `table` created or brought up to date."""
+    path = _archive_path(period)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = _connect_db(path)
+    defs = ", ".join(
+        f"{name} INTEGER PRIMARY KEY" if name == "id" else f"{name} {decl}" for name, decl in columns
+    )
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({defs})")
+    _add_missing_columns(conn.cursor(), table, columns)
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_patient_time ON {table} (fingerprint_id, timestamp, id)"
+    )
+    return conn
+
+
+def _archive_batch(table, cutoff):
+    """
+    Move up to ARCHIVE_BATCH rows of `table` older than `cutoff` into the
+    archive files. Returns the number of rows moved.
+
+    Rows are first copied and committed into the archive, then deleted from
+    the hot database by the writer thread. A crash in between leaves a row
+    in both places; the next run copies it again (ignored) and deletes it.
+    """
+    with _archive_lock:
+        return _archive_batch_locked(table, cutoff)
+
+
+def _archive_batch_locked(table, cutoff):
+    conn = get_db()
     try:
-        cur.execute("ALTER TABLE pain_analysis ADD COLUMN image_path TEXT")
-    except sqlite3.OperationalError:
-        pass
-    
-    # Add recommendation column if missing
+        columns = [(r["name"], r["type"]) for r in conn.execute(f"PRAGMA table_info({table})")]
+        names = ", ".join(name for name, _ in columns)
+        rows = conn.execute(
+            f"""
+            SELECT {names} FROM {table} t
+            WHERE timestamp < ? AND {ARCHIVE_TABLES[table]}
+              AND id != (SELECT id FROM {table} l WHERE l.fingerprint_id = t.fingerprint_id AND {ARCHIVE_TABLES[table]}
+                         ORDER BY timestamp DESC, id DESC LIMIT 1)
+            ORDER BY id LIMIT ?
+            """,
+            (cutoff, ARCHIVE_BATCH),
+        ).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return 0
+
+    by_period = {}
+    for row in rows:
+        by_period.setdefault(_archive_period(row["timestamp"]), []).append(row)
+    placeholders = ", ".join("?" * len(columns))
+    for period, period_rows in by_period.items():
+        archive = _open_archive(period, table, columns)
+        try:
+            archive.executemany(
+                f"INSERT OR IGNORE INTO {table} ({names}) VALUES ({placeholders})",
+                [tuple(r) for r in period_rows],
+            )
+            archive.commit()
+        finally:
+            archive.close()
+
+    def move(cur):
+        # Only rows still here (delete_patient may have run meanwhile). The
+        # index is updated before the delete so patient_summary counts stay right.
+        ids = [r["id"] for r in rows]
+        present = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            present.update(
+                r[0] for r in cur.execute(
+                    f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                )
+            )
+        spans = {}
+        for r in rows:
+            if r["id"] in present:
+                key = (r["fingerprint_id"], _archive_period(r["timestamp"]))
+                lo, hi, n = spans.get(key, (r["timestamp"], r["timestamp"], 0))
+                spans[key] = (min(lo, r["timestamp"]), max(hi, r["timestamp"]), n + 1)
+        cur.executemany(
+            """
+            INSERT INTO archive_index (fingerprint_id, table_name, period, min_ts, max_ts, rows)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (fingerprint_id, table_name, period) DO UPDATE SET
+                min_ts = min(min_ts, excluded.min_ts),
+                max_ts = max(max_ts, excluded.max_ts),
+                rows = rows + excluded.rows
+            """,
+            [(fid, table, period, lo, hi, n) for (fid, period), (lo, hi, n) in spans.items()],
+        )
+        if table == "pain_analysis":
+            # Keeps archived complaints searchable (see PATIENT_SEARCH_DOC)
+            texts = [
+                cur.execute(f"SELECT fingerprint_id, {COMPLAINT_TEXT} FROM pain_analysis WHERE id = ?", (i,)).fetchone()
+                for i in sorted(present)
+            ]
+            cur.executemany(ARCHIVED_COMPLAINTS_ADD, texts)
+        cur.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in present])
+        return len(present)
+
+    return db_writer.write(move)
+
+
+def archive_old_rows(now=None):
+    """Move vitals and finished analyses older than ARCHIVE_AFTER_DAYS to the archive files."""
+    if not ARCHIVE_AFTER_DAYS:
+        return {}
+    now = time.time() if now is None else now
+    days = max(ARCHIVE_AFTER_DAYS, SUMMARY_PEAK_DAYS)
+    cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - days * 86400))
+    moved = {}
+    for table in ARCHIVE_TABLES:
+        moved[table] = 0
+        while True:
+            n = _archive_batch(table, cutoff)
+            moved[table] += n
+            if n < ARCHIVE_BATCH:
+                break
+    if any(moved.values()):
+        log_event(logger, logging.INFO, "archived", cutoff=cutoff, **moved)
+    return moved
+
+
+def delete_archived(fingerprint_id):
+    """Remove a patient's rows from every archive file (see delete_patient)."""
+    for path in sorted(_archive_dir().glob("archive_*.db")):
+        conn = _connect_db(path)
+        try:
+            for table in ARCHIVE_TABLES:
+                try:
+                    conn.execute(f"DELETE FROM {table} WHERE fingerprint_id = ?", (fingerprint_id,))
+                except sqlite3.OperationalError as e:
+                    if "no such table" not in str(e):
+                        raise  # e.g. locked: the rows are still there
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _archive_loop():
+    while True:
+        try:
+            archive_old_rows()
+        except Exception as e:
+            log_event(logger, logging.ERROR, "archive_failed", error=e)
+        time.sleep(ARCHIVE_INTERVAL)
+
+
+def start_archiver():
+    """Archive once at start-up (also finishing any interrupted run), then daily."""
+    if ARCHIVE_AFTER_DAYS:
+        threading.Thread(target=_archive_loop, name="archiver", daemon=True).start()
+
+
+@contextmanager
+def history_source(conn, table, columns, fingerprint_id, since=None, until=None):
+    """
+    FROM-clause source for one patient's `table` rows (selecting `columns`).
+    Hot rows only, unless archive_index says archived rows fall inside
+    [since, until); then the matching archive files are attached to `conn`
+    for the duration and UNION ALLed in. Caller adds WHERE/ORDER BY.
+    """
+    fid = int(fingerprint_id)
+    periods = [
+        r[0] for r in conn.execute(
+            """
+            SELECT period FROM archive_index
+            WHERE fingerprint_id = ? AND table_name = ?
+              AND (? IS NULL OR max_ts >= ?) AND (? IS NULL OR min_ts < ?)
+            ORDER BY period
+            """,
+            (fid, table, since, since, until, until),
+        )
+    ]
+    attached = []
     try:
-        cur.execute("ALTER TABLE pain_analysis ADD COLUMN recommendation TEXT")
-    except sqlite3.OperationalError:
-        pass
+        for period in periods:
+            path = _archive_path(period)
+            if period.isdigit() and path.exists():
+                # One alias per table, so two sources can be open on one connection
+                schema = f"archive_{table}_{period}"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+                attached.append(schema)
+        arms = [
+            f"SELECT {columns} FROM {schema}.{table} WHERE fingerprint_id = {fid}"
+            for schema in ["main", *attached]
+        ]
+        yield f"({' UNION ALL '.join(arms)})"
+    finally:
+        for schema in attached:
+            try:
+                conn.execute(f"DETACH DATABASE {schema}")
+            except sqlite3.OperationalError:
+                pass  # still in use by an open statement: ConnectionPool.release deals with it
+
+
+def history_list_sql(columns, source):
+    """SELECT of `columns` from a history_source(), ready for _keyset_sql's page clauses."""
+    return f"SELECT {columns} FROM {source} WHERE 1"
+
+
+# =============================================================================
+# BULK EXPORT / IMPORT (the whole clinical dataset as NDJSON)
+# =============================================================================
+
+# One JSON object per line: a header, then {"table": ..., "row": {...}} per
+# row and a {"checkpoint": ...} line after every EXPORT_BATCH rows. Gzipped,
+# each batch is a gzip member of its own (a .gz file may hold several), so a
+# download cut short keeps every finished batch and ?after=<checkpoint>
+# carries on after the last one.
+DATASET_FORMAT = "medbot-dataset"
+DATASET_VERSION = 1
+EXPORT_BATCH = 1000
+EXPORT_GZIP_LEVEL = 6
+# Rows per import transaction (one writer operation each)
+IMPORT_BATCH = 500
+IMPORT_READ_SIZE = 64 * 1024
+IMPORT_MAX_LINE = 1024 * 1024
+# /api/export hands out, and /api/import overwrites, every patient's records:
+# over HTTP they are off unless DATASET_API_TOKEN is set, and then need
+# "Authorization: Bearer <token>". dataset_transfer.py without --url works on
+# the database directly and needs neither.
+DATASET_API_TOKEN = os.environ.get("DATASET_API_TOKEN", "")
+# Largest request body /api/import accepts
+IMPORT_MAX_BYTES = int(float(os.environ.get("IMPORT_MAX_MB", "256")) * 1024 * 1024)
+# Exported tables in order (patients first) -> key the rows are upserted on.
+# Vitals and analyses include their archived rows; document files themselves
+# are not exported, only their metadata.
+DATASET_TABLES = {
+    "patients": "fingerprint_id",
+    "medical_history": "fingerprint_id",
+    "vitals": "id",
+    "pain_analysis": "id",
+    "doctor_documents": "id",
+}
+
+
+def _dataset_sources(table):
+    """(source, path) to read `table` from: the hot database, then each archive file by year."""
+    yield "main", DB_PATH
+    if table in ARCHIVE_TABLES:
+        for path in sorted(_archive_dir().glob("archive_*.db")):
+            yield path.stem[len("archive_"):], path
+
+
+def _source_rank(source):
+    return (source != "main", source)
+
+
+def _export_row(table, row):
+    """A row as exported: pain_analysis Q&A as readable questions/answers plus their language."""
+    data = dict(row)
+    if table == "pain_analysis":
+        ids, answers = decode_qa(data.pop("qa", None))
+        data.update(questions=question_catalog.texts(ids), answers=answers, lang=question_catalog.lang(ids))
+    return data
+
+
+def _dataset_checkpoint(value):
+    """An export checkpoint: [table, source, last key]. Raises ValueError otherwise."""
+    if not (
+        isinstance(value, list) and len(value) == 3 and value[0] in DATASET_TABLES and isinstance(value[1], str)
+        and _is_sort_value(value[2])
+    ):
+        raise ValueError("Invalid checkpoint")
+    return value
+
+
+def export_dataset(after=None):
+    """
+    Yield the export one batch at a time, as lists of NDJSON lines; every
+    batch of rows ends with its checkpoint. `after` (a checkpoint) resumes
+    an earlier export; ValueError if it is not one.
+    """
+    try:
+        start = decode_cursor(after, _dataset_checkpoint) if after else None
+    except ValueError as e:
+        raise ValueError("Invalid checkpoint") from e
+    if start is None:
+        yield [_encode_json({
+            "format": DATASET_FORMAT, "version": DATASET_VERSION, "exported_at": datetime.now().isoformat(),
+        })]
+
+    tables = list(DATASET_TABLES)
+    for table in tables[tables.index(start[0]) if start else 0:]:
+        key = DATASET_TABLES[table]
+        for source, path in _dataset_sources(table):
+            last = None
+            if start and start[0] == table:
+                if _source_rank(source) < _source_rank(start[1]):
+                    continue
+                if source == start[1]:
+                    last = start[2]
+            conn = get_db() if source == "main" else _connect_db(path)
+            conn.row_factory = sqlite3.Row
+            try:
+                if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                    continue  # archive file without this table
+                while True:
+                    # One short query per batch: no read transaction stays open between batches
+                    if last is None:
+                        rows = conn.execute(f"SELECT * FROM {table} ORDER BY {key} LIMIT ?", (EXPORT_BATCH,)).fetchall()
+                    else:
+                        rows = conn.execute(
+                            f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?", (last, EXPORT_BATCH)
+                        ).fetchall()
+                    if not rows:
+                        break
+                    last = rows[-1][key]
+                    lines = [_encode_json({"table": table, "row": _export_row(table, row)}) for row in rows]
+                    lines.append(_encode_json({"checkpoint": encode_cursor([table, source, last])}))
+                    yield lines
+                    if len(rows) < EXPORT_BATCH:
+                        break
+            finally:
+                conn.close()
+
+
+def export_chunks(after=None, compress=True):
+    """export_dataset() as bytes: one gzip member (or plain NDJSON) per batch."""
+    for lines in export_dataset(after):
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        yield gzip.compress(data, compresslevel=EXPORT_GZIP_LEVEL, mtime=0) if compress else data
+
+
+def _archived_ids(table, rows):
+    """Ids among `rows` that are already in an archive file (imported before, then archived)."""
+    by_period = {}
+    for row in rows:
+        if row.get("timestamp") and row.get("id") is not None:
+            by_period.setdefault(_archive_period(row["timestamp"]), []).append(row["id"])
+    found = set()
+    for period, ids in by_period.items():
+        path = _archive_path(period)
+        if not (period.isdigit() and path.exists()):
+            continue
+        conn = _connect_db(path)
+        try:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                try:
+                    found.update(r[0] for r in conn.execute(
+                        f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                    ))
+                except sqlite3.OperationalError:
+                    break  # this file has no such table yet
+        finally:
+            conn.close()
+    return found
+
+
+def _upsert_rows(cur, table, rows):
+    """Insert rows, or update the existing row with the same key. Unknown fields are ignored."""
+    key = DATASET_TABLES[table]
+    columns = {r["name"] for r in cur.execute(f"PRAGMA table_info({table})")}
+    groups = {}
+    for row in rows:
+        if row.get(key) is None:
+            raise ValueError(f"{table} row without {key}")
+        if table == "pain_analysis":
+            row = dict(row)
+            lang = row.pop("lang", None) or QUESTION_DEFAULT_LANG
+            questions, answers = _qa_list(row.pop("questions", None)), _qa_list(row.pop("answers", None))
+            row["qa"] = encode_qa(question_catalog.ids(cur, lang, questions), answers)
+        names = tuple(name for name in row if name in columns)
+        groups.setdefault(names, []).append(tuple(row[name] for name in names))
+    for names, values in groups.items():
+        fields = [name for name in names if name != key]
+        # Unchanged rows are left alone, so a repeated import fires no triggers
+        action = (
+            f"UPDATE SET ({', '.join(fields)}) = ({', '.join(f'excluded.{name}' for name in fields)}) "
+            f"WHERE ({', '.join(fields)}) IS NOT ({', '.join(f'excluded.{name}' for name in fields)})"
+            if fields else "NOTHING"
+        )
+        cur.executemany(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT ({key}) DO {action}",
+            values,
+        )
+
+
+class DatasetImporter:
+    """
+    Import an export (gzipped or plain NDJSON) as it arrives: feed() it
+    bytes, then finish(). Rows are upserted on their key IMPORT_BATCH at a
+    time, one writer transaction per batch, so memory stays bounded and
+    importing the same file twice leaves the data as it was. Raises
+    ValueError for malformed input; batches before it stay imported.
+    """
 
-    # Add recommendation column if missing (for existing DBs)
-    try:
-        cur.execute("ALTER TABLE pain_analysis ADD COLUMN recommendation TEXT")
-    except sqlite3.OperationalError:
-        pass
+    def __init__(self):
+        self.lines = 0
+        self.counts = {table: 0 for table in DATASET_TABLES}
+        self.counts["already_archived"] = 0
+        self._gzip = None  # decided from the first two bytes
+        self._inflate = None  # decompressor of the current gzip member
+        self._buffer = b""
+        self._pending = {}
+        self._pending_rows = 0
+
+    def feed(self, data):
+        if self._gzip is None:
+            self._buffer += data
+            if len(self._buffer) < 2:
+                return
+            self._gzip = self._buffer[:2] == b"\x1f\x8b"
+            data, self._buffer = self._buffer, b""
+        if not self._gzip:
+            self._split(data)
+            return
+        while data:
+            if self._inflate is None:
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                self._split(self._inflate.decompress(data, IMPORT_READ_SIZE))
+            except zlib.error as e:
+                raise ValueError(f"Bad gzip data: {e}") from e
+            if self._inflate.eof:
+                data, self._inflate = self._inflate.unused_data, None
+            else:
+                data = self._inflate.unconsumed_tail
+
+    def finish(self):
+        """Import what is left. Returns the row counts per table."""
+        if self._gzip is None:
+            self._gzip = False  # fewer than two bytes in all
+        if self._inflate is not None:
+            self.flush()
+            raise ValueError("Upload ended in the middle of a gzip member")
+        if self._buffer.strip():
+            self._record(self._buffer)
+        self._buffer = b""
+        self.flush()
+        return self.counts
+
+    def _split(self, data):
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            self._record(line)
+        if len(self._buffer) > IMPORT_MAX_LINE:
+            raise ValueError(f"Line {self.lines + 1} is longer than {IMPORT_MAX_LINE} bytes")
+
+    def _record(self, line):
+        self.lines += 1
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {self.lines}: not JSON ({e})") from e
+        if not isinstance(record, dict) or "checkpoint" in record:
+            return
+        if "format" in record:
+            if record["format"] != DATASET_FORMAT or record.get("version", 0) > DATASET_VERSION:
+                raise ValueError(f"Line {self.lines}: not a {DATASET_FORMAT} v{DATASET_VERSION} export")
+            return
+        table, row = record.get("table"), record.get("row")
+        if table not in DATASET_TABLES or not isinstance(row, dict):
+            raise ValueError(f"Line {self.lines}: unknown record")
+        self._pending.setdefault(table, []).append(row)
+        self._pending_rows += 1
+        if self._pending_rows >= IMPORT_BATCH:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending, self._pending_rows = self._pending, {}, 0
+        batch = []
+        for table in DATASET_TABLES:  # patients before the rows that refer to them
+            rows = pending.get(table)
+            if not rows:
+                continue
+            if table in ARCHIVE_TABLES:
+                archived = _archived_ids(table, rows)
+                self.counts["already_archived"] += len(archived)
+                rows = [row for row in rows if row.get("id") not in archived]
+            batch.append((table, rows))
+        if not batch:
+            return
+
+        def upsert(cur):
+            for table, rows in batch:
+                _upsert_rows(cur, table, rows)
 
-    conn.commit()
-    conn.close()
+        try:
+            db_writer.write(upsert)
+        except sqlite3.Error as e:
+            raise ValueError(f"Batch ending at line {self.lines}: {e}") from e
+        for table, rows in batch:
+            self.counts[table] += len(rows)
 
 
 # -----------------------------------------------------------------------------
@@ -323,6 +3071,136 @@ def body_diagram_png():
     return send_from_directory(FRONTEND_DIR, "body_diagram.png")
 
 
+# -----------------------------------------------------------------------------
+# CONDITIONAL GET AND RESPONSE CACHE (per-patient data versions)
+# -----------------------------------------------------------------------------
+
+# Serialized JSON responses kept in memory, capped in bytes for the Pi. One
+# response bigger than RESPONSE_CACHE_MAX_ENTRY (a long history page) is
+# served but not cached, so it cannot push everything else out.
+RESPONSE_CACHE_BYTES = int(float(os.environ.get("RESPONSE_CACHE_MB", "8")) * 1024 * 1024)
+RESPONSE_CACHE_MAX_ENTRY = RESPONSE_CACHE_BYTES // 16
+# Entries are checked against data versions on every hit, and the summary-peaks
+# job drops the patient list itself (see refresh_summary_peaks). The TTL only
+# bounds what neither sees, such as edits made outside the app.
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+
+class ResponseCache:
+    """
+    LRU of response bodies keyed by (scope, path, query string); scope is a
+    fingerprint ID, or "patients" for the patient list. Each entry keeps the
+    data version it was built from, and a lookup with a newer version drops
+    it. Versions are bumped by triggers inside each write transaction, so a
+    write invalidates exactly the patient it touched (and the list).
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES, ttl=RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (version, expires_at, body, mimetype)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key, version):
+        """Cached Response for key as of data version, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] != version or entry[1] <= time.monotonic()):
+                self._drop(key)
+                self.stats["invalidations"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+        return Response(entry[2], mimetype=entry[3])
+
+    def put(self, key, version, response):
+        body = response.get_data()
+        if len(body) > min(RESPONSE_CACHE_MAX_ENTRY, self.max_bytes):
+            return
+        with self._lock:
+            if key in self._entries:
+                if self._entries[key][0] > version:
+                    return  # a slower request built from older data
+                self._drop(key)
+            self._entries[key] = (version, time.monotonic() + self.ttl, body, response.mimetype)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self, scope):
+        """Drop every entry of one scope."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == scope]:
+                self._drop(key)
+                self.stats["invalidations"] += 1
+
+    def _drop(self, key):
+        self.bytes -= len(self._entries.pop(key)[2])
+
+    def describe(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+response_cache = ResponseCache()
+
+
+def patient_version(fingerprint_id):
+    """Current data version of a patient (0 if nothing was ever written)."""
+    conn = get_db()
+    row = conn.execute(
+        "SELECT version FROM patient_versions WHERE fingerprint_id = ?", (fingerprint_id,)
+    ).fetchone()
+    conn.close()
+    return row["version"] if row else 0
+
+
+def data_version():
+    """Newest version of any patient: changes on every write (see PATIENT_VERSION_NEXT)."""
+    conn = get_db()
+    version = conn.execute("SELECT coalesce(max(version), 0) FROM patient_versions").fetchone()[0]
+    conn.close()
+    return version
+
+
+def patient_etag(view):
+    """
+    Tag a per-patient GET route with the patient's data version. A request
+    whose If-None-Match still matches gets an empty 304 after a single
+    primary-key lookup, without running the route; JSON responses are also
+    served from response_cache while the version holds. The version is read
+    before the route runs, so a write landing in between only costs one
+    extra rebuild.
+    """
+    @functools.wraps(view)
+    def conditional(fingerprint_id, **kwargs):
+        version = patient_version(fingerprint_id)
+        etag = f"p{fingerprint_id}-{_VITALS_BOOT_ID}-{version}"
+        key = (fingerprint_id, request.path, request.query_string)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = response_cache.get(key, version)
+            if response is None:
+                response = app.make_response(view(fingerprint_id, **kwargs))
+                if response.status_code not in (200, 304):
+                    return response
+                if response.status_code == 200 and response.is_json and not response.is_streamed:
+                    response_cache.put(key, version, response)
+        # Weak: the same version always has the same data, not always the same bytes (report date)
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    return conditional
+
+
 # -----------------------------------------------------------------------------
 # API: PATIENT
 # -----------------------------------------------------------------------------
@@ -352,41 +3230,41 @@ def register_patient():
     if sex not in ("Male", "Female", "Other"):
         return jsonify({"ok": False, "error": "Sex must be Male, Female, or Other"}), 400
 
-    conn = get_db()
-    cur = conn.cursor()
     try:
-        cur.execute(
+        db_writer.write(lambda cur: cur.execute(
             """
             INSERT INTO patients (fingerprint_id, name, age, sex)
             VALUES (?, ?, ?, ?)
             """,
             (fingerprint_id, name, age, sex),
-        )
-        conn.commit()
+        ))
         return jsonify({"ok": True, "fingerprint_id": fingerprint_id})
     except sqlite3.IntegrityError:
         return jsonify({"ok": False, "error": "Fingerprint ID already registered"}), 400
-    finally:
-        conn.close()
 
 
 @app.route("/api/get_patient/<int:fingerprint_id>")
+@patient_etag
 def get_patient(fingerprint_id):
     """Get patient by fingerprint ID."""
     conn = get_db()
-    cur = conn.cursor()
+    data = _patient(conn.cursor(), fingerprint_id)
+    conn.close()
+
+    if not data:
+        return jsonify({"ok": False, "error": "Patient not found"}), 404
+    return jsonify({"ok": True, **data})
+
+
+def _patient(cur, fingerprint_id):
     cur.execute(
         "SELECT fingerprint_id, name, age, sex, created_at FROM patients WHERE fingerprint_id = ?",
         (fingerprint_id,),
     )
     row = cur.fetchone()
-    conn.close()
-
     if not row:
-        return jsonify({"ok": False, "error": "Patient not found"}), 404
-
-    return jsonify({
-        "ok": True,
+        return None
+    return {
         "patient": {
             "fingerprint_id": row["fingerprint_id"],
             "name": row["name"],
@@ -394,18 +3272,62 @@ def get_patient(fingerprint_id):
             "sex": row["sex"],
             "created_at": row["created_at"],
         },
-    })
+    }
+
+
+# get_all_patients ?sort= -> keyset column (patient_summary indexes cover the last two)
+PATIENT_SORT_KEYS = {"created": "created_at", "last_visit": "last_visit", "severity": "peak_severity_rank"}
+PATIENT_LIST = """
+    SELECT fingerprint_id, p.name, p.age, p.sex, p.created_at,
+           s.weight, s.height, s.heart_rate, s.spo2, s.temperature, s.blood_pressure, s.vitals_at,
+           s.latest_severity, s.latest_recommendation, s.analysis_at, s.analysis_count,
+           s.peak_severity, s.peak_severity_rank, s.last_visit
+    FROM {tables} USING (fingerprint_id) WHERE 1
+"""
+
+
+def _patient_list_sql(key):
+    """PATIENT_LIST for sort column `key`."""
+    # The table whose index gives the order goes first: with USING, the
+    # unqualified fingerprint_id tie-breaker belongs to it and needs no sort
+    tables = "patients p JOIN patient_summary s" if key == "created_at" else "patient_summary s JOIN patients p"
+    return PATIENT_LIST.format(tables=tables)
 
 
 @app.route("/api/get_all_patients")
 def get_all_patients():
-    """Return all registered patients (for doctor dashboard)."""
+    """
+    Return registered patients with their dashboard summary (latest vitals
+    and analysis, analysis count, worst severity in 30 days, last visit).
+    Optional: ?sort=created|last_visit|severity (newest/most severe first),
+    ?q= (fingerprint ID or part of the name), ?limit=&after= to page.
+    """
+    sort = request.args.get("sort") or "created"
+    if sort not in PATIENT_SORT_KEYS:
+        return jsonify({"ok": False, "error": f"sort must be one of {', '.join(PATIENT_SORT_KEYS)}"}), 400
+    try:
+        limit, after = _page_args()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    cache_key = ("patients", request.path, request.query_string)
+    version = data_version()
+    cached = response_cache.get(cache_key, version)
+    if cached is not None:
+        return cached
+
+    key = PATIENT_SORT_KEYS[sort]
+    sql = _patient_list_sql(key)
+    params = ()
+    q = (request.args.get("q") or "").strip()
+    if q:
+        sql += " AND (CAST(fingerprint_id AS TEXT) = ? OR p.name LIKE ? ESCAPE '\\')"
+        like = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params = (q, f"%{like}%")
+
     conn = get_db()
     cur = conn.cursor()
-    cur.execute(
-        "SELECT fingerprint_id, name, age, sex, created_at FROM patients ORDER BY created_at DESC"
-    )
-    rows = cur.fetchall()
+    rows, next_cursor = _keyset_page(cur, sql, params, limit, after, key=key, id_col="fingerprint_id")
     conn.close()
 
     patients = [
@@ -415,10 +3337,88 @@ def get_all_patients():
             "age": r["age"],
             "sex": r["sex"],
             "created_at": r["created_at"],
+            "latest_vitals": {
+                "weight": r["weight"],
+                "height": r["height"],
+                "heart_rate": r["heart_rate"],
+                "spo2": r["spo2"],
+                "temperature": r["temperature"],
+                "blood_pressure": r["blood_pressure"],
+                "timestamp": r["vitals_at"],
+            } if r["vitals_at"] else None,
+            "latest_severity": r["latest_severity"],
+            "latest_recommendation": r["latest_recommendation"],
+            "last_analysis_at": r["analysis_at"],
+            "analysis_count": r["analysis_count"],
+            "peak_severity_30d": r["peak_severity"],
+            "last_visit": r["last_visit"],
+        }
+        for r in rows
+    ]
+    response = jsonify({"ok": True, "patients": patients, "next": next_cursor})
+    response_cache.put(cache_key, version, response)
+    return response
+
+
+PATIENT_SEARCH_SCORE = f"bm25(patient_search, {', '.join(str(w) for w in PATIENT_SEARCH_WEIGHTS)})"
+PATIENT_SEARCH = f"""
+    SELECT p.fingerprint_id, p.name, p.age, p.sex, p.created_at, {PATIENT_SEARCH_SCORE} AS score,
+           snippet(patient_search, -1, char(2), char(3), '…', 10) AS match
+    FROM patient_search JOIN patients p ON p.fingerprint_id = patient_search.rowid
+    WHERE patient_search MATCH ?
+"""
+
+
+def _fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix
+    ("warf chest" finds "warfarin ... chest pain"). Returns "" if no words.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' for w in words[:16])
+
+
+@app.route("/api/search_patients")
+def search_patients():
+    """
+    Ranked full-text search over patient names and IDs, allergies,
+    medications and pain analyses (body part, area, AI summary).
+    Query: q=<words>, optional limit/after to page (best matches first).
+    Each result carries a `match` snippet with hits marked by \u0002...\u0003.
+    """
+    query = _fts_query(request.args.get("q") or "")
+    if not query:
+        return jsonify({"ok": False, "error": "Missing search text"}), 400
+    try:
+        limit, after = _page_args()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    limit = limit or PAGE_DEFAULT_LIMIT
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        # Best (lowest bm25) first; equal scores in fingerprint_id order
+        rows, next_cursor = _keyset_page(
+            cur, PATIENT_SEARCH, (query,), limit, after, key="score", id_col="fingerprint_id", descending=False,
+        )
+    except sqlite3.OperationalError as e:
+        return jsonify({"ok": False, "error": f"Invalid search: {e}"}), 400
+    finally:
+        conn.close()
+
+    patients = [
+        {
+            "fingerprint_id": r["fingerprint_id"],
+            "name": r["name"],
+            "age": r["age"],
+            "sex": r["sex"],
+            "created_at": r["created_at"],
+            "match": r["match"],
         }
         for r in rows
     ]
-    return jsonify({"ok": True, "patients": patients})
+    return jsonify({"ok": True, "patients": patients, "next": next_cursor})
 
 
 @app.route("/api/save_vitals", methods=["POST"])
@@ -437,33 +3437,37 @@ def save_vitals():
     except (TypeError, ValueError):
         return jsonify({"ok": False, "error": "Invalid fingerprint_id"}), 400
 
-    weight = data.get("weight")
-    height = data.get("height")
-    heart_rate = data.get("heart_rate")
-    spo2 = data.get("spo2")
-    temperature = data.get("temperature")
-    blood_pressure = data.get("blood_pressure") or ""
+    _insert_vitals(
+        fingerprint_id,
+        weight=data.get("weight"),
+        height=data.get("height"),
+        heart_rate=data.get("heart_rate"),
+        spo2=data.get("spo2"),
+        temperature=data.get("temperature"),
+        blood_pressure=data.get("blood_pressure") or "",
+    )
+    return jsonify({"ok": True})
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
+
+def _insert_vitals(fingerprint_id, weight=None, height=None, heart_rate=None,
+                   spo2=None, temperature=None, blood_pressure=""):
+    """Write one vitals row. Returns the new row id."""
+    row = (
+        fingerprint_id,
+        _float(weight),
+        _float(height),
+        _int(heart_rate),
+        _int(spo2),
+        _float(temperature),
+        str(blood_pressure),
+    )
+    return db_writer.write(lambda cur: cur.execute(
         """
         INSERT INTO vitals (fingerprint_id, weight, height, heart_rate, spo2, temperature, blood_pressure)
         VALUES (?, ?, ?, ?, ?, ?, ?)
         """,
-        (
-            fingerprint_id,
-            _float(weight),
-            _float(height),
-            _int(heart_rate),
-            _int(spo2),
-            _float(temperature),
-            str(blood_pressure),
-        ),
-    )
-    conn.commit()
-    conn.close()
-    return jsonify({"ok": True})
+        row,
+    ).lastrowid)
 
 
 def _float(v):
@@ -515,8 +3519,6 @@ def save_pain_answers():
     fingerprint_id = data.get("fingerprint_id")
     body_part = (data.get("body_part") or "").strip()
     specific_area = (data.get("specific_area") or "").strip()
-    questions = data.get("questions")  # list of question strings
-    answers = data.get("answers")     # list of answer strings
 
     if fingerprint_id is None or not body_part:
         return jsonify({"ok": False, "error": "Missing fingerprint_id or body_part"}), 400
@@ -525,22 +3527,24 @@ def save_pain_answers():
         fingerprint_id = int(fingerprint_id)
     except (TypeError, ValueError):
         return jsonify({"ok": False, "error": "Invalid fingerprint_id"}), 400
+    try:
+        questions, answers = _qa_arg(data, "questions"), _qa_arg(data, "answers")
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
-    q_json = json.dumps(questions) if questions is not None else "[]"
-    a_json = json.dumps(answers) if answers is not None else "[]"
+    lang = data.get("lang") or QUESTION_DEFAULT_LANG
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, questions, answers, severity, ai_summary)
-        VALUES (?, ?, ?, ?, ?, NULL, NULL)
-        """,
-        (fingerprint_id, body_part, specific_area, q_json, a_json),
-    )
-    conn.commit()
-    analysis_id = cur.lastrowid
-    conn.close()
+    def save(cur):
+        qa = encode_qa(question_catalog.ids(cur, lang, questions), answers)
+        return cur.execute(
+            """
+            INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, qa, severity, ai_summary)
+            VALUES (?, ?, ?, ?, NULL, NULL)
+            """,
+            (fingerprint_id, body_part, specific_area, qa),
+        ).lastrowid
+
+    analysis_id = db_writer.write(save)
     return jsonify({"ok": True, "analysis_id": analysis_id})
 
 
@@ -555,8 +3559,11 @@ def analyze_condition():
     fingerprint_id = data.get("fingerprint_id")
     body_part = data.get("body_part")
     specific_area = data.get("specific_area")
-    answers = data.get("answers")  # list
-    questions = data.get("questions")  # list
+    lang = data.get("lang")
+    try:
+        questions, answers = _qa_arg(data, "questions"), _qa_arg(data, "answers")
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
     if fingerprint_id is None or not body_part or not answers:
         return jsonify({"ok": False, "error": "Missing fingerprint_id, body_part, or answers"}), 400
@@ -579,9 +3586,8 @@ def analyze_condition():
 
     cur.execute(
         """
-        SELECT weight, height, heart_rate, spo2, temperature, blood_pressure
-        FROM vitals WHERE fingerprint_id = ?
-        ORDER BY timestamp DESC LIMIT 1
+        SELECT weight, height, heart_rate, spo2, temperature, blood_pressure, vitals_at
+        FROM patient_summary WHERE fingerprint_id = ?
         """,
         (fingerprint_id,),
     )
@@ -589,7 +3595,7 @@ def analyze_condition():
     conn.close()
 
     vitals = {}
-    if v:
+    if v and v["vitals_at"]:
         vitals = {
             "weight": v["weight"],
             "height": v["height"],
@@ -661,179 +3667,633 @@ Respond exactly in this JSON format:
 }}"""
 
 
-    if not GEMINI_API_KEY:
-        # Offline fallback: mock response for demos without API key
-        mock = {
-            "severity": "MEDIUM",
-            "summary": "Analysis completed. This is a demo result for testing purposes.",
-            "recommendation": "Doctor consultation",
+    if not GEMINI_API_KEY:
+        # Offline fallback: mock response for demos without API key
+        mock = {
+            "severity": "MEDIUM",
+            "summary": "Analysis completed. This is a demo result for testing purposes.",
+            "recommendation": "Doctor consultation",
+        }
+        _save_analysis_result(fingerprint_id, body_part, specific_area, questions, answers, mock, lang)
+        return jsonify({"ok": True, "result": mock})
+
+    err, result = _call_gemini(prompt)
+    if err:
+        return jsonify({"ok": False, "error": err}), 500
+
+    # Normalize severity
+    sev = (result.get("severity") or "MEDIUM").upper()
+    if sev not in SEVERITY_LEVELS:
+        sev = "MEDIUM"
+    result["severity"] = sev
+    result["summary"] = result.get("summary") or "No summary provided."
+    result["recommendation"] = result.get("recommendation") or "Doctor consultation"
+
+    _save_analysis_result(fingerprint_id, body_part, specific_area, questions, answers, result, lang)
+    return jsonify({"ok": True, "result": result})
+
+
+@app.route("/api/get_patient_vitals/<int:fingerprint_id>")
+@patient_etag
+def get_patient_vitals(fingerprint_id):
+    """
+    Get vitals records for a patient, newest first. ?limit=&after= to page;
+    without them the whole history is streamed (see stream_history).
+    """
+    try:
+        limit, after = _page_args()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    conn = get_db()
+    if limit is None:
+        return _stream_patient_list(conn, "vitals", "vitals", VITALS_COLUMNS, fingerprint_id, _vitals_row)
+    with history_source(conn, "vitals", VITALS_COLUMNS, fingerprint_id) as source:
+        data = _vitals_page(conn.cursor(), source, limit, after)
+    conn.close()
+    return jsonify({"ok": True, **data})
+
+
+VITALS_COLUMNS = "id, weight, height, heart_rate, spo2, temperature, blood_pressure, timestamp"
+
+
+def _vitals_page(cur, source, limit, after):
+    """One page of vitals from a history_source() of VITALS_COLUMNS."""
+    rows, next_cursor = _keyset_page(cur, history_list_sql(VITALS_COLUMNS, source), (), limit, after)
+    return {"vitals": [_vitals_row(r) for r in rows], "next": next_cursor}
+
+
+def _vitals_row(r):
+    return {
+        "weight": r["weight"],
+        "height": r["height"],
+        "heart_rate": r["heart_rate"],
+        "spo2": r["spo2"],
+        "temperature": r["temperature"],
+        "blood_pressure": r["blood_pressure"],
+        "timestamp": r["timestamp"],
+    }
+
+
+def _arduino_vitals_payload(snap):
+    """A vitals snapshot in the shape returned by /api/get_arduino_vitals."""
+    return {
+        "ok": True,
+        "heart_rate": snap.heart_rate,
+        "spo2": snap.spo2,
+        "temperature": snap.temperature,
+        "weight": snap.weight,
+        "height": snap.height,
+        "blood_pressure": snap.blood_pressure,
+        "timestamp": snap.timestamp,
+        "status": snap.status,
+        "seq": snap.seq,
+    }
+
+
+def _snapshot_response(payload, snap, scope):
+    """
+    JSON response tagged with the snapshot's sequence number. Clients that
+    send the ETag back in If-None-Match get an empty 304 until it changes.
+    """
+    response = jsonify(payload)
+    response.set_etag(f"{scope}-{_VITALS_BOOT_ID}-{snap.seq}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def _requested_device():
+    """
+    Resolve the optional ?device=<id> query parameter.
+    Returns (device or None, error response or None).
+    """
+    device_id = request.args.get("device")
+    if not device_id:
+        return None, None
+    device = arduino_devices.get(device_id)
+    if device is None:
+        return None, (jsonify({"ok": False, "error": "Unknown device"}), 404)
+    return device, None
+
+
+@app.route("/api/get_arduino_vitals")
+def get_arduino_vitals():
+    """Get latest vitals from Arduino in real-time. Optional ?device=<id> for one board."""
+    device, error = _requested_device()
+    if error:
+        return error
+    # Read the reference once; everything below comes from the same sample
+    snap = device.snapshot if device else latest_vitals
+    return _snapshot_response(_arduino_vitals_payload(snap), snap, device.device_id if device else "kiosk")
+
+
+@app.route("/api/get_arduino_devices")
+def get_arduino_devices():
+    """List connected (and previously seen) Arduino boards with health counters."""
+    return jsonify({
+        "ok": True,
+        "devices": [d.describe() for d in arduino_devices.devices()],
+        "recorder": dict(vitals_recorder.counters),
+    })
+
+
+@app.route("/api/get_db_stats")
+def get_db_stats():
+    """
+    Connection pool and writer counters (reused connections, ops per commit,
+    write latency), response cache hits/misses/evictions, archive sizes.
+    """
+    archives = {path.name: path.stat().st_size for path in sorted(_archive_dir().glob("archive_*.db"))}
+    return jsonify({
+        "ok": True,
+        "pool": _db_pool().describe(),
+        "writer": db_writer.describe(),
+        "response_cache": response_cache.describe(),
+        "hot_bytes": os.path.getsize(DB_PATH) if os.path.exists(DB_PATH) else 0,
+        "archives": archives,
+    })
+
+
+# Seconds between keep-alive comments on an idle stream (also how quickly a
+# closed browser tab is noticed and its thread released)
+VITALS_STREAM_KEEPALIVE = 15
+
+
+def _sse_message(event_id, event, payload):
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+@app.route("/api/vitals/stream")
+def vitals_stream():
+    """
+    Server-Sent Events stream of live Arduino data.
+    Events: "vitals" (same payload as /api/get_arduino_vitals) for each new
+    sample and "status" on connect/disconnect. Reconnecting browsers send
+    Last-Event-ID and get the events they missed replayed.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_id = None
+
+    client, backlog = vitals_events.subscribe(last_id)
+
+    def generate():
+        try:
+            yield "retry: 2000\n\n"
+            if backlog is None:
+                # Fresh client (or history gone): start from the current state
+                snap = latest_vitals
+                yield f"event: status\ndata: {json.dumps({'status': snap.status, 'seq': snap.seq})}\n\n"
+                yield f"event: vitals\ndata: {json.dumps(_arduino_vitals_payload(snap))}\n\n"
+                sent = 0
+            else:
+                for item in backlog:
+                    yield _sse_message(*item)
+                sent = backlog[-1][0] if backlog else last_id
+            while True:
+                if not client.wakeup.wait(VITALS_STREAM_KEEPALIVE):
+                    yield ": keepalive\n\n"
+                    continue
+                client.wakeup.clear()
+                while client.events:
+                    item = client.events.popleft()
+                    if item[0] > sent:  # already sent as part of the backlog
+                        yield _sse_message(*item)
+        finally:
+            vitals_events.unsubscribe(client)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/get_arduino_vitals_stats")
+def get_arduino_vitals_stats():
+    """
+    Windowed statistics over the live Arduino sample history.
+    Query: ?seconds=15 (default 15, max 3600), optional ?device=<id> for one
+    board. Used by the dashboard capture instead of polling and averaging in
+    the browser.
+    """
+    device, error = _requested_device()
+    if error:
+        return error
+    snap = device.snapshot if device else latest_vitals
+    try:
+        seconds = float(request.args.get("seconds", 15))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Invalid seconds"}), 400
+    if not math.isfinite(seconds) or seconds <= 0 or seconds > 3600:
+        return jsonify({"ok": False, "error": "seconds must be between 0 and 3600"}), 400
+
+    return jsonify({
+        "ok": True,
+        "seconds": seconds,
+        "status": snap.status,
+        "blood_pressure": snap.blood_pressure,
+        "stats": (device.buffer if device else vitals_buffer).window_stats(seconds),
+    })
+
+
+@app.route("/api/get_arduino_status")
+def get_arduino_status():
+    """Return current Arduino connection status and last vitals snapshot."""
+    snap = latest_vitals
+    return jsonify({
+        "status": snap.status,
+        "vitals": snap.as_dict(),
+        "devices": {d.device_id: d.status for d in arduino_devices.devices()},
+    })
+
+
+# Latest time a ?since=/?until= may name: the end of year 9999 (Unix seconds)
+TIME_ARG_MAX = 253402300799
+
+
+def _unix_time_arg(name, default=None):
+    """
+    ?name= as Unix seconds, or `default` if it is absent. Raises ValueError
+    unless it is a number from 0 to TIME_ARG_MAX (so not nan or inf).
+    """
+    value = request.args.get(name)
+    if value in (None, ""):
+        return default
+    seconds = float(value)
+    if not (math.isfinite(seconds) and 0 <= seconds <= TIME_ARG_MAX):
+        raise ValueError(f"{name} out of range")
+    return seconds
+
+
+def _time_range_args(default_seconds):
+    """Parse ?since=&until= (Unix seconds). Defaults to the last `default_seconds`."""
+    until = _unix_time_arg("until", time.time())
+    since = _unix_time_arg("since", until - default_seconds)
+    return since, until
+
+
+def _history_range_args():
+    """
+    Optional ?since=&until= (Unix seconds) for history queries, as the UTC
+    "YYYY-MM-DD HH:MM:SS" text the timestamp columns hold; None if absent.
+    Raises ValueError for anything _unix_time_arg refuses.
+    """
+    def arg(name):
+        seconds = _unix_time_arg(name)
+        return None if seconds is None else time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+    try:
+        return arg("since"), arg("until")
+    except ValueError:
+        raise ValueError("Invalid since/until") from None
+
+
+def _range_sql(since, until):
+    """WHERE conditions and params for _history_range_args()."""
+    sql, params = "", ()
+    if since is not None:
+        sql, params = sql + " AND timestamp >= ?", params + (since,)
+    if until is not None:
+        sql, params = sql + " AND timestamp < ?", params + (until,)
+    return sql, params
+
+
+@app.route("/api/get_vitals_rollups")
+def get_vitals_rollups():
+    """
+    Per-minute or per-hour sensor rollups for charts.
+    Query: channel=heart_rate, resolution=1m|1h (default 1m), since/until as
+    Unix seconds (default: last 24 h), optional device=<id>.
+    """
+    channel = _CHANNEL_INDEX.get(request.args.get("channel", ""))
+    if channel is None:
+        return jsonify({"ok": False, "error": f"channel must be one of {', '.join(VITALS_CHANNELS)}"}), 400
+    resolution = request.args.get("resolution", "1m")
+    if resolution not in VITALS_ROLLUPS:
+        return jsonify({"ok": False, "error": "resolution must be 1m or 1h"}), 400
+    try:
+        since, until = _time_range_args(86400)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Invalid since/until"}), 400
+    table, width = VITALS_ROLLUPS[resolution]
+
+    sql = f"""SELECT bucket, SUM(sample_count) AS n, SUM(total) AS total,
+                 MIN(min_value) AS lo, MAX(max_value) AS hi
+              FROM {table} WHERE channel = ? AND bucket >= ? AND bucket <= ?"""
+    params = [channel, int(since // width) * width, until]
+    device_id = request.args.get("device")
+    if device_id:
+        sql += " AND device = ?"
+        params.append(device_id)
+    sql += " GROUP BY bucket ORDER BY bucket"
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+
+    return jsonify({
+        "ok": True,
+        "channel": request.args["channel"],
+        "resolution": resolution,
+        "points": [
+            {"bucket": r["bucket"], "count": r["n"], "mean": r["total"] / r["n"], "min": r["lo"], "max": r["hi"]}
+            for r in rows
+        ],
+    })
+
+
+@app.route("/api/get_vitals_samples")
+def get_vitals_samples():
+    """
+    Raw stored samples for one channel (within the raw retention period).
+    Query: channel=heart_rate, since/until as Unix seconds (default: last
+    hour), optional device=<id>.
+    """
+    channel = _CHANNEL_INDEX.get(request.args.get("channel", ""))
+    if channel is None:
+        return jsonify({"ok": False, "error": f"channel must be one of {', '.join(VITALS_CHANNELS)}"}), 400
+    try:
+        since, until = _time_range_args(3600)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Invalid since/until"}), 400
+
+    sql = """SELECT device, start_ts, sample_count, data FROM vitals_samples
+             WHERE channel = ? AND end_ts >= ? AND start_ts <= ?"""
+    params = [channel, since, until]
+    device_id = request.args.get("device")
+    if device_id:
+        sql += " AND device = ?"
+        params.append(device_id)
+    sql += " ORDER BY start_ts"
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    samples = []
+    for r in cur.fetchall():
+        samples.extend(
+            {"device": r["device"], "ts": ts, "value": value}
+            for ts, value in decode_sample_batch(r["start_ts"], r["sample_count"], r["data"])
+            if since <= ts <= until
+        )
+    conn.close()
+    return jsonify({"ok": True, "channel": request.args["channel"], "samples": samples})
+
+
+# -----------------------------------------------------------------------------
+# API: SERVER-SIDE VITALS CAPTURE
+# The kiosk starts a capture, waits, then finishes it. The server averages the
+# samples the reader recorded in that window, so the result does not depend on
+# the browser's timers (background tabs, throttling).
+# -----------------------------------------------------------------------------
+
+CAPTURE_DEFAULT_SECONDS = 15
+CAPTURE_MAX_SECONDS = 120
+# Finishing this much before the window ends is accepted (client/server clock skew)
+CAPTURE_FINISH_TOLERANCE = 1.0
+# A channel needs this many accepted samples, and its newest one must be at
+# most CAPTURE_MAX_SAMPLE_AGE seconds older than the window end, to count
+CAPTURE_MIN_SAMPLES = 3
+CAPTURE_MAX_SAMPLE_AGE = 3.0
+# Samples further than this many scaled MADs from the median are dropped
+CAPTURE_OUTLIER_MADS = 3.0
+# Unfinished captures are forgotten after this many seconds
+CAPTURE_SESSION_TTL = 600
+
+# Values outside these ranges are sensor faults (0 = finger not on sensor, etc.)
+VITALS_PLAUSIBLE_RANGES = {
+    "heart_rate": (20, 250),
+    "spo2": (50, 100),
+    "temperature": (30.0, 45.0),
+    "weight": (1.0, 400.0),
+    "height": (30.0, 250.0),
+}
+# Decimal places stored per channel (matches what the dashboard used to round to)
+VITALS_DECIMALS = {"heart_rate": 0, "spo2": 0, "temperature": 1, "weight": 1, "height": 0}
+
+_capture_sessions = {}
+_capture_lock = threading.Lock()
+
+
+def _reject_outliers(values):
+    """Drop values far from the median (median absolute deviation test)."""
+    med = statistics.median(values)
+    mad = statistics.median(abs(v - med) for v in values)
+    # 1.4826 scales MAD to a standard deviation; the 5% floor keeps a nearly
+    # constant signal (MAD 0) from rejecting every small wobble
+    limit = max(CAPTURE_OUTLIER_MADS * 1.4826 * mad, 0.05 * abs(med))
+    return [v for v in values if abs(v - med) <= limit]
+
+
+def _aggregate_capture(buffer, started_at, ended_at):
+    """
+    Average each channel over [started_at, ended_at] after range checks and
+    outlier rejection. Returns (vitals, per-channel details).
+    """
+    windows, newest = buffer.window(started_at, ended_at)
+    vitals, details = {}, {}
+    for name, values in windows.items():
+        low, high = VITALS_PLAUSIBLE_RANGES[name]
+        plausible = [v for v in values if low <= v <= high]
+        accepted = _reject_outliers(plausible) if plausible else []
+        fresh = newest[name] is not None and ended_at - newest[name] <= CAPTURE_MAX_SAMPLE_AGE
+        value = None
+        if fresh and len(accepted) >= CAPTURE_MIN_SAMPLES:
+            value = round(sum(accepted) / len(accepted), VITALS_DECIMALS[name])
+            if VITALS_DECIMALS[name] == 0:
+                value = int(value)
+        vitals[name] = value
+        details[name] = {
+            "samples": len(values),
+            "accepted": len(accepted),
+            "rejected": len(values) - len(accepted),
+            "fresh": fresh,
         }
-        _save_analysis_result(fingerprint_id, body_part, specific_area, questions, answers, mock)
-        return jsonify({"ok": True, "result": mock})
+    return vitals, details
 
-    err, result = _call_gemini(prompt)
-    if err:
-        return jsonify({"ok": False, "error": err}), 500
 
-    # Normalize severity
-    sev = (result.get("severity") or "MEDIUM").upper()
-    if sev not in ("LOW", "MEDIUM", "HIGH", "EMERGENCY"):
-        sev = "MEDIUM"
-    result["severity"] = sev
-    result["summary"] = result.get("summary") or "No summary provided."
-    result["recommendation"] = result.get("recommendation") or "Doctor consultation"
+def _expire_capture_sessions(now):
+    for capture_id in [k for k, v in _capture_sessions.items() if now - v["started_at"] > CAPTURE_SESSION_TTL]:
+        del _capture_sessions[capture_id]
 
-    _save_analysis_result(fingerprint_id, body_part, specific_area, questions, answers, result)
-    return jsonify({"ok": True, "result": result})
 
+@app.route("/api/vitals_capture/start", methods=["POST"])
+def start_vitals_capture():
+    """
+    Start a server-side vitals capture for a patient.
+    Body: {"fingerprint_id": 123, "seconds": 15, "device": optional board id}
+    """
+    data = request.get_json() or {}
+    try:
+        fingerprint_id = int(data.get("fingerprint_id"))
+        seconds = float(data.get("seconds") or CAPTURE_DEFAULT_SECONDS)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Invalid fingerprint_id or seconds"}), 400
+    if not 0 < seconds <= CAPTURE_MAX_SECONDS:
+        return jsonify({"ok": False, "error": f"seconds must be between 0 and {CAPTURE_MAX_SECONDS}"}), 400
+
+    device_id = data.get("device")
+    if device_id and arduino_devices.get(device_id) is None:
+        return jsonify({"ok": False, "error": "Unknown device"}), 404
 
-@app.route("/api/get_patient_vitals/<int:fingerprint_id>")
-def get_patient_vitals(fingerprint_id):
-    """Get all vitals records for a patient."""
     conn = get_db()
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT weight, height, heart_rate, spo2, temperature, blood_pressure, timestamp
-        FROM vitals WHERE fingerprint_id = ?
-        ORDER BY timestamp DESC
-        """,
-        (fingerprint_id,),
-    )
-    rows = cur.fetchall()
+    cur.execute("SELECT 1 FROM patients WHERE fingerprint_id = ?", (fingerprint_id,))
+    exists = cur.fetchone() is not None
     conn.close()
+    if not exists:
+        return jsonify({"ok": False, "error": "Patient not found"}), 404
 
-    vitals = []
-    for r in rows:
-        vitals.append({
-            "weight": r["weight"],
-            "height": r["height"],
-            "heart_rate": r["heart_rate"],
-            "spo2": r["spo2"],
-            "temperature": r["temperature"],
-            "blood_pressure": r["blood_pressure"],
-            "timestamp": r["timestamp"],
-        })
-    return jsonify({"ok": True, "vitals": vitals})
-
-
-@app.route("/api/get_arduino_vitals")
-def get_arduino_vitals():
-    """Get latest vitals from Arduino in real-time."""
-    return jsonify({
-        "ok": True,
-        "heart_rate": latest_arduino_data["heart_rate"],
-        "spo2": latest_arduino_data["spo2"],
-        "temperature": latest_arduino_data["temperature"],
-        "weight": latest_arduino_data["weight"],
-        "height": latest_arduino_data["height"],
-        "timestamp": latest_arduino_data["timestamp"],
-        "status": latest_arduino_data["status"]
-    })
+    now = time.time()
+    capture_id = uuid.uuid4().hex
+    with _capture_lock:
+        _expire_capture_sessions(now)
+        _capture_sessions[capture_id] = {
+            "fingerprint_id": fingerprint_id,
+            "device": device_id,
+            "started_at": now,
+            "ends_at": now + seconds,
+        }
+    return jsonify({"ok": True, "capture_id": capture_id, "seconds": seconds})
 
 
-@app.route("/api/get_arduino_status")
-def get_arduino_status():
-    """Return current Arduino connection status and last vitals snapshot."""
-    return jsonify({
-        "status": latest_arduino_data.get("status", "disconnected"),
-        "vitals": latest_arduino_data
-    })
+@app.route("/api/vitals_capture/<capture_id>/finish", methods=["POST"])
+def finish_vitals_capture(capture_id):
+    """
+    Finish a capture: aggregate the window, save one vitals row if any
+    channel has enough fresh, plausible samples, and return the result.
+    """
+    now = time.time()
+    with _capture_lock:
+        session = _capture_sessions.get(capture_id)
+        if session is None:
+            return jsonify({"ok": False, "error": "Capture not found or expired"}), 404
+        seconds_left = session["ends_at"] - now
+        if seconds_left > CAPTURE_FINISH_TOLERANCE:
+            return jsonify({"ok": False, "error": "Capture still running", "seconds_left": round(seconds_left, 1)}), 409
+        del _capture_sessions[capture_id]
+
+    device = arduino_devices.get(session["device"]) if session["device"] else None
+    buffer = device.buffer if device else vitals_buffer
+    snap = device.snapshot if device else latest_vitals
+    ended_at = min(now, session["ends_at"])
+    vitals, details = _aggregate_capture(buffer, session["started_at"], ended_at)
+    vitals["blood_pressure"] = snap.blood_pressure or ""
+
+    saved = any(vitals[name] is not None for name in VITALS_CHANNELS)
+    if saved:
+        _insert_vitals(session["fingerprint_id"], **vitals)
+    return jsonify({"ok": True, "saved": saved, "vitals": vitals, "channels": details})
 
 
 @app.route("/api/get_patient_analyses/<int:fingerprint_id>")
+@patient_etag
 def get_patient_analyses(fingerprint_id):
-    """Get all pain analysis records for a patient."""
+    """
+    Get pain analysis records for a patient, newest first. ?limit=&after= to
+    page; without them the whole history is streamed (see stream_history).
+    """
+    try:
+        limit, after = _page_args()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
     conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT body_part, specific_area, questions, answers, severity, ai_summary, recommendation, timestamp
-        FROM pain_analysis WHERE fingerprint_id = ?
-        ORDER BY timestamp DESC
-        """,
-        (fingerprint_id,),
-    )
-    rows = cur.fetchall()
+    if limit is None:
+        return _stream_patient_list(conn, "analyses", "pain_analysis", ANALYSES_COLUMNS, fingerprint_id,
+                                    _analysis_row)
+    with history_source(conn, "pain_analysis", ANALYSES_COLUMNS, fingerprint_id) as source:
+        data = _analyses_page(conn.cursor(), source, limit, after)
     conn.close()
+    return jsonify({"ok": True, **data})
+
+
+ANALYSES_COLUMNS = "id, body_part, specific_area, qa, severity, ai_summary, recommendation, image_path, timestamp"
 
-    analyses = []
-    for r in rows:
-        try:
-            rec = r["recommendation"] or "Doctor consultation"
-        except (KeyError, TypeError):
-            rec = "Doctor consultation"
-        
-        analyses.append({
-            "body_part": r["body_part"],
-            "specific_area": r["specific_area"],
-            "questions": json.loads(r["questions"] or "[]"),
-            "answers": json.loads(r["answers"] or "[]"),
-            "severity": r["severity"],
-            "ai_summary": r["ai_summary"],
-            "recommendation": rec,
-            "timestamp": r["timestamp"],
-        })
-    return jsonify({"ok": True, "analyses": analyses})
 
+def _analyses_page(cur, source, limit, after):
+    """One page of analyses from a history_source() of ANALYSES_COLUMNS."""
+    rows, next_cursor = _keyset_page(cur, history_list_sql(ANALYSES_COLUMNS, source), (), limit, after)
+    return {"analyses": [_analysis_row(r) for r in rows], "next": next_cursor}
+
+
+def _analysis_row(r):
+    return {
+        "id": r["id"],
+        "body_part": r["body_part"],
+        "specific_area": r["specific_area"],
+        **_qa_fields(r),
+        "severity": r["severity"],
+        "ai_summary": r["ai_summary"],
+        "recommendation": r["recommendation"] or "Doctor consultation",
+        "image_path": r["image_path"],
+        "timestamp": r["timestamp"],
+    }
 
 
 @app.route("/api/delete_patient/<int:fingerprint_id>", methods=["POST"])
 def delete_patient(fingerprint_id):
     """Delete a patient and all associated data."""
-    conn = get_db()
-    cur = conn.cursor()
-    try:
+    def delete(cur):
         cur.execute("DELETE FROM patients WHERE fingerprint_id = ?", (fingerprint_id,))
         cur.execute("DELETE FROM vitals WHERE fingerprint_id = ?", (fingerprint_id,))
         cur.execute("DELETE FROM medical_history WHERE fingerprint_id = ?", (fingerprint_id,))
         cur.execute("DELETE FROM pain_analysis WHERE fingerprint_id = ?", (fingerprint_id,))
-        conn.commit()
+        cur.execute("DELETE FROM archive_index WHERE fingerprint_id = ?", (fingerprint_id,))
+        cur.execute("DELETE FROM archived_complaints WHERE fingerprint_id = ?", (fingerprint_id,))
+
+    # Archived rows go first: if that fails the patient is still all there,
+    # and the delete can simply be retried
+    try:
+        with _archive_lock:
+            delete_archived(fingerprint_id)
+            db_writer.write(delete)
         return jsonify({"ok": True})
     except Exception as e:
-        conn.rollback()
         return jsonify({"ok": False, "error": str(e)}), 500
-    finally:
-        conn.close()
 
 
-def _save_analysis_result(fingerprint_id, body_part, specific_area, questions, answers, result):
+# Newest analysis of a body part still waiting for its AI result (idx_pain_pending)
+PENDING_ANALYSIS = """
+    SELECT id FROM pain_analysis
+    WHERE fingerprint_id = ? AND body_part = ? AND severity IS NULL
+    ORDER BY timestamp DESC LIMIT 1
+"""
+
+
+def _save_analysis_result(fingerprint_id, body_part, specific_area, questions, answers, result, lang=None):
     """Update latest pain_analysis row with AI result, or insert new."""
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id FROM pain_analysis
-        WHERE fingerprint_id = ? AND body_part = ? AND severity IS NULL
-        ORDER BY timestamp DESC LIMIT 1
-        """,
-        (fingerprint_id, body_part),
-    )
-    row = cur.fetchone()
-    q_json = json.dumps(questions or [])
-    a_json = json.dumps(answers or [])
+    lang = lang or QUESTION_DEFAULT_LANG
     summary = result.get("summary") or ""
     severity = result.get("severity") or "MEDIUM"
     recommendation = result.get("recommendation") or "Doctor consultation"
 
-    if row:
-        cur.execute(
-            """
-            UPDATE pain_analysis SET questions = ?, answers = ?, severity = ?, ai_summary = ?, recommendation = ?, specific_area = ?
-            WHERE id = ?
-            """,
-            (q_json, a_json, severity, summary, recommendation, specific_area, row["id"]),
-        )
-    else:
-        cur.execute(
-            """
-            INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, questions, answers, severity, ai_summary, recommendation)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (fingerprint_id, body_part, specific_area, q_json, a_json, severity, summary, recommendation),
-        )
-    conn.commit()
-    conn.close()
+    def save(cur):
+        cur.execute(PENDING_ANALYSIS, (fingerprint_id, body_part))
+        row = cur.fetchone()
+        qa = encode_qa(question_catalog.ids(cur, lang, questions or []), answers or [])
+        if row:
+            cur.execute(
+                """
+                UPDATE pain_analysis SET qa = ?, severity = ?, ai_summary = ?, recommendation = ?, specific_area = ?
+                WHERE id = ?
+                """,
+                (qa, severity, summary, recommendation, specific_area, row["id"]),
+            )
+        else:
+            cur.execute(
+                """
+                INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, qa, severity, ai_summary, recommendation)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (fingerprint_id, body_part, specific_area, qa, severity, summary, recommendation),
+            )
+
+    db_writer.write(save)
 
 def _call_gemini(prompt):
     """
@@ -843,7 +4303,7 @@ def _call_gemini(prompt):
     import urllib.error
     import json
 
-    print(">>> _call_gemini() CALLED <<<")
+    log_event(gemini_log, logging.DEBUG, "request", prompt_chars=len(prompt))
     url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-latest:generateContent"
 
     url += f"?key={GEMINI_API_KEY}"
@@ -867,12 +4327,10 @@ def _call_gemini(prompt):
             resp = json.loads(r.read().decode("utf-8"))
     except urllib.error.HTTPError as e:
         error_body = e.read().decode("utf-8", errors="ignore")
-        print(">>> GEMINI HTTP ERROR <<<")
-        print("STATUS:", e.code)
-        print("BODY:", error_body)
+        log_event(gemini_log, logging.WARNING, "http_error", status=e.code, body=error_body[:300])
         return f"HTTP {e.code}: {error_body}", None
     except Exception as e:
-        print(">>> GEMINI GENERAL ERROR <<<", e)
+        log_event(gemini_log, logging.WARNING, "request_failed", error=e)
         return str(e), None
 
     try:
@@ -883,19 +4341,20 @@ def _call_gemini(prompt):
 
 
 
+LATEST_ANALYSIS = """
+    SELECT body_part, specific_area, qa, severity, ai_summary, recommendation, timestamp
+    FROM pain_analysis WHERE fingerprint_id = ?
+    ORDER BY timestamp DESC LIMIT 1
+"""
+
+
 @app.route("/api/get_analysis/<int:fingerprint_id>")
+@patient_etag
 def get_analysis(fingerprint_id):
     """Get latest pain analysis for patient."""
     conn = get_db()
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT body_part, specific_area, questions, answers, severity, ai_summary, recommendation, timestamp
-        FROM pain_analysis WHERE fingerprint_id = ?
-        ORDER BY timestamp DESC LIMIT 1
-        """,
-        (fingerprint_id,),
-    )
+    cur.execute(LATEST_ANALYSIS, (fingerprint_id,))
     row = cur.fetchone()
     conn.close()
 
@@ -912,8 +4371,7 @@ def get_analysis(fingerprint_id):
         "analysis": {
             "body_part": row["body_part"],
             "specific_area": row["specific_area"],
-            "questions": json.loads(row["questions"] or "[]"),
-            "answers": json.loads(row["answers"] or "[]"),
+            **_qa_fields(row),
             "severity": row["severity"],
             "ai_summary": row["ai_summary"],
             "recommendation": rec,
@@ -940,10 +4398,16 @@ def doctor_login():
 
 
 @app.route("/api/get_medical_history/<int:fingerprint_id>")
+@patient_etag
 def get_medical_history(fingerprint_id):
     """Get medical history for a patient."""
     conn = get_db()
-    cur = conn.cursor()
+    data = _medical_history(conn.cursor(), fingerprint_id)
+    conn.close()
+    return jsonify({"ok": True, **data})
+
+
+def _medical_history(cur, fingerprint_id):
     cur.execute(
         """
         SELECT fingerprint_id, current_allergies, past_allergies,
@@ -953,11 +4417,9 @@ def get_medical_history(fingerprint_id):
         (fingerprint_id,),
     )
     row = cur.fetchone()
-    conn.close()
 
     if not row:
-        return jsonify({
-            "ok": True,
+        return {
             "history": {
                 "fingerprint_id": fingerprint_id,
                 "current_allergies": "",
@@ -966,10 +4428,9 @@ def get_medical_history(fingerprint_id):
                 "past_medications": "",
                 "updated_at": None,
             },
-        })
+        }
 
-    return jsonify({
-        "ok": True,
+    return {
         "history": {
             "fingerprint_id": row["fingerprint_id"],
             "current_allergies": row["current_allergies"] or "",
@@ -978,7 +4439,7 @@ def get_medical_history(fingerprint_id):
             "past_medications": row["past_medications"] or "",
             "updated_at": row["updated_at"],
         },
-    })
+    }
 
 
 @app.route("/api/save_medical_history/<int:fingerprint_id>", methods=["POST"])
@@ -990,9 +4451,7 @@ def save_medical_history(fingerprint_id):
     curr_med = (data.get("current_medications") or "").strip()
     past_med = (data.get("past_medications") or "").strip()
 
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
+    db_writer.write(lambda cur: cur.execute(
         """
         INSERT INTO medical_history (fingerprint_id, current_allergies, past_allergies, current_medications, past_medications, updated_at)
         VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
@@ -1004,9 +4463,7 @@ def save_medical_history(fingerprint_id):
             updated_at = CURRENT_TIMESTAMP
         """,
         (fingerprint_id, curr_all, past_all, curr_med, past_med),
-    )
-    conn.commit()
-    conn.close()
+    ))
     return jsonify({"ok": True})
 
 
@@ -1028,9 +4485,45 @@ class MedicalPDF(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
+
+# Columns of the vitals and analyses printed in the patient report
+REPORT_VITALS_COLUMNS = "id, weight, height, blood_pressure, heart_rate, spo2, temperature, timestamp"
+REPORT_ANALYSES_COLUMNS = "id, body_part, specific_area, severity, ai_summary, recommendation, timestamp"
+NEWEST_ROWS = "SELECT {columns} FROM {table} WHERE fingerprint_id = ?{range} ORDER BY timestamp DESC, id DESC LIMIT ?"
+
+
+def _newest_rows(conn, table, columns, fingerprint_id, limit, since=None, until=None):
+    """
+    A patient's newest `limit` rows in [since, until). Archiving moves only
+    old rows, so the archive files are attached only when the hot rows in
+    range run out first.
+    """
+    range_sql, range_params = _range_sql(since, until)
+    order = " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    rows = conn.execute(
+        NEWEST_ROWS.format(columns=columns, table=table, range=range_sql),
+        (fingerprint_id, *range_params, limit),
+    ).fetchall()
+    if len(rows) == limit:
+        return rows
+    with history_source(conn, table, columns, fingerprint_id, since, until) as source:
+        return conn.execute(
+            f"SELECT {columns} FROM {source} WHERE 1" + range_sql + order, (*range_params, limit)
+        ).fetchall()
+
+
 @app.route("/api/export_patient_report/<int:fingerprint_id>")
+@patient_etag
 def export_patient_report(fingerprint_id):
-    """Generate comprehensive PDF report for patient."""
+    """
+    Generate comprehensive PDF report for patient. Optional ?since=&until=
+    (Unix seconds) limits the vitals and analyses to that period.
+    """
+    try:
+        since, until = _history_range_args()
+    except ValueError:
+        return jsonify({"ok": False, "error": "Invalid since/until"}), 400
+
     conn = get_db()
     cur = conn.cursor()
     
@@ -1042,19 +4535,9 @@ def export_patient_report(fingerprint_id):
         conn.close()
         return jsonify({"ok": False, "error": "Patient not found"}), 404
     
-    # Get vitals history
-    cur.execute(
-        """SELECT * FROM vitals WHERE fingerprint_id = ? ORDER BY timestamp DESC""",
-        (fingerprint_id,)
-    )
-    vitals = cur.fetchall()
-    
-    # Get pain analysis history
-    cur.execute(
-        """SELECT * FROM pain_analysis WHERE fingerprint_id = ? ORDER BY timestamp DESC""",
-        (fingerprint_id,)
-    )
-    analyses = cur.fetchall()
+    # Newest vitals and analyses (as many as the report prints)
+    vitals = _newest_rows(conn, "vitals", REPORT_VITALS_COLUMNS, fingerprint_id, 10, since, until)
+    analyses = _newest_rows(conn, "pain_analysis", REPORT_ANALYSES_COLUMNS, fingerprint_id, 5, since, until)
     
     # Get medical history
     cur.execute(
@@ -1077,7 +4560,7 @@ def export_patient_report(fingerprint_id):
     pdf.cell(0, 8, f"Name: {patient['name']}", 0, 1)
     pdf.cell(0, 8, f"Age: {patient['age']} | Sex: {patient['sex']}", 0, 1)
     pdf.cell(0, 8, f"Fingerprint ID: {patient['fingerprint_id']}", 0, 1)
-    pdf.cell(0, 8, f"Registered: {patient['registered_at']}", 0, 1)
+    pdf.cell(0, 8, f"Registered: {patient['created_at']}", 0, 1)
     pdf.ln(5)
     
     # Medical History
@@ -1159,8 +4642,22 @@ def export_patient_report(fingerprint_id):
 
 
 @app.route("/api/get_patient_timeline/<int:fingerprint_id>")
+@patient_etag
 def get_patient_timeline(fingerprint_id):
-    """Get complete patient history timeline for charts."""
+    """
+    Get patient history timeline for charts, oldest first. With ?limit=&after=
+    each page holds up to `limit` vitals and `limit` analyses; one cursor
+    tracks both lists. Without them the whole timeline is streamed (see
+    stream_history). Optional ?since=&until= (Unix seconds); archived rows
+    are included when the range reaches them.
+    """
+    try:
+        limit, after = _page_args(_timeline_position)
+        after = after or {}
+        since, until = _history_range_args()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -1171,38 +4668,114 @@ def get_patient_timeline(fingerprint_id):
             conn.close()
             return jsonify({"ok": False, "error": "Patient not found"}), 404
         
-        # Get all vitals ordered by date
-        cur.execute(
-            """SELECT weight, height, blood_pressure, heart_rate, spo2, temperature, timestamp 
-             FROM vitals WHERE fingerprint_id = ? ORDER BY timestamp ASC""",
-            (fingerprint_id,)
-        )
-        vitals = [dict(row) for row in cur.fetchall()]
-        
-        # Get all pain analyses
-        cur.execute(
-            """SELECT body_part, specific_area, severity, timestamp 
-             FROM pain_analysis WHERE fingerprint_id = ? ORDER BY timestamp ASC""",
-            (fingerprint_id,)
-        )
-        analyses = [dict(row) for row in cur.fetchall()]
-        
+        if limit is None:
+            return _stream_timeline(conn, fingerprint_id, since, until)
+        with ExitStack() as archives:
+            sources = _timeline_sources(archives, conn, fingerprint_id, after, since, until)
+            data = _timeline_page(cur, sources, limit, after, since, until)
         conn.close()
-        
-        return jsonify({
-            "ok": True,
-            "timeline": {
-                "vitals": vitals,
-                "pain_analyses": analyses
-            }
-        })
+        return jsonify({"ok": True, **data})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+# Timeline lists: cursor key -> (table, columns)
+TIMELINE_LISTS = {
+    "v": ("vitals", "id, weight, height, blood_pressure, heart_rate, spo2, temperature, timestamp"),
+    "p": ("pain_analysis", "id, body_part, specific_area, severity, timestamp"),
+}
+
+
+def _timeline_position(value):
+    """A timeline cursor: each list's keyset position, or "done". Raises ValueError otherwise."""
+    if not (isinstance(value, dict) and value and set(value) <= set(TIMELINE_LISTS)):
+        raise ValueError("Invalid cursor")
+    for position in value.values():
+        if position != "done":
+            keyset_position(position)
+    return value
+
+
+def _timeline_sources(archives, conn, fingerprint_id, after, since, until):
+    """
+    history_source() for each timeline list not finished yet, kept open (and
+    any archive files attached) until the `archives` ExitStack closes.
+    """
+    return {
+        key: archives.enter_context(history_source(conn, table, columns, fingerprint_id, since, until))
+        for key, (table, columns) in TIMELINE_LISTS.items()
+        if after.get(key) != "done"
+    }
+
+
+def _timeline_page(cur, sources, limit, after, since, until):
+    """One timeline page, oldest first (a finished list is marked done in the cursor)."""
+    range_sql, range_params = _range_sql(since, until)
+    lists, positions = {"v": [], "p": []}, {}
+    for key, source in sources.items():
+        rows, next_cursor = _keyset_page(
+            cur, history_list_sql(TIMELINE_LISTS[key][1], source) + range_sql,
+            range_params, limit, after.get(key), descending=False,
+        )
+        lists[key] = [_without_id(row) for row in rows]
+        positions[key] = decode_cursor(next_cursor) if next_cursor else "done"
+
+    positions = {"v": after.get("v", "done"), "p": after.get("p", "done"), **positions}
+    done = positions["v"] == "done" and positions["p"] == "done"
+    return {
+        "timeline": {
+            "vitals": lists["v"],
+            "pain_analyses": lists["p"]
+        },
+        "next": None if done else encode_cursor(positions),
+    }
+
+
+def _stream_patient_list(conn, name, table, columns, fingerprint_id, to_dict):
+    """A patient's whole `table` history as the stream `name`, archived rows included."""
+    stack = ExitStack()
+    stack.callback(conn.close)
+    try:
+        source = stack.enter_context(history_source(conn, table, columns, fingerprint_id))
+        cur = stack.enter_context(closing(conn.cursor()))
+        lists = {name: (_keyset_rows(cur, history_list_sql(columns, source), ()), to_dict)}
+    except Exception:
+        stack.close()
+        raise
+    return stream_history(lists, stack.close)
+
+
+def _stream_timeline(conn, fingerprint_id, since, until):
+    """The whole timeline as one stream; the archives stay attached until it ends."""
+    range_sql, range_params = _range_sql(since, until)
+    stack = ExitStack()
+    stack.callback(conn.close)
+    try:
+        sources = _timeline_sources(stack, conn, fingerprint_id, {}, since, until)
+        # Both queries start before the first row is sent, so they read the same snapshot
+        lists = {}
+        for key, name in (("v", "vitals"), ("p", "pain_analyses")):
+            cur = stack.enter_context(closing(conn.cursor()))
+            lists[name] = (_keyset_rows(cur, history_list_sql(TIMELINE_LISTS[key][1], sources[key]) + range_sql,
+                                        range_params, descending=False), _without_id)
+    except Exception:
+        stack.close()
+        raise
+    return stream_history(lists, stack.close, nest="timeline")
+
+
 @app.route("/api/compare_analyses/<int:fingerprint_id>")
+@patient_etag
 def compare_analyses(fingerprint_id):
-    """Compare pain analyses over time."""
+    """
+    Compare pain analyses over time, newest first. ?limit=&after= to page;
+    by_body_part groups the analyses in this page, total_count counts all.
+    """
+    try:
+        limit, after = _page_args()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -1213,32 +4786,102 @@ def compare_analyses(fingerprint_id):
             conn.close()
             return jsonify({"ok": False, "error": "Patient not found"}), 404
         
-        cur.execute(
-            """SELECT body_part, specific_area, severity, ai_summary, recommendation, timestamp 
-             FROM pain_analysis WHERE fingerprint_id = ? ORDER BY timestamp DESC""",
-            (fingerprint_id,)
-        )
-        analyses = [dict(row) for row in cur.fetchall()]
+        with history_source(conn, "pain_analysis", COMPARISON_COLUMNS, fingerprint_id) as source:
+            data = _comparison_page(cur, source, limit, after)
         conn.close()
-        
-        # Group by body part
-        by_body_part = {}
-        for analysis in analyses:
-            part = analysis['body_part']
-            if part not in by_body_part:
-                by_body_part[part] = []
-            by_body_part[part].append(analysis)
-        
-        return jsonify({
-            "ok": True,
-            "analyses": analyses,
-            "by_body_part": by_body_part,
-            "total_count": len(analyses)
-        })
+        return jsonify({"ok": True, **data})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+COMPARISON_COLUMNS = "id, body_part, specific_area, severity, ai_summary, recommendation, timestamp"
+
+
+def _comparison_page(cur, source, limit, after):
+    """One compare_analyses page from a history_source() of (at least) COMPARISON_COLUMNS."""
+    rows, next_cursor = _keyset_page(cur, history_list_sql(COMPARISON_COLUMNS, source), (), limit, after)
+    analyses = [_without_id(row) for row in rows]
+    if next_cursor is None and after is None:
+        total_count = len(analyses)
+    else:
+        cur.execute(f"SELECT COUNT(*) FROM {source}")
+        total_count = cur.fetchone()[0]
+    
+    # Group by body part
+    by_body_part = {}
+    for analysis in analyses:
+        part = analysis['body_part']
+        if part not in by_body_part:
+            by_body_part[part] = []
+        by_body_part[part].append(analysis)
+    
+    return {
+        "analyses": analyses,
+        "by_body_part": by_body_part,
+        "total_count": total_count,
+        "next": next_cursor,
+    }
+
+
+# patient_bundle sections. Each has the JSON (minus "ok") of the endpoint it
+# replaces: get_patient, get_medical_history, get_patient_vitals,
+# get_patient_analyses, get_patient_timeline, compare_analyses and
+# get_doctor_documents. Paged sections hold the first page and its "next"
+# cursor, which that endpoint continues from.
+BUNDLE_SECTIONS = ("patient", "history", "vitals", "analyses", "timeline", "compare", "documents")
+
+
+@app.route("/api/patient_bundle/<int:fingerprint_id>")
+@patient_etag
+def patient_bundle(fingerprint_id):
+    """
+    Everything the doctor dashboard shows for a patient in one request, read
+    from one consistent snapshot on one connection.
+    Query: include=<comma-separated BUNDLE_SECTIONS> (default all),
+    limit=<page size for the paged sections>.
+    """
+    include = [name.strip() for name in (request.args.get("include") or ",".join(BUNDLE_SECTIONS)).split(",")]
+    unknown = [name for name in include if name not in BUNDLE_SECTIONS]
+    if unknown:
+        return jsonify({"ok": False, "error": f"Unknown section(s): {', '.join(unknown)}"}), 400
+    try:
+        limit = _page_args()[0] or PAGE_DEFAULT_LIMIT
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        with ExitStack() as archives:
+            # Archive files can only be attached outside a transaction. One
+            # source per table (an archive file is attached once per table)
+            # selects every column the sections below read.
+            vitals = archives.enter_context(history_source(conn, "vitals", VITALS_COLUMNS, fingerprint_id))
+            analyses = archives.enter_context(
+                history_source(conn, "pain_analysis", ANALYSES_COLUMNS, fingerprint_id)
+            )
+            cur.execute("BEGIN")
+            try:
+                patient = _patient(cur, fingerprint_id)
+                if not patient:
+                    return jsonify({"ok": False, "error": "Patient not found"}), 404
+                loaders = {
+                    "patient": lambda: patient,
+                    "history": lambda: _medical_history(cur, fingerprint_id),
+                    "vitals": lambda: _vitals_page(cur, vitals, limit, None),
+                    "analyses": lambda: _analyses_page(cur, analyses, limit, None),
+                    "timeline": lambda: _timeline_page(cur, {"v": vitals, "p": analyses}, limit, {}, None, None),
+                    "compare": lambda: _comparison_page(cur, analyses, limit, None),
+                    "documents": lambda: _documents(cur, fingerprint_id),
+                }
+                bundle = {name: loaders[name]() for name in dict.fromkeys(include)}
+            finally:
+                conn.rollback()
+    finally:
+        conn.close()
+    return jsonify({"ok": True, **bundle})
+
+
 @app.route("/api/upload_doctor_document/<int:fingerprint_id>", methods=["POST"])
 def upload_doctor_document(fingerprint_id):
     """Allow doctors to upload PDF documents for patients."""
@@ -1263,50 +4906,32 @@ def upload_doctor_document(fingerprint_id):
     file.save(filepath)
     
     # Store reference in database
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """CREATE TABLE IF NOT EXISTS doctor_documents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fingerprint_id INTEGER NOT NULL,
-            filename TEXT NOT NULL,
-            filepath TEXT NOT NULL,
-            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (fingerprint_id) REFERENCES patients(fingerprint_id)
-        )"""
-    )
-    cur.execute(
+    db_writer.write(lambda cur: cur.execute(
         """INSERT INTO doctor_documents (fingerprint_id, filename, filepath) 
          VALUES (?, ?, ?)""",
         (fingerprint_id, filename, str(filepath))
-    )
-    conn.commit()
-    conn.close()
+    ))
     
     return jsonify({"ok": True, "message": "File uploaded successfully", "filename": filename})
 
 
 @app.route("/api/get_doctor_documents/<int:fingerprint_id>")
+@patient_etag
 def get_doctor_documents(fingerprint_id):
     """Get list of doctor uploaded documents for a patient."""
     conn = get_db()
-    cur = conn.cursor()
-    
-    # Check if table exists
-    cur.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='doctor_documents'""")
-    if not cur.fetchone():
-        conn.close()
-        return jsonify({"ok": True, "documents": []})
-    
+    data = _documents(conn.cursor(), fingerprint_id)
+    conn.close()
+    return jsonify({"ok": True, **data})
+
+
+def _documents(cur, fingerprint_id):
     cur.execute(
         """SELECT id, filename, uploaded_at FROM doctor_documents 
          WHERE fingerprint_id = ? ORDER BY uploaded_at DESC""",
         (fingerprint_id,)
     )
-    documents = [dict(row) for row in cur.fetchall()]
-    conn.close()
-    
-    return jsonify({"ok": True, "documents": documents})
+    return {"documents": [dict(row) for row in cur.fetchall()]}
 
 
 @app.route("/api/download_document/<int:doc_id>")
@@ -1356,16 +4981,11 @@ def upload_body_part_image(fingerprint_id):
     file.save(filepath)
     
     # Update pain_analysis with image path
-    conn = get_db()
-    cur = conn.cursor()
-    
     try:
-        cur.execute(
+        db_writer.write(lambda cur: cur.execute(
             """UPDATE pain_analysis SET image_path = ? WHERE id = ? AND fingerprint_id = ?""",
             (str(filepath), pain_id, fingerprint_id)
-        )
-        conn.commit()
-        conn.close()
+        ))
         
         return jsonify({
             "ok": True, 
@@ -1374,11 +4994,11 @@ def upload_body_part_image(fingerprint_id):
             "image_path": str(filepath)
         })
     except Exception as e:
-        conn.close()
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
 @app.route("/api/get_body_part_image/<int:fingerprint_id>/<int:pain_id>")
+@patient_etag
 def get_body_part_image(fingerprint_id, pain_id):
     """Get body part image for a pain analysis."""
     conn = get_db()
@@ -1400,12 +5020,95 @@ def get_body_part_image(fingerprint_id, pain_id):
         return jsonify({"ok": False, "error": "File not found"}), 404
 
 
+# -----------------------------------------------------------------------------
+# API: BULK EXPORT / IMPORT
+# -----------------------------------------------------------------------------
+
+
+def dataset_token_required(view):
+    """Guard a dataset route with DATASET_API_TOKEN (403 while unset, 401 without the token)."""
+    @functools.wraps(view)
+    def guarded(**kwargs):
+        if not DATASET_API_TOKEN:
+            return jsonify({"ok": False, "error": "Dataset transfer over HTTP is disabled"}), 403
+        given = request.headers.get("Authorization", "").encode("utf-8")
+        if not hmac.compare_digest(given, f"Bearer {DATASET_API_TOKEN}".encode("utf-8")):
+            return jsonify({"ok": False, "error": "Invalid or missing token"}), 401
+        return view(**kwargs)
+
+    return guarded
+
+
+@app.route("/api/export")
+@dataset_token_required
+def export_data():
+    """
+    Stream the whole clinical dataset as gzipped NDJSON (see DATASET_FORMAT).
+    ?after=<checkpoint> resumes a cut-off download; ?gzip=0 for plain NDJSON.
+    """
+    after = request.args.get("after")
+    compress = request.args.get("gzip", "1") != "0"
+    chunks = export_chunks(after, compress)
+    try:
+        first = next(chunks)  # validates ?after= while an error can still be sent
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except StopIteration:
+        first = b""
+
+    def generate():
+        yield first
+        yield from chunks
+
+    filename = f"medbot_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson" + (".gz" if compress else "")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/gzip" if compress else NDJSON_MIMETYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/import", methods=["POST"])
+@dataset_token_required
+def import_data():
+    """
+    Import an /api/export file sent as the raw request body (gzipped or
+    plain NDJSON), of at most IMPORT_MAX_BYTES. Rows are upserted, so
+    re-sending a file is harmless.
+    """
+    too_large = {"ok": False, "error": f"Import is larger than {IMPORT_MAX_BYTES} bytes"}
+    if (request.content_length or 0) > IMPORT_MAX_BYTES:
+        return jsonify(too_large), 413
+    importer = DatasetImporter()
+    received = 0
+    try:
+        while True:
+            chunk = request.stream.read(IMPORT_READ_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > IMPORT_MAX_BYTES:
+                # No Content-Length (chunked upload): batches so far stay imported
+                return jsonify({**too_large, "imported": importer.counts}), 413
+            importer.feed(chunk)
+        importer.finish()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e), "imported": importer.counts}), 400
+    log_event(logger, logging.INFO, "dataset_imported", lines=importer.lines, **importer.counts)
+    return jsonify({"ok": True, "imported": importer.counts})
+
+
 # -----------------------------------------------------------------------------
 # MAIN
 # -----------------------------------------------------------------------------
 
 if __name__ == "__main__":
+    setup_logging()
     init_db()
-    print("Medical Triage App running at http://localhost:5000")
-    print("Set GEMINI_API_KEY for AI analysis. Optional for demos (mock result used).")
+    atexit.register(db_writer.close)
+    start_arduino_reader()
+    start_archiver()
+    start_summary_expiry()
+    log_event(logger, logging.INFO, "started", url="http://localhost:5000", log_file=LOG_PATH,
+              gemini="configured" if GEMINI_API_KEY else "not set (mock results)")
     app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
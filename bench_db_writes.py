@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent vitals writes, one commit per request vs the group-
+committing writer thread (db_writer in backend/app.py). Reports throughput,
+write latency and the number of commits. With synchronous=FULL every commit
+is one fsync of the WAL, so commits = fsyncs; with NORMAL (the app default)
+fsyncs only happen at checkpoints.
+Runs against a scratch database. No server needed.
+
+Usage: python bench_db_writes.py [threads] [writes_per_thread] [FULL|NORMAL]
+"""
+
+import sys
+import time
+import tempfile
+import threading
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+INSERT = """
+    INSERT INTO vitals (fingerprint_id, weight, height, heart_rate, spo2, temperature, blood_pressure)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+ROW = (1, 70.5, 170.0, 72, 98, 36.8, "120/80")
+
+
+def commit_per_request():
+    """The pre-writer pattern: own connection, own transaction."""
+    conn = backend.get_db()
+    conn.execute(INSERT, ROW)
+    conn.commit()
+    conn.close()
+
+
+def group_commit():
+    backend.db_writer.write(lambda cur: cur.execute(INSERT, ROW))
+
+
+def run(write, threads, per_thread):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        mine = []
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            write()
+            mine.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "writes_per_s": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    sync = (sys.argv[3] if len(sys.argv) > 3 else "FULL").upper()
+    backend.DB_PRAGMAS = tuple(
+        f"PRAGMA synchronous={sync}" if p.startswith("PRAGMA synchronous") else p for p in backend.DB_PRAGMAS
+    )
+    print("=" * 50)
+    print(f"DB WRITE BENCHMARK ({threads} threads x {per_thread} writes, synchronous={sync})")
+    print("=" * 50)
+
+    for name, write in (("before: commit per request", commit_per_request), ("after: group commit", group_commit)):
+        backend.DB_PATH = str(Path(tempfile.mkdtemp()) / "bench.db")
+        backend.init_db()
+        commits_before = backend.db_writer.stats["commits"]
+        r = run(write, threads, per_thread)
+        total = threads * per_thread
+        commits = total if write is commit_per_request else backend.db_writer.stats["commits"] - commits_before
+        print(f"\n{name}")
+        print(f"   Throughput: {r['writes_per_s']:,.0f} writes/s")
+        print(f"   Latency: p50 {r['p50']:.2f} ms, p99 {r['p99']:.2f} ms")
+        print(f"   Commits: {commits} for {total} writes ({total / commits:.1f} writes/commit)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Arduino link parsers, JSON lines vs binary (bin1) frames.
+Decodes a pre-built stream of samples with the same framer/decoder code the
+serial reader uses and reports frames per second and wire size per sample.
+No Arduino or running server required.
+
+Usage: python bench_serial_protocol.py [samples] [chunk_bytes]
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+SAMPLE = {"heart_rate": 72, "spo2": 98, "temperature": 36.8, "weight": 70.5, "height": 170.0}
+
+
+def json_stream(n):
+    line = json.dumps({"hr": 72, "spo2": 98, "temp": 36.8, "weight": 70.5, "height": 170.0}) + "\r\n"
+    return line.encode() * n, len(line)
+
+
+def binary_stream(n):
+    frames = [backend.encode_vitals_frame(SAMPLE, seq=i) for i in range(n)]
+    return b"".join(frames), len(frames[0])
+
+
+def parse_json(stream, chunk):
+    framer = backend.LineFramer()
+    count = 0
+    for i in range(0, len(stream), chunk):
+        for line in framer.feed(stream[i:i + chunk]):
+            if backend.parse_arduino_json(line) is not None:
+                count += 1
+    return count
+
+
+def parse_binary(stream, chunk):
+    decoder = backend.BinaryFrameDecoder()
+    count = 0
+    for i in range(0, len(stream), chunk):
+        for payload in decoder.feed(stream[i:i + chunk]):
+            if backend.decode_vitals_frame(payload) is not None:
+                count += 1
+    return count
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    chunk = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    print("=" * 50)
+    print(f"SERIAL PROTOCOL BENCHMARK ({n} samples, {chunk}-byte reads)")
+    print("=" * 50)
+    for name, build, parse, baud in (
+        ("JSON lines", json_stream, parse_json, backend.ARDUINO_BAUD),
+        ("binary frames (bin1)", binary_stream, parse_binary, backend.ARDUINO_FAST_BAUD),
+    ):
+        stream, size = build(n)
+        start = time.perf_counter()
+        decoded = parse(stream, chunk)
+        elapsed = time.perf_counter() - start
+        print(f"\n{name}")
+        print(f"   Decoded: {decoded}/{n}")
+        print(f"   Parser: {decoded / elapsed:,.0f} frames/s")
+        print(f"   Wire size: {size} bytes/sample, link limit {baud // (10 * size)} samples/s at {baud} baud")
+
+
+if __name__ == "__main__":
+    main()
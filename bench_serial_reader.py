@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Arduino serial reader CPU use and sample latency.
+Feeds sketch-style JSON lines into one pseudo-terminal per board and compares
+the old in_waiting polling loop with the per-board ArduinoDevice readers in
+backend/app.py. Linux/macOS only (needs a pty). No Arduino or running server
+required.
+
+Usage: python bench_serial_reader.py [seconds] [lines_per_second] [boards]
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import statistics
+from pathlib import Path
+
+import serial
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+
+def legacy_readers(ports):
+    """The pre-framing loop, one thread per board: poll in_waiting with no sleep, readline() when non-empty."""
+    stop = threading.Event()
+
+    def read(ser):
+        while not stop.is_set():
+            if ser.in_waiting > 0:
+                backend.handle_arduino_line(ser.readline())
+
+    threads = []
+    for port in ports:
+        ser = serial.Serial(port, backend.ARDUINO_BAUD, timeout=backend.ARDUINO_READ_TIMEOUT)
+        threads.append((threading.Thread(target=read, args=(ser,), daemon=True), ser))
+    for thread, _ in threads:
+        thread.start()
+
+    def close():
+        stop.set()
+        for thread, ser in threads:
+            thread.join(timeout=2)
+            ser.close()
+    return close
+
+
+def device_readers(ports):
+    """One ArduinoDevice reader thread per board, as discovery would attach them."""
+    manager = backend.ArduinoDeviceManager()
+    for n, port in enumerate(ports):
+        ser = serial.Serial(port, backend.ARDUINO_BAUD, timeout=backend.ARDUINO_READ_TIMEOUT)
+        manager._attach(port, ser, {"status": backend.ARDUINO_BANNER_STATUS, "device": f"board{n}"})
+
+    def close():
+        manager.stop(timeout=2 * backend.ARDUINO_READ_TIMEOUT)
+    return close
+
+
+def run(readers, seconds, rate, boards):
+    ptys = [os.openpty() for _ in range(boards)]
+    client, _ = backend.vitals_events.subscribe()
+    stop = threading.Event()
+    sent_at = {}
+    latencies = []
+
+    def collect():
+        # The sample number travels in the "weight" field
+        while not stop.is_set():
+            if not client.wakeup.wait(0.5):
+                continue
+            client.wakeup.clear()
+            now = time.perf_counter()
+            while client.events:
+                _, event, payload = client.events.popleft()
+                seq = json.loads(payload).get("weight") if event == "vitals" else None
+                if seq in sent_at:
+                    latencies.append((now - sent_at.pop(seq)) * 1000)
+
+    collector = threading.Thread(target=collect, daemon=True)
+    collector.start()
+    close = readers([os.ttyname(slave) for _, slave in ptys])
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    interval = 1.0 / rate
+    seq = 0
+    while time.perf_counter() - wall0 < seconds:
+        # Every board sends one line per interval
+        for master, _ in ptys:
+            seq += 1
+            line = json.dumps({"hr": 72, "spo2": 98, "temp": 36.8, "weight": float(seq), "height": 170.0})
+            sent_at[float(seq)] = time.perf_counter()
+            os.write(master, (line + "\r\n").encode())
+        time.sleep(interval)
+    time.sleep(0.2)  # let the last lines drain
+    cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - wall0
+
+    stop.set()
+    close()
+    collector.join(timeout=2)
+    backend.vitals_events.unsubscribe(client)
+    for master, slave in ptys:
+        os.close(master)
+        os.close(slave)
+    return {
+        "cpu_percent": 100.0 * cpu / wall,
+        "sent": seq,
+        "received": len(latencies),
+        "latency_ms_median": statistics.median(latencies) if latencies else None,
+        "latency_ms_max": max(latencies) if latencies else None,
+    }
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    boards = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    print("=" * 50)
+    print(f"SERIAL READER BENCHMARK ({seconds:g}s, {rate:g} lines/s, {boards} board(s))")
+    print("=" * 50)
+    for name, readers in (("before: in_waiting poll", legacy_readers),
+                          ("after: ArduinoDevice readers", device_readers)):
+        r = run(readers, seconds, rate, boards)
+        print(f"\n{name}")
+        print(f"   CPU: {r['cpu_percent']:.1f}% of one core")
+        print(f"   Lines: {r['received']}/{r['sent']}")
+        if r["received"]:
+            print(f"   Latency: median {r['latency_ms_median']:.2f} ms, max {r['latency_ms_max']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
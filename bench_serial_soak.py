@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Soak test: the backend's Arduino reader against a virtual Arduino
+(arduino_simulator.py) with jitter, noise, garbage lines and periodic
+disconnects. The board is attached through ArduinoDeviceManager, so after a
+drop its ArduinoDevice reopens the port itself, as it would on the robot.
+Reports ingest throughput, reconnect time and reader CPU use.
+Linux/macOS only (needs a pty). No Arduino or running server required.
+
+Usage: python bench_serial_soak.py [seconds] [json|binary] [rate]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+PROTOCOL = sys.argv[2] if len(sys.argv) > 2 else "json"
+os.environ["ARDUINO_PROTOCOL"] = PROTOCOL  # read by the backend at import
+
+sys.path.insert(0, str(ROOT / "backend"))
+import app as backend  # noqa: E402
+
+DISCONNECT_EVERY = 10
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    link = os.path.join(tempfile.mkdtemp(), "ttyVIRT0")
+    print("=" * 50)
+    print(f"SERIAL SOAK TEST ({seconds:g}s, {PROTOCOL}, {rate:g} samples/s)")
+    print("=" * 50)
+
+    # Separate process, so process_time() below only counts the reader side
+    sim = subprocess.Popen(
+        [sys.executable, str(ROOT / "arduino_simulator.py"), "--link", link,
+         "--rate", str(rate), "--binary-rate", str(rate), "--jitter", "0.3", "--garbage", "0.02",
+         "--disconnect-every", str(DISCONNECT_EVERY), "--seed", "1"],
+        stdout=subprocess.DEVNULL,
+    )
+    manager = backend.arduino_devices
+    client, _ = backend.vitals_events.subscribe()
+    try:
+        while not os.path.exists(link):
+            time.sleep(0.01)
+
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        samples = 0
+        down_at = None
+        reconnects = []
+        while time.perf_counter() - wall0 < seconds:
+            # Stand-in for the discovery loop (which would probe every serial
+            # port): claim the link whenever no reader has it
+            if not any(d.active for d in manager.devices()):
+                manager.discover([link])
+            if not client.wakeup.wait(0.5):
+                continue
+            client.wakeup.clear()
+            now = time.perf_counter()
+            while client.events:
+                _, event, payload = client.events.popleft()
+                if event == "vitals":
+                    samples += 1
+                    if down_at is not None:
+                        # Reconnect time: link lost -> first sample on the new link
+                        reconnects.append(now - down_at)
+                        down_at = None
+                elif event == "status" and '"disconnected"' in payload and down_at is None:
+                    down_at = now
+        cpu = time.process_time() - cpu0
+        wall = time.perf_counter() - wall0
+    finally:
+        manager.stop(timeout=2 * backend.ARDUINO_READ_TIMEOUT)
+        sim.terminate()
+        sim.wait()
+        backend.vitals_events.unsubscribe(client)
+
+    device = manager.get("vitals")
+    health = device.health if device else {}
+    print(f"\n   Samples ingested: {samples} ({samples / wall:.1f}/s)")
+    print(f"   Skipped lines/frames: {health.get('skipped_frames', 0)}, CRC errors: {health.get('crc_errors', 0)}")
+    print(f"   Link drops: {len(reconnects)}, reopened by the reader: {health.get('reconnects', 0)}")
+    if reconnects:
+        print(f"   Reconnect time: median {statistics.median(reconnects):.2f} s, max {max(reconnects):.2f} s")
+    print(f"   Reader CPU: {100.0 * cpu / wall:.1f}% of one core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Shared pytest fixtures for the backend tests (test_*.py). Each test gets its
+own scratch database under pytest's tmp_path; the backend globals pointed at
+it are put back afterwards, so the tests don't depend on their order.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+
+def _close_pool(path):
+    """Close the idle pooled connections to a scratch database."""
+    pool = backend._db_pools.pop(path, None)
+    if pool is not None:
+        with pool._lock:
+            idle, pool._idle = pool._idle, []
+        for conn in idle:
+            conn.close()
+
+
+@pytest.fixture
+def use_db(monkeypatch):
+    """
+    use_db(path) points the backend at an existing database file, with an
+    empty response cache, until the end of the test.
+    """
+    paths = []
+
+    def use(path):
+        path = str(path)
+        monkeypatch.setattr(backend, "DB_PATH", path)
+        # Cached responses belong to the previous database
+        monkeypatch.setattr(backend, "response_cache", backend.ResponseCache())
+        paths.append(path)
+        return path
+
+    yield use
+    for path in paths:
+        _close_pool(path)
+
+
+@pytest.fixture
+def scratch_db(tmp_path, use_db):
+    """
+    scratch_db(name) creates a fresh, migrated database in its own directory
+    under tmp_path (its archive files go next to it) and points the backend
+    at it; call it again for a second database in the same test. Returns the
+    path.
+    """
+    def create(name="test.db"):
+        directory = tmp_path / Path(name).stem
+        directory.mkdir()
+        path = use_db(directory / name)
+        backend.init_db()
+        return path
+
+    return create
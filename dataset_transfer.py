@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Export or import the whole clinical dataset (patients, vitals, medical
+history, pain analyses, document metadata) as NDJSON, the same format as
+/api/export and /api/import in backend/app.py.
+
+Works on the local database directly, or on a running robot with --url
+(which needs the robot's DATASET_API_TOKEN, from --token or the environment).
+An interrupted export can be continued with --resume: the file is cut back
+to its last complete batch and the export carries on from its checkpoint.
+Importing is idempotent; re-running an import changes nothing.
+
+Usage:
+    python dataset_transfer.py export medbot.ndjson.gz [--resume] [--plain] [--url URL [--token T] | --db PATH]
+    python dataset_transfer.py import medbot.ndjson.gz [--url URL [--token T] | --db PATH]
+"""
+
+import os
+import sys
+import json
+import zlib
+import argparse
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+READ_SIZE = backend.IMPORT_READ_SIZE
+
+
+def _auth(args):
+    return {"Authorization": f"Bearer {args.token}"} if args.token else {}
+
+
+def _http_error(e):
+    """The error message of a failed request ({"ok": false, "error": ...}), or its HTTP status."""
+    try:
+        return json.load(e).get("error") or str(e)
+    except ValueError:
+        return str(e)
+
+
+def _complete_batches(path):
+    """Yield (end offset, last line) for each complete gzip member of an export file."""
+    with open(path, "rb") as f:
+        offset = 0  # file offset of the start of `data`
+        data = b""
+        inflate = None
+        while True:
+            if not data:
+                data = f.read(READ_SIZE)
+                if not data:
+                    return
+            if inflate is None:
+                inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                tail = b""
+            try:
+                tail = (tail + inflate.decompress(data))[-4096:]
+            except zlib.error:
+                return
+            if inflate.eof:
+                rest = inflate.unused_data
+                offset += len(data) - len(rest)
+                yield offset, tail.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+                data, inflate = rest, None
+            else:
+                offset += len(data)
+                data = b""
+
+
+def _complete_lines(path):
+    """Yield (end offset, line) for each complete line of a plain NDJSON export file."""
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            yield offset, line
+
+
+def resume_point(path, compressed):
+    """(checkpoint, offset) after the last complete batch in `path`; (None, 0) to start over."""
+    checkpoint, good = None, 0
+    for offset, line in (_complete_batches(path) if compressed else _complete_lines(path)):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and "checkpoint" in record:
+            checkpoint, good = record["checkpoint"], offset
+    return checkpoint, good
+
+
+def export(args):
+    compressed = not args.plain
+    after, offset = None, 0
+    if args.resume and os.path.exists(args.file):
+        after, offset = resume_point(args.file, compressed)
+        print(f"Resuming after byte {offset}" if after else "Nothing to resume, starting over")
+    with open(args.file, "r+b" if offset else "wb") as out:
+        out.truncate(offset)
+        out.seek(offset)
+        if args.url:
+            query = urllib.parse.urlencode({k: v for k, v in (("after", after), ("gzip", int(compressed))) if v is not None})
+            request = urllib.request.Request(f"{args.url.rstrip('/')}/api/export?{query}", headers=_auth(args))
+            try:
+                with urllib.request.urlopen(request) as response:
+                    while True:
+                        chunk = response.read(READ_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+            except urllib.error.HTTPError as e:
+                sys.exit(f"Export failed: {_http_error(e)}")
+        else:
+            for chunk in backend.export_chunks(after, compressed):
+                out.write(chunk)
+        print(f"Exported to {args.file} ({out.tell()} bytes)")
+
+
+def import_(args):
+    if args.url:
+        with open(args.file, "rb") as f:
+            request = urllib.request.Request(
+                f"{args.url.rstrip('/')}/api/import", data=f, method="POST",
+                headers={"Content-Type": "application/octet-stream", "Content-Length": str(os.path.getsize(args.file)),
+                         **_auth(args)},
+            )
+            try:
+                with urllib.request.urlopen(request) as response:
+                    result = json.load(response)
+            except urllib.error.HTTPError as e:
+                try:
+                    result = json.load(e)
+                except ValueError:
+                    result = {"ok": False, "error": str(e)}
+        if not result.get("ok"):
+            sys.exit(f"Import failed: {result.get('error')} (imported so far: {result.get('imported')})")
+        counts = result["imported"]
+    else:
+        importer = backend.DatasetImporter()
+        try:
+            with open(args.file, "rb") as f:
+                while True:
+                    chunk = f.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    importer.feed(chunk)
+            counts = importer.finish()
+        except ValueError as e:
+            sys.exit(f"Import failed: {e} (imported so far: {importer.counts})")
+    print("Imported: " + ", ".join(f"{table} {n}" for table, n in counts.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import the clinical dataset as NDJSON")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("file", help="export file (.ndjson.gz, or .ndjson with --plain)")
+    parser.add_argument("--url", help="running robot, e.g. http://raspberrypi.local:5000 (default: local database)")
+    parser.add_argument("--token", default=os.environ.get("DATASET_API_TOKEN"),
+                        help="the robot's DATASET_API_TOKEN, with --url (default: $DATASET_API_TOKEN)")
+    parser.add_argument("--db", help=f"local database (default: {backend.DB_PATH})")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted export into FILE")
+    parser.add_argument("--plain", action="store_true", help="export uncompressed NDJSON")
+    args = parser.parse_args()
+
+    if not args.url:
+        if args.db:
+            backend.DB_PATH = args.db
+        backend.init_db()
+    if args.command == "export":
+        export(args)
+    else:
+        import_(args)
+
+
+if __name__ == "__main__":
+    main()
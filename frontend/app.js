@@ -238,6 +238,93 @@
     return data;
   }
 
+  // ---------------------------------------------------------------------------
+  // Paginated lists: endpoints take ?limit=&after=<cursor> and return `next`
+  // (the cursor for the following page, or null on the last page)
+  // ---------------------------------------------------------------------------
+  const PAGE_SIZE = 50;
+
+  function pageUrl(url, cursor, limit = PAGE_SIZE) {
+    const sep = url.includes("?") ? "&" : "?";
+    return `${url}${sep}limit=${limit}` + (cursor ? `&after=${encodeURIComponent(cursor)}` : "");
+  }
+
+  // Fetch every page, for views that need the whole list (charts, groupings).
+  // `first`: optional promise of the first page (e.g. a patient_bundle section)
+  async function fetchAllPages(url, onPage, limit = 200, first = null) {
+    let cursor = null;
+    let r = first ? await first : null;
+    do {
+      if (!r) r = await fetchJSON(pageUrl(url, cursor, limit));
+      onPage(r);
+      cursor = r.next;
+      r = null;
+    } while (cursor);
+  }
+
+  // Infinite scroll: renders the first page into `container`, then the next
+  // page whenever the end of the list scrolls into view.
+  //   items(r)    -> array of rows from one response
+  //   render(row) -> HTML string for one row
+  //   emptyHtml   -> shown when the list has no rows at all
+  //   onRows(rows) -> optional callback with each page's rows
+  //   first       -> optional promise of the first page (patient_bundle section)
+  function pagedList(container, url, { items, render, emptyHtml, onRows, first }) {
+    let cursor = null;
+    let loading = false;
+    let done = false;
+    let count = 0;
+    const token = {};
+    container._pagedList = token;  // a newer list in this container cancels this one
+
+    container.innerHTML = "";
+    const sentinel = document.createElement(container.tagName === "UL" ? "li" : "div");
+    sentinel.className = "page-sentinel";
+    container.appendChild(sentinel);
+
+    const observer = "IntersectionObserver" in window
+      ? new IntersectionObserver((entries) => { if (entries.some(e => e.isIntersecting)) loadNext(); })
+      : null;
+
+    async function loadNext() {
+      if (loading || done || container._pagedList !== token) return;
+      loading = true;
+      sentinel.textContent = "Loading…";
+      try {
+        const r = first ? await first : await fetchJSON(pageUrl(url, cursor));
+        first = null;
+        if (container._pagedList !== token) return;
+        const rows = items(r) || [];
+        count += rows.length;
+        sentinel.insertAdjacentHTML("beforebegin", rows.map(render).join(""));
+        if (onRows) onRows(rows);
+        cursor = r.next;
+        done = !cursor;
+      } catch (err) {
+        sentinel.textContent = "Failed to load.";
+        loading = false;
+        return;
+      }
+      loading = false;
+      if (done) {
+        if (observer) observer.disconnect();
+        sentinel.innerHTML = count === 0 ? emptyHtml || "" : "";
+      } else if (observer) {
+        sentinel.textContent = "";
+        // Re-observing reports the current state, so a short page that
+        // leaves the end of the list in view loads the next one straight away
+        observer.unobserve(sentinel);
+        observer.observe(sentinel);
+      } else {
+        sentinel.innerHTML = '<button type="button" class="btn btn-secondary">Load more</button>';
+        sentinel.querySelector("button").onclick = loadNext;
+      }
+    }
+
+    if (observer) observer.observe(sentinel);
+    loadNext();
+  }
+
   // ---------------------------------------------------------------------------
   // Page: index.html – Patient Registration
   // ---------------------------------------------------------------------------
@@ -416,6 +503,51 @@
       `;
     }
 
+    // Show one live reading (from the stream or a poll) in the live panel
+    function showLiveReading(r) {
+      // consider data fresh if timestamp within 3s
+      let fresh = false;
+      if (r.timestamp) {
+        try { fresh = (Date.now() - new Date(r.timestamp).getTime()) <= 3000; } catch(e) { fresh = false; }
+      }
+
+      if (!fresh) {
+        // show placeholders (do not display warning text)
+        displayVitals(liveVitalsValues, { heart_rate: null, spo2: null, temperature: null, weight: null, height: null, blood_pressure: null });
+        if (document.getElementById('live-vitals-msg')) {
+          document.getElementById('live-vitals-msg').textContent = '';
+        }
+      } else {
+        const vitals = {
+          heart_rate: r.heart_rate,
+          spo2: r.spo2,
+          temperature: r.temperature,
+          weight: r.weight,
+          height: r.height,
+          blood_pressure: r.blood_pressure || ""
+        };
+        displayVitals(liveVitalsValues, vitals);
+        if (document.getElementById('live-vitals-msg')) {
+          document.getElementById('live-vitals-msg').textContent = '⏱️ Live sensor readings';
+        }
+      }
+    }
+
+    // Live Arduino data is pushed over Server-Sent Events; the browser
+    // reconnects by itself and the server replays what was missed.
+    let capturing = false;
+    let vitalsStream = null;
+    if (window.EventSource) {
+      vitalsStream = new EventSource(`${API}/vitals/stream`);
+      vitalsStream.addEventListener("vitals", (e) => {
+        if (!capturing) return;
+        try { showLiveReading(JSON.parse(e.data)); } catch (err) { console.error("Bad vitals event:", err); }
+      });
+      vitalsStream.addEventListener("status", (e) => {
+        try { handleArduinoStatus(JSON.parse(e.data).status); } catch (err) { console.error("Bad status event:", err); }
+      });
+    }
+
     // Start the 4-second live vitals measurement
     function startLiveVitalsDisplay() {
       // Show live display; hide fixed display if present
@@ -423,45 +555,20 @@
       if (fixedVitalsDisplay) fixedVitalsDisplay.style.display = "none";
 
       let secondsLeft = 15;
-      let readingsCollected = [];
 
-      // Fetch vitals every 500ms during the measurement window
-      liveVitalsInterval = setInterval(async () => {
-        try {
-          const r = await fetchJSON(`${API}/get_arduino_vitals`);
-          if (r && r.ok) {
-            // consider data fresh if timestamp within 3s
-            let fresh = false;
-            if (r.timestamp) {
-              try { fresh = (Date.now() - new Date(r.timestamp).getTime()) <= 3000; } catch(e) { fresh = false; }
-            }
-
-            if (!fresh) {
-              // show placeholders (do not display warning text)
-              displayVitals(liveVitalsValues, { heart_rate: null, spo2: null, temperature: null, weight: null, height: null, blood_pressure: null });
-              if (document.getElementById('live-vitals-msg')) {
-                document.getElementById('live-vitals-msg').textContent = '';
-              }
-            } else {
-              const vitals = {
-                heart_rate: r.heart_rate,
-                spo2: r.spo2,
-                temperature: r.temperature,
-                weight: r.weight,
-                height: r.height,
-                blood_pressure: r.blood_pressure || ""
-              };
-              readingsCollected.push(vitals);
-              displayVitals(liveVitalsValues, vitals);
-              if (document.getElementById('live-vitals-msg')) {
-                document.getElementById('live-vitals-msg').textContent = '⏱️ Live sensor readings';
-              }
-            }
+      capturing = true;
+      startServerCapture();
+      if (!vitalsStream) {
+        // No EventSource support: refresh the on-screen values once a second
+        liveVitalsInterval = setInterval(async () => {
+          try {
+            const r = await fetchJSON(`${API}/get_arduino_vitals`);
+            if (r && r.ok) showLiveReading(r);
+          } catch (err) {
+            console.error("Error fetching live vitals:", err);
           }
-        } catch (err) {
-          console.error("Error fetching live vitals:", err);
-        }
-      }, 500);
+        }, 1000);
+      }
 
       // Countdown timer
       countdownInterval = setInterval(() => {
@@ -471,41 +578,75 @@
             if (secondsLeft <= 0) {
           clearInterval(liveVitalsInterval);
           clearInterval(countdownInterval);
+          capturing = false;
 
-          // Average the readings and fix the values
-          if (readingsCollected.length > 0) {
-            capturedVitals = {
-              heart_rate: Math.round(readingsCollected.reduce((sum, r) => sum + (r.heart_rate || 0), 0) / readingsCollected.length),
-              spo2: Math.round(readingsCollected.reduce((sum, r) => sum + (r.spo2 || 0), 0) / readingsCollected.length),
-              temperature: parseFloat((readingsCollected.reduce((sum, r) => sum + (r.temperature || 0), 0) / readingsCollected.length).toFixed(1)),
-              weight: parseFloat((readingsCollected.reduce((sum, r) => sum + (r.weight || 0), 0) / readingsCollected.length).toFixed(1)),
-              height: Math.round(readingsCollected.reduce((sum, r) => sum + (r.height || 0), 0) / readingsCollected.length),
-              blood_pressure: readingsCollected[readingsCollected.length - 1].blood_pressure || ""
-            };
-          }
+          finishCapture();
+        }
+      }, 1000);
+    }
 
-          // Reuse live vitals panel to show captured values (no separate fixed box)
-          if (liveVitalsDisplay) {
-            // update header to captured state
-            const hdr = liveVitalsDisplay.querySelector('h3');
-            if (hdr) {
-              hdr.textContent = '✅ VITALS CAPTURED';
-              hdr.style.color = '#3182ce';
-            }
-            if (countdownTimer) countdownTimer.textContent = '0';
-            if (document.getElementById('live-vitals-msg')) document.getElementById('live-vitals-msg').textContent = '✅ Capture complete';
-          }
+    // The server records and averages the capture window itself; we only
+    // start it and ask for the result, so tab throttling cannot skew it.
+    let captureId = null;
 
-          // display captured vitals in the live container
-          if (liveVitalsValues) displayVitals(liveVitalsValues, capturedVitals);
+    async function startServerCapture() {
+      captureId = null;
+      try {
+        const r = await fetchJSON(`${API}/vitals_capture/start`, {
+          method: "POST",
+          body: JSON.stringify({ fingerprint_id: parseInt(fid, 10), seconds: 15 }),
+        });
+        captureId = r.capture_id;
+      } catch (err) {
+        console.error("Failed to start vitals capture:", err);
+      }
+    }
 
-          // Auto-save vitals
-          saveFixedVitals(capturedVitals);
+    async function finishCapture() {
+      let saved = false;
+      if (captureId) {
+        try {
+          const url = `${API}/vitals_capture/${captureId}/finish`;
+          let res = await fetch(url, { method: "POST" });
+          let r = await res.json().catch(() => ({}));
+          if (res.status === 409 && r.seconds_left) {
+            // Our countdown ran ahead of the server's window; wait it out once
+            await new Promise(done => setTimeout(done, r.seconds_left * 1000));
+            res = await fetch(url, { method: "POST" });
+            r = await res.json().catch(() => ({}));
+          }
+          if (r.ok && r.saved) {
+            capturedVitals = r.vitals;
+            saved = true;
+          }
+        } catch (err) {
+          console.error("Failed to finish vitals capture:", err);
+        }
+        captureId = null;
+      }
 
-          // Start auto-refresh countdown only if refresh element exists
-          startAutoRefreshCountdown();
+      // Reuse live vitals panel to show captured values (no separate fixed box)
+      if (liveVitalsDisplay) {
+        // update header to captured state
+        const hdr = liveVitalsDisplay.querySelector('h3');
+        if (hdr) {
+          hdr.textContent = '✅ VITALS CAPTURED';
+          hdr.style.color = '#3182ce';
         }
-      }, 1000);
+        if (countdownTimer) countdownTimer.textContent = '0';
+        if (document.getElementById('live-vitals-msg')) document.getElementById('live-vitals-msg').textContent = '✅ Capture complete';
+      }
+
+      // display captured vitals in the live container
+      if (liveVitalsValues) displayVitals(liveVitalsValues, capturedVitals);
+
+      // No sensor data: save whatever was typed into the manual form instead
+      if (!saved && Object.values(capturedVitals).some(v => v !== null && v !== "")) {
+        saveFixedVitals(capturedVitals);
+      }
+
+      // Start auto-refresh countdown only if refresh element exists
+      startAutoRefreshCountdown();
     }
 
     // Save the captured vitals to the backend
@@ -633,33 +774,29 @@
     // Keep this for backward compatibility if needed
     // arduinoInterval = setInterval(fetchArduinoVitals, 1000);
 
-    // Poll Arduino status periodically to ensure manual form visibility updates
+    // React to Arduino connect/disconnect (pushed by the vitals stream)
+    function handleArduinoStatus(status) {
+      // Do not modify manual form visibility or live vitals display here; manual toggle and live panel
+      // display are managed elsewhere and should remain available at all times.
+      if (arduinoStatus) arduinoStatus.dataset.status = status;
+      // Stale values would otherwise stay on screen until the next sample
+      if (capturing && status !== "connected") showLiveReading({});
+    }
+
+    // Without EventSource, fall back to polling the status endpoint
     async function pollArduinoStatus() {
       try {
         const res = await fetchJSON(`${API}/get_arduino_status`);
-        if (!res) return;
-        const vit = res.vitals || {};
-        const THRESH_MS = 3000;
-        let fresh = false;
-        if (vit.timestamp) {
-          try { fresh = (Date.now() - new Date(vit.timestamp).getTime()) <= THRESH_MS; } catch(e) { fresh = false; }
-        }
-        const corePresent = (vit.heart_rate !== null && vit.heart_rate !== undefined && vit.heart_rate !== 0) ||
-                            (vit.spo2 !== null && vit.spo2 !== undefined && vit.spo2 !== 0) ||
-                            (vit.temperature !== null && vit.temperature !== undefined);
-        const connected = ((res.status === 'connected') && fresh) || (corePresent && fresh);
-
-        // Do not modify manual form visibility or live vitals display here; manual toggle and live panel
-        // display are managed elsewhere and should remain available at all times.
-        // (Nothing to do.)
+        if (res) handleArduinoStatus(res.status);
       } catch (e) {
         console.error('pollArduinoStatus error', e);
       }
     }
 
-    // start periodic polling (faster, immediate status)
-    pollArduinoStatus();
-    setInterval(pollArduinoStatus, 1000);
+    if (!vitalsStream) {
+      pollArduinoStatus();
+      setInterval(pollArduinoStatus, 1000);
+    }
 
     if (vitalsForm) {
       vitalsForm.addEventListener("submit", async (e) => {
@@ -1200,6 +1337,7 @@
             specific_area: specificArea,
             questions,
             answers: ans,
+            lang: getCurrentLanguage(),
           }),
         });
         const r = await fetchJSON(`${API}/analyze_condition`, {
@@ -1210,6 +1348,7 @@
             specific_area: specificArea,
             questions,
             answers: ans,
+            lang: getCurrentLanguage(),
           }),
         });
         if (r.ok && r.result) {
@@ -1330,6 +1469,7 @@
     if (logout) logout.addEventListener("click", (e) => { e.preventDefault(); sessionStorage.removeItem("doctor_logged_in"); window.location.href = "/doctor_login.html"; });
 
     const search = document.getElementById("search-input");
+    const sortSelect = document.getElementById("patient-sort");
     const list = document.getElementById("patient-list");
     const detail = document.getElementById("patient-detail");
 
@@ -1572,12 +1712,12 @@
     }
 
     // Load documents for patient
-    async function loadDocuments(fid) {
+    async function loadDocuments(fid, first = null) {
       const docsList = document.getElementById("documents-list");
       if (!docsList) return;
       
       try {
-        const r = await fetchJSON(`${API}/get_doctor_documents/${fid}`);
+        const r = first ? await first : await fetchJSON(`${API}/get_doctor_documents/${fid}`);
         const docs = r.documents || [];
         
         if (docs.length === 0) {
@@ -1595,53 +1735,61 @@
       }
     }
 
-    async function loadPatients() {
-      try {
-        const r = await fetchJSON(`${API}/get_all_patients`);
-        allPatients = r.patients || [];
-        renderList(allPatients);
-      } catch (err) {
-        if (list) list.innerHTML = "<li>Failed to load patients.</li>";
-      }
+    // Search snippets mark hits with \u0002...\u0003; escape first, then highlight
+    function highlightMatch(snippet) {
+      return escapeHtml(snippet || "").replace(/\u0002/g, "<mark>").replace(/\u0003/g, "</mark>");
     }
 
-    function renderList(patients) {
+    // Summary line from get_all_patients: last visit, analyses, 30-day worst severity
+    function patientSummary(p) {
+      if (!p.last_visit) return "";
+      const parts = [`Last visit: ${escapeHtml(p.last_visit)}`, `${p.analysis_count} analyses`];
+      if (p.latest_vitals && p.latest_vitals.heart_rate != null) parts.push(`HR ${p.latest_vitals.heart_rate}`);
+      const peak = p.peak_severity_30d
+        ? ` <span class="severity-badge severity-${escapeHtml(p.peak_severity_30d)}">${escapeHtml(p.peak_severity_30d)}</span>`
+        : "";
+      return `<span class="meta">${parts.join(" · ")}${peak}</span>`;
+    }
+
+    // Patient list: one page at a time, in the chosen order, or best matches
+    // first (full-text: name, ID, allergies, medications, complaints) when searching
+    function loadPatients() {
       if (!list) return;
-      list.innerHTML = "";
-      patients.forEach((p) => {
-        const li = document.createElement("li");
-        li.dataset.fid = p.fingerprint_id;
-        li.innerHTML = `<span class="name">${escapeHtml(p.name)}</span><span class="meta">ID: ${p.fingerprint_id} · ${p.age} y · ${p.sex}</span>`;
-        li.addEventListener("click", () => selectPatient(p.fingerprint_id));
-        list.appendChild(li);
+      allPatients = [];
+      const q = (search && search.value.trim()) || "";
+      const sort = (sortSelect && sortSelect.value) || "created";
+      pagedList(list, q ? `${API}/search_patients?q=${encodeURIComponent(q)}` : `${API}/get_all_patients?sort=${sort}`, {
+        items: (r) => r.patients,
+        render: (p) => `<li data-fid="${p.fingerprint_id}"${p.fingerprint_id === selectedFid ? ' class="selected"' : ""}><span class="name">${escapeHtml(p.name)}</span><span class="meta">ID: ${p.fingerprint_id} · ${p.age} y · ${p.sex}</span>${patientSummary(p)}${p.match ? `<span class="match">${highlightMatch(p.match)}</span>` : ""}</li>`,
+        emptyHtml: "No patients found.",
+        onRows: (rows) => { allPatients.push(...rows); },
       });
     }
 
-    function filterList() {
-      const q = (search && search.value.trim().toLowerCase()) || "";
-      if (!q) {
-        renderList(allPatients);
-        return;
-      }
-      const filtered = allPatients.filter(
-        (p) =>
-          String(p.fingerprint_id) === q ||
-          (p.name || "").toLowerCase().includes(q)
-      );
-      renderList(filtered);
+    if (list) {
+      list.addEventListener("click", (e) => {
+        const li = e.target.closest("li[data-fid]");
+        if (li) selectPatient(parseInt(li.dataset.fid, 10));
+      });
     }
 
-    if (search) search.addEventListener("input", filterList);
+    let searchTimer = null;
+    if (search) {
+      search.addEventListener("input", () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadPatients, 250);
+      });
+    }
+    if (sortSelect) sortSelect.addEventListener("change", loadPatients);
 
     // Load and display charts
-    async function loadVitalsCharts(fid) {
+    async function loadVitalsCharts(fid, first = null) {
       try {
-        const r = await fetchJSON(`${API}/get_patient_timeline/${fid}`);
-        if (!r.ok || !r.timeline) {
-          console.error("Invalid response:", r);
-          return;
-        }
-        const vitals = r.timeline.vitals || [];
+        // Charts need the whole history: follow the pages (oldest first)
+        const vitals = [];
+        await fetchAllPages(`${API}/get_patient_timeline/${fid}`, (r) => {
+          vitals.push(...((r.timeline && r.timeline.vitals) || []));
+        }, 500, first);
         
         if (vitals.length === 0) {
           const container = document.getElementById('vitals-charts-container');
@@ -1791,14 +1939,22 @@
     }
 
     // Load pain comparison
-    async function loadPainComparison(fid) {
+    async function loadPainComparison(fid, first = null) {
       const container = document.getElementById('pain-comparison-content');
       if (!container) return;
       
       try {
-        const r = await fetchJSON(`${API}/compare_analyses/${fid}`);
-        const analyses = r.analyses || [];
-        const byBodyPart = r.by_body_part || {};
+        // Grouping needs every analysis: follow the pages and merge the groups
+        const analyses = [];
+        const byBodyPart = {};
+        let r = {};
+        await fetchAllPages(`${API}/compare_analyses/${fid}`, (page) => {
+          r = page;
+          analyses.push(...(page.analyses || []));
+          Object.entries(page.by_body_part || {}).forEach(([part, rows]) => {
+            (byBodyPart[part] = byBodyPart[part] || []).push(...rows);
+          });
+        }, 200, first);
         
         if (analyses.length === 0) {
           container.innerHTML = "<p style='color: #666;'>No pain analyses recorded yet</p>";
@@ -1838,13 +1994,13 @@
     }
 
     // Load body part images upload UI
-    async function loadBodyPartImages(fid) {
+    async function loadBodyPartImages(fid, first = null) {
       const container = document.getElementById('body-part-images-list');
       if (!container) return;
       
       try {
-        const r = await fetchJSON(`${API}/get_patient_analyses/${fid}`);
-        const analyses = r.analyses || [];
+        const analyses = [];
+        await fetchAllPages(`${API}/get_patient_analyses/${fid}`, (r) => analyses.push(...(r.analyses || [])), 200, first);
         
         if (analyses.length === 0) {
           container.innerHTML = "<p style='color: #666;'>No pain analyses to attach images to</p>";
@@ -1921,28 +2077,30 @@
       list.querySelectorAll("li").forEach((el) => el.classList.toggle("selected", parseInt(el.dataset.fid, 10) === fid));
       detail.classList.remove("hidden");
 
+      // One request for the first page of every section; each view then
+      // continues (scrolling, full chart history) from its own endpoint
+      const bundle = fetchJSON(
+        `${API}/patient_bundle/${fid}?include=history,vitals,analyses,timeline,compare,documents&limit=${PAGE_SIZE}`
+      );
+      const section = (name) => bundle.then((b) => b[name]);
+
       // Load documents
-      loadDocuments(fid);
+      loadDocuments(fid, section("documents"));
       
       // Load charts
-      loadVitalsCharts(fid);
+      loadVitalsCharts(fid, section("timeline"));
       
       // Load pain comparison
-      loadPainComparison(fid);
+      loadPainComparison(fid, section("compare"));
       
       // Load body part images UI
-      loadBodyPartImages(fid);
+      loadBodyPartImages(fid, section("analyses"));
 
       // Keep the rest of the existing functionality
       try {
-        const r = await fetchJSON(`${API}/get_medical_history/${fid}`);
+        const r = await section("history");
         const h = r.history || {};
 
-        const vitalsR = await fetchJSON(`${API}/get_patient_vitals/${fid}`);
-        const vitals = vitalsR.vitals || [];
-
-        const analysesR = await fetchJSON(`${API}/get_patient_analyses/${fid}`);
-        const analyses = analysesR.analyses || [];
 
         const historyContent = document.getElementById("medical-history-content");
         const vitalsContainer = document.getElementById("vitals-history-content");
@@ -2001,11 +2159,11 @@
         }
 
         if (vitalsContainer) {
-          let vitalsHtml = '<h3>No vitals recorded.</h3>';
-          if (vitals.length > 0) {
-            vitalsHtml = '<div class="vitals-list">';
-            vitals.forEach(v => {
-              vitalsHtml += `
+          pagedList(vitalsContainer, `${API}/get_patient_vitals/${fid}`, {
+            first: section("vitals"),
+            items: (r) => r.vitals,
+            emptyHtml: '<h3>No vitals recorded.</h3>',
+            render: (v) => `
                 <div class="vitals-item" style="background: #f7fafc; padding: 12px; border-radius: 6px; margin-bottom: 8px; border: 1px solid #e2e8f0;">
                   <p><strong>Timestamp:</strong> ${v.timestamp}</p>
                   <p><strong>Weight:</strong> ${v.weight || 'N/A'} kg</p>
@@ -2015,20 +2173,18 @@
                   <p><strong>Temperature:</strong> ${v.temperature || 'N/A'} °C</p>
                   <p><strong>Blood Pressure:</strong> ${escapeHtml(v.blood_pressure || 'N/A')}</p>
                 </div>
-              `;
-            });
-            vitalsHtml += '</div>';
-          }
-          vitalsContainer.innerHTML = vitalsHtml;
+              `,
+          });
         }
 
         if (analysesContainer) {
-          let analysesHtml = '<h3>No AI analyses recorded.</h3>';
-          if (analyses.length > 0) {
-            analysesHtml = '<div class="analyses-list">';
-            analyses.forEach(a => {
+          pagedList(analysesContainer, `${API}/get_patient_analyses/${fid}`, {
+            first: section("analyses"),
+            items: (r) => r.analyses,
+            emptyHtml: '<h3>No AI analyses recorded.</h3>',
+            render: (a) => {
               const severityClass = `severity-${(a.severity || 'MEDIUM').toUpperCase()}`;
-              analysesHtml += `
+              return `
                 <div class="analyses-item ${severityClass}" style="padding: 12px; border-radius: 6px; margin-bottom: 8px; border: 1px solid;">
                   <p><strong>Timestamp:</strong> ${a.timestamp}</p>
                   <p><strong>Body Part:</strong> ${escapeHtml(a.body_part)}</p>
@@ -2038,10 +2194,8 @@
                   <p><strong>Recommendation:</strong> ${escapeHtml(a.recommendation || 'N/A')}</p>
                 </div>
               `;
-            });
-            analysesHtml += '</div>';
-          }
-          analysesContainer.innerHTML = analysesHtml;
+            },
+          });
         }
 
       } catch (err) {
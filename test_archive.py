@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Check the cold archive (archive_old_rows and friends in backend/app.py):
+archived analyses stay in the patient's search document, histories still
+include archived rows (also after a client abandons a streamed one), and
+deleting a patient clears their archived rows before anything else, so a
+failed delete leaves the patient whole.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_archive.py   (or pytest test_archive.py)
+"""
+
+import sys
+import time
+import calendar
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+OLD = "2021-03-04 10:00:00"
+RECENT = "2025-06-01 10:00:00"
+
+
+@pytest.fixture
+def client(scratch_db):
+    """Patients 1 and 2, each with an old analysis and vitals that archive_old_rows moves, and newer ones."""
+    scratch_db("archive.db")
+    conn = backend.get_db()
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex) VALUES (?, ?, 40, 'Other')",
+        [(1, "Amira Haddad"), (2, "Jon Berg")],
+    )
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, severity, ai_summary, timestamp)"
+        " VALUES (?, ?, ?, 'HIGH', ?, ?)",
+        [
+            (1, "Chest", "left", "Angina on exertion", OLD),
+            (1, "Left Leg", "knee", "Sprain after a fall", RECENT),
+            (2, "Head", "", "Migraine with aura", OLD),
+            (2, "Back", "lower", "Muscle strain", RECENT),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO vitals (fingerprint_id, heart_rate, timestamp) VALUES (?, ?, ?)",
+        [(1, 61, OLD), (1, 72, RECENT), (2, 80, OLD), (2, 90, RECENT)],
+    )
+    conn.commit()
+    conn.close()
+    moved = backend.archive_old_rows()
+    assert moved == {"vitals": 2, "pain_analysis": 2}, moved
+    return backend.app.test_client()
+
+
+def _found(client, query):
+    return [p["fingerprint_id"] for p in client.get(f"/api/search_patients?q={query}").get_json()["patients"]]
+
+
+def test_archived_complaints_stay_searchable(client):
+    conn = backend.get_db()
+    try:
+        hot = [r[0] for r in conn.execute("SELECT ai_summary FROM pain_analysis ORDER BY id")]
+    finally:
+        conn.close()
+    assert hot == ["Sprain after a fall", "Muscle strain"]
+    assert _found(client, "angina") == [1]
+    assert _found(client, "migraine") == [2]
+    assert _found(client, "sprain") == [1]
+
+    # Later changes rebuild the document, archived text included
+    assert client.post("/api/save_medical_history/1", json={"current_medications": "warfarin"}).get_json()["ok"]
+    assert _found(client, "warfarin angina") == [1]
+    backend.db_writer.write(lambda cur: cur.execute("DELETE FROM pain_analysis WHERE fingerprint_id = 1"))
+    assert _found(client, "angina") == [1] and _found(client, "sprain") == []
+
+    # The timeline (oldest first) still includes the archived rows
+    analyses = client.get("/api/get_patient_timeline/2").get_json()["timeline"]["pain_analyses"]
+    assert [a["body_part"] for a in analyses] == ["Head", "Back"]
+    # Nothing more to move
+    assert backend.archive_old_rows() == {"vitals": 0, "pain_analysis": 0}
+
+
+def test_histories_include_archived_rows(client):
+    vitals = client.get("/api/get_patient_vitals/1").get_json()["vitals"]
+    assert [v["heart_rate"] for v in vitals] == [72, 61]
+    analyses = client.get("/api/get_patient_analyses/1").get_json()["analyses"]
+    assert [a["body_part"] for a in analyses] == ["Left Leg", "Chest"]
+
+    # Paged: the second page comes from the archive
+    first = client.get("/api/get_patient_vitals/1?limit=1").get_json()
+    second = client.get(f"/api/get_patient_vitals/1?limit=1&after={first['next']}").get_json()
+    assert [v["heart_rate"] for v in first["vitals"] + second["vitals"]] == [72, 61] and second["next"] is None
+    compare = client.get("/api/compare_analyses/2?limit=1").get_json()
+    assert compare["total_count"] == 2 and [a["body_part"] for a in compare["analyses"]] == ["Back"]
+
+    bundle = client.get("/api/patient_bundle/2").get_json()
+    assert [v["heart_rate"] for v in bundle["vitals"]["vitals"]] == [90, 80]
+    assert [a["body_part"] for a in bundle["analyses"]["analyses"]] == ["Back", "Head"]
+    assert [a["body_part"] for a in bundle["compare"]["analyses"]] == ["Back", "Head"]
+    assert [a["body_part"] for a in bundle["timeline"]["timeline"]["pain_analyses"]] == ["Head", "Back"]
+
+
+def test_aborted_stream_leaves_no_archive_attached(client):
+    url = "/api/get_patient_timeline/1"
+    whole = client.get(url).get_json()["timeline"]
+    assert len(whole["vitals"]) == 2 and len(whole["pain_analyses"]) == 2
+
+    for chunks in (0, 1, 3):
+        # The client goes away after a few chunks, with the archive queries still open
+        response = client.get(url, buffered=False)
+        body = iter(response.response)
+        for _ in range(chunks):
+            next(body)
+        response.close()
+        for _ in range(3):
+            response = client.get(url)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            assert response.get_json()["timeline"] == whole
+        assert client.get(url + "?limit=1").status_code == 200
+
+    # Pooled connections go back with only their own database
+    pool = backend._db_pool()
+    conns = [pool.acquire() for _ in range(pool.size)]
+    try:
+        for conn in conns:
+            assert [row[1] for row in conn.execute("PRAGMA database_list")] == ["main"]
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def test_pool_detaches_or_drops_leftover_archives(client):
+    pool = backend._db_pool()
+    path = str(backend._archive_path(backend._archive_period(OLD)))
+    conn = pool.acquire()
+    conn.execute("ATTACH DATABASE ? AS leftover", (path,))
+    detached = pool.stats["detached"]
+    conn.close()
+    assert pool.stats["detached"] == detached + 1
+
+    # One that can't be detached (a statement is still reading it) takes the connection with it
+    conn = pool.acquire()
+    conn.execute("ATTACH DATABASE ? AS leftover", (path,))
+    cur = conn.execute("SELECT * FROM leftover.vitals")
+    assert cur.fetchone() is not None
+    closed = pool.stats["closed"]
+    conn.close()
+    assert pool.stats["closed"] == closed + 1
+    conn = pool.acquire()
+    try:
+        assert [row[1] for row in conn.execute("PRAGMA database_list")] == ["main"]
+    finally:
+        conn.close()
+
+
+def test_delete_patient_clears_archived_rows(client):
+    assert client.post("/api/delete_patient/1").get_json() == {"ok": True}
+    assert _found(client, "angina") == [] and _found(client, "migraine") == [2]
+    for path in backend._archive_dir().glob("archive_*.db"):
+        conn = sqlite3.connect(path)
+        try:
+            for table in backend.ARCHIVE_TABLES:
+                assert conn.execute(f"SELECT count(*) FROM {table} WHERE fingerprint_id = 1").fetchone()[0] == 0
+        finally:
+            conn.close()
+
+    # The same fingerprint registered again starts with nothing archived
+    client.post("/api/register_patient", json={"fingerprint_id": 1, "name": "New Person", "age": 30, "sex": "Other"})
+    assert _found(client, "angina") == []
+    assert client.get("/api/get_patient_timeline/1").get_json()["timeline"]["pain_analyses"] == []
+
+
+def test_failed_archive_cleanup_deletes_nothing(client, monkeypatch):
+    def fail(fingerprint_id):
+        raise sqlite3.OperationalError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(backend, "delete_archived", fail)
+        response = client.post("/api/delete_patient/1")
+    assert response.status_code == 500 and not response.get_json()["ok"]
+
+    # Still all there, so the delete can be retried
+    assert client.get("/api/get_patient/1").get_json()["ok"]
+    assert _found(client, "angina") == [1]
+    assert len(client.get("/api/get_patient_timeline/1").get_json()["timeline"]["pain_analyses"]) == 2
+    assert client.post("/api/delete_patient/1").get_json() == {"ok": True}
+    assert not client.get("/api/get_patient/1").get_json()["ok"]
+
+
+def test_locked_archive_file_fails_the_cleanup(client, monkeypatch):
+    period = backend._archive_period(OLD)
+    holder = sqlite3.connect(backend._archive_path(period), timeout=0)
+    holder.execute("BEGIN EXCLUSIVE")
+    monkeypatch.setattr(backend, "DB_BUSY_TIMEOUT", 0.1)
+    try:
+        backend.delete_archived(1)
+        raise AssertionError("delete_archived ignored a locked archive file")
+    except sqlite3.OperationalError as e:
+        assert "locked" in str(e)
+    finally:
+        holder.rollback()
+        holder.close()
+
+
+
+def test_bad_history_ranges_are_rejected(client):
+    for url in ("/api/get_patient_timeline/1", "/api/export_patient_report/1"):
+        for query in ("since=inf", "since=nan", "until=-inf", "since=1e20", "until=-1", "since=yesterday"):
+            response = client.get(f"{url}?{query}")
+            assert response.status_code == 400, (url, query, response.status_code)
+            assert response.get_json() == {"ok": False, "error": "Invalid since/until"}
+    # A range reaching back into the archive still works
+    since = calendar.timegm(time.strptime(OLD, "%Y-%m-%d %H:%M:%S"))
+    timeline = client.get(f"/api/get_patient_timeline/1?since={since}&until={since + 1}").get_json()["timeline"]
+    assert [v["heart_rate"] for v in timeline["vitals"]] == [61]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Check Arduino discovery and the per-board readers against virtual boards
+(arduino_simulator.py) and silent pseudo-terminals: the banner handshake,
+that a probe gives up promptly when it is cancelled or its board is
+unplugged, that a board's last good port is probed ahead of the others, one
+reader per board, and that stop() ends discovery and readers.
+Linux/macOS only (needs a pty). No Arduino or running server required.
+
+Run with: python3 test_arduino_devices.py   (or pytest test_arduino_devices.py)
+"""
+
+import os
+import sys
+import tty
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+from arduino_simulator import VirtualArduino  # noqa: E402
+
+# Well under ARDUINO_HANDSHAKE_TIMEOUT: a probe that ignored cancel/unplug would take that long
+PROMPT = backend.ARDUINO_HANDSHAKE_TIMEOUT / 2
+
+
+def _silent_port():
+    """A pty that never sends the banner, like a board running some other sketch."""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    os.close(slave)
+    return master, path
+
+
+def _simulator(**kwargs):
+    sim = VirtualArduino(noise=0, seed=1, **kwargs)
+    sim.start()
+    while sim.path is None:
+        time.sleep(0.01)
+    return sim
+
+
+def test_probe_reads_banner():
+    sim = _simulator(device="scale")
+    try:
+        result = backend._probe_arduino_port(sim.path)
+        assert result is not None, "no banner from the virtual Arduino"
+        ser, banner = result
+        ser.close()
+        assert banner["status"] == backend.ARDUINO_BANNER_STATUS
+        assert banner["device"] == "scale"
+    finally:
+        sim.stop()
+
+
+def test_probe_of_silent_port_times_out():
+    master, path = _silent_port()
+    try:
+        started = time.monotonic()
+        assert backend._probe_arduino_port(path) is None
+        assert time.monotonic() - started >= backend.ARDUINO_HANDSHAKE_TIMEOUT
+    finally:
+        os.close(master)
+
+
+def test_cancelled_probe_returns_promptly():
+    master, path = _silent_port()
+    cancel = threading.Event()
+    timer = threading.Timer(0.2, cancel.set)
+    try:
+        timer.start()
+        started = time.monotonic()
+        assert backend._probe_arduino_port(path, cancel) is None
+        assert time.monotonic() - started < PROMPT
+    finally:
+        timer.cancel()
+        os.close(master)
+
+
+def test_probe_abandons_unplugged_port():
+    master, path = _silent_port()
+    link = os.path.join(tempfile.mkdtemp(), "ttyVIRT0")
+    os.symlink(path, link)
+    timer = threading.Timer(0.2, os.remove, (link,))
+    try:
+        timer.start()
+        started = time.monotonic()
+        assert backend._probe_arduino_port(link) is None
+        assert time.monotonic() - started < PROMPT
+    finally:
+        timer.cancel()
+        os.close(master)
+
+
+def test_cancelled_discovery_keeps_no_ports():
+    sim = _simulator(device="scale")
+    master, path = _silent_port()
+    cancel = threading.Event()
+    timer = threading.Timer(0.3, cancel.set)
+    try:
+        timer.start()
+        started = time.monotonic()
+        # The simulator answers, but the whole discovery round is cancelled
+        assert backend._probe_ports([sim.path, path], cancel) == []
+        assert time.monotonic() - started < PROMPT
+        # ...and its port was closed again, so it can be probed afresh (the
+        # board resets, and sends its banner again, once it sees the close)
+        time.sleep(0.2)
+        result = backend._probe_arduino_port(sim.path)
+        assert result is not None
+        result[0].close()
+    finally:
+        timer.cancel()
+        sim.stop()
+        os.close(master)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_one_reader_per_board():
+    scale, pulse = _simulator(device="scale", rate=20), _simulator(device="pulse", rate=20)
+    manager = backend.ArduinoDeviceManager()
+    try:
+        manager.discover([scale.path, pulse.path])
+        assert sorted(d.device_id for d in manager.devices()) == ["pulse", "scale"]
+        _wait_for(lambda: all(d.health["samples"] >= 3 for d in manager.devices()))
+
+        # Unplugging one board only disconnects its own reader
+        scale.stop()
+        _wait_for(lambda: manager.get("scale").status == "disconnected")
+        samples = manager.get("pulse").health["samples"]
+        _wait_for(lambda: manager.get("pulse").health["samples"] > samples + 3)
+        assert manager.get("pulse").status == "connected"
+    finally:
+        manager.stop(timeout=5)
+        scale.stop()
+        pulse.stop()
+    assert not any(d.active for d in manager.devices())
+
+
+def test_last_good_port_is_probed_first():
+    sim = _simulator(device="scale", rate=20)
+    master, path = _silent_port()
+    manager = backend.ArduinoDeviceManager()
+    # The scale was read on this port before, and has been away since
+    manager._devices["scale"] = backend.ArduinoDevice(manager, "scale", sim.path)
+    attached = threading.Event()
+    attach = manager._attach
+    manager._attach = lambda *args: (attach(*args), attached.set())
+    thread = threading.Thread(target=manager.discover, args=([path, sim.path],))
+    try:
+        started = time.monotonic()
+        thread.start()
+        # Back before the silent port's handshake timeout is over
+        assert attached.wait(backend.ARDUINO_HANDSHAKE_TIMEOUT)
+        assert time.monotonic() - started < backend.ARDUINO_HANDSHAKE_TIMEOUT
+        assert manager.get("scale").active and manager.get("scale").port == sim.path
+        thread.join(2 * backend.ARDUINO_HANDSHAKE_TIMEOUT)
+        assert [d.device_id for d in manager.devices()] == ["scale"]
+    finally:
+        manager.stop(timeout=5)
+        thread.join()
+        sim.stop()
+        os.close(master)
+
+
+def test_stop_cancels_discovery_in_flight():
+    master, path = _silent_port()
+    manager = backend.ArduinoDeviceManager()
+    thread = threading.Thread(target=manager.discover, args=([path],))
+    try:
+        started = time.monotonic()
+        thread.start()
+        time.sleep(0.2)
+        manager.stop()
+        thread.join(backend.ARDUINO_HANDSHAKE_TIMEOUT)
+        assert time.monotonic() - started < PROMPT
+        assert manager.devices() == []
+    finally:
+        os.close(master)
+
+
+def test_stop_ends_reconnect_attempts():
+    # A board that drops its link but keeps its device node: the reader keeps
+    # reopening it until stop(). Each simulated session outlasts the reader's
+    # 2 s pause before reopening, so the reopen finds the board answering.
+    link = os.path.join(tempfile.mkdtemp(), "ttyVIRT0")
+    sim = _simulator(device="scale", rate=20, link=link, disconnect_every=3)
+    manager = backend.ArduinoDeviceManager()
+    try:
+        manager.discover([link])
+        device = manager.get("scale")
+        _wait_for(lambda: device.health["reconnects"] >= 1, timeout=15)
+        started = time.monotonic()
+        manager.stop(timeout=PROMPT)
+        assert not device.active
+        assert time.monotonic() - started < PROMPT
+    finally:
+        manager.stop()
+        sim.stop()
+
+
+def test_hotplug_watcher_reports_new_nodes():
+    directory = tempfile.mkdtemp()
+    watcher = backend.DeviceNodeWatcher(directory, patterns=("ttyVIRT*",))
+    try:
+        if watcher.available:
+            timer = threading.Timer(0.2, lambda: Path(directory, "ttyVIRT1").touch())
+            timer.start()
+            assert watcher.wait(5) == {os.path.join(directory, "ttyVIRT1")}
+        # Cancelling wakes the wait early, with or without inotify
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+        started = time.monotonic()
+        assert watcher.wait(30, cancel=cancel) == set()
+        assert time.monotonic() - started < PROMPT
+    finally:
+        watcher.close()
+
+
+
+def test_stats_window_must_be_a_finite_number():
+    client = backend.app.test_client()
+    for seconds in ("nan", "inf", "-inf", "0", "3601", "soon"):
+        response = client.get(f"/api/get_arduino_vitals_stats?seconds={seconds}")
+        assert response.status_code == 400, seconds
+    response = client.get("/api/get_arduino_vitals_stats?seconds=15")
+    assert response.status_code == 200 and response.get_json()["seconds"] == 15
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("ARDUINO DEVICE TESTS")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except AssertionError as e:
+                failed += 1
+                print(f"❌ {name}\n{e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Check the bulk dataset export/import (export_chunks / DatasetImporter and
+/api/export, /api/import in backend/app.py, resume in dataset_transfer.py):
+an export imported into an empty database gives back the same data,
+including archived rows and Q&A; a cut-off export resumes from its last
+checkpoint; a truncated or corrupt gzip member fails cleanly, keeping the
+members before it; and the HTTP routes need the token and cap imports.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_dataset_transfer.py   (or pytest test_dataset_transfer.py)
+"""
+
+import io
+import sys
+import json
+import gzip
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+import dataset_transfer  # noqa: E402
+
+TOKEN = "test-token"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+# Small batches, so a few dozen rows make several gzip members
+BATCH = 7
+
+
+@pytest.fixture
+def source_db(scratch_db, monkeypatch):
+    """A database with some of everything, part of it archived. Returns its export."""
+    monkeypatch.setattr(backend, "DATASET_API_TOKEN", TOKEN)
+    monkeypatch.setattr(backend, "EXPORT_BATCH", BATCH)
+    monkeypatch.setattr(backend, "IMPORT_BATCH", BATCH)
+    scratch_db("source.db")
+    conn = backend.get_db()
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex, created_at) VALUES (?, ?, ?, 'Other', ?)",
+        [(i, f"Patient {i}", 20 + i, "2020-01-01 09:00:00") for i in range(1, 9)],
+    )
+    conn.execute("INSERT INTO medical_history (fingerprint_id, current_medications) VALUES (3, 'warfarin')")
+    conn.executemany(
+        "INSERT INTO vitals (fingerprint_id, heart_rate, blood_pressure, timestamp) VALUES (?, ?, '120/80', ?)",
+        [(1 + n % 8, 60 + n, f"{2021 + n % 5}-02-03 10:00:00") for n in range(40)],
+    )
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, severity, ai_summary, timestamp)"
+        " VALUES (?, 'Chest', 'LOW', ?, ?)",
+        [(1 + n % 8, f"Summary {n}", f"{2021 + n % 5}-04-05 10:00:00") for n in range(20)],
+    )
+    conn.execute(
+        "INSERT INTO doctor_documents (fingerprint_id, filename, filepath) VALUES (2, 'ecg.pdf', 'uploads/2/ecg.pdf')"
+    )
+    conn.commit()
+    conn.close()
+    backend.db_writer.write(lambda cur: cur.execute(
+        "UPDATE pain_analysis SET qa = ? WHERE id = 1",
+        (backend.encode_qa(backend.question_catalog.ids(cur, "fr", ["Où ?", "Depuis quand ?"]), ["Ici", "Hier"]),),
+    ))
+    assert sum(backend.archive_old_rows(now=backend.time.mktime((2026, 1, 1, 0, 0, 0, 0, 0, -1))).values()) > 0
+    return b"".join(backend.export_chunks())
+
+
+def _dataset():
+    """Every exported row, by (table, key): what an import has to reproduce."""
+    rows = {}
+    for lines in backend.export_dataset():
+        for line in lines:
+            record = json.loads(line)
+            if "table" in record:
+                table = record["table"]
+                rows[(table, record["row"][backend.DATASET_TABLES[table]])] = record["row"]
+    return rows
+
+
+def _members(data):
+    """Byte offsets where each gzip member of an export ends."""
+    ends, offset = [], 0
+    while offset < len(data):
+        inflate = backend.zlib.decompressobj(16 + backend.zlib.MAX_WBITS)
+        inflate.decompress(data[offset:])
+        offset = len(data) - len(inflate.unused_data)
+        ends.append(offset)
+    return ends
+
+
+def _import(data):
+    importer = backend.DatasetImporter()
+    for i in range(0, len(data), 1000):
+        importer.feed(data[i:i + 1000])
+    return importer.finish()
+
+
+def test_export_import_round_trip(source_db, scratch_db):
+    export = source_db
+    expected = _dataset()
+    assert len(_members(export)) > 5
+    assert any(row.get("questions") == ["Où ?", "Depuis quand ?"] for row in expected.values())
+
+    scratch_db("target.db")
+    client = backend.app.test_client()
+    response = client.post("/api/import", data=export, headers=AUTH)
+    assert response.status_code == 200, response.get_json()
+    counts = response.get_json()["imported"]
+    assert sum(counts.values()) == len(expected)
+    assert _dataset() == expected
+    qa = next(row for row in _dataset().values() if row.get("questions"))
+    assert qa["lang"] == "fr" and qa["answers"] == ["Ici", "Hier"]
+
+    # Importing it again changes nothing, not even the data versions
+    version = backend.data_version()
+    assert client.post("/api/import", data=export, headers=AUTH).status_code == 200
+    assert backend.data_version() == version and _dataset() == expected
+
+    # The same export over HTTP, plain and gzipped
+    plain = client.get("/api/export?gzip=0", headers=AUTH)
+    assert plain.status_code == 200 and plain.mimetype == backend.NDJSON_MIMETYPE
+    lines = plain.get_data().decode("utf-8").splitlines()
+    assert json.loads(lines[0])["format"] == backend.DATASET_FORMAT
+    assert sum("table" in json.loads(line) for line in lines) == len(expected)
+    compressed = client.get("/api/export", headers=AUTH).get_data()
+    assert gzip.decompress(compressed).decode("utf-8").splitlines()[1:] == lines[1:]
+
+
+def test_cut_off_export_resumes_from_checkpoint(source_db, scratch_db, tmp_path):
+    export = source_db
+    expected = _dataset()
+    ends = _members(export)
+    path = tmp_path / "export.ndjson.gz"
+
+    # Cut in the middle of the fourth member: resume from the end of the third
+    path.write_bytes(export[:(ends[2] + ends[3]) // 2])
+    checkpoint, offset = dataset_transfer.resume_point(path, compressed=True)
+    assert offset == ends[2] and checkpoint
+    resumed = export[:offset] + b"".join(backend.export_chunks(checkpoint))
+    assert gzip.decompress(resumed) == gzip.decompress(export)
+
+    # Plain NDJSON, cut in the middle of a line
+    plain = b"".join(backend.export_chunks(compress=False))
+    path.write_bytes(plain[:len(plain) * 2 // 3])
+    checkpoint, offset = dataset_transfer.resume_point(path, compressed=False)
+    assert plain[:offset].endswith(b"\n")
+    assert json.loads(plain[:offset].splitlines()[-1])["checkpoint"] == checkpoint
+    assert plain[:offset] + b"".join(backend.export_chunks(checkpoint, compress=False)) == plain
+
+    scratch_db("target.db")
+    _import(resumed)
+    assert _dataset() == expected
+    client = backend.app.test_client()
+    assert client.get("/api/export?after=bm90IGEgY2hlY2twb2ludA", headers=AUTH).status_code == 400
+
+
+def test_truncated_or_corrupt_member_keeps_earlier_batches(source_db, scratch_db):
+    export = source_db
+    expected = _dataset()
+    ends = _members(export)
+
+    # Truncated in the middle of the third member
+    scratch_db("truncated.db")
+    importer = backend.DatasetImporter()
+    importer.feed(export[:ends[1] + (ends[2] - ends[1]) // 2])
+    try:
+        importer.finish()
+        raise AssertionError("truncated import was accepted")
+    except ValueError as e:
+        assert "middle of a gzip member" in str(e)
+    assert sum(importer.counts.values()) >= BATCH  # the first members stayed imported
+
+    # Damaged inside the third member's compressed data: a 400, not a 500
+    corrupt = bytearray(export)
+    for i in range(ends[1] + 15, ends[2] - 10, 7):
+        corrupt[i] ^= 0x55
+    scratch_db("corrupt.db")
+    client = backend.app.test_client()
+    response = client.post("/api/import", data=bytes(corrupt), headers=AUTH)
+    assert response.status_code == 400, response.get_json()
+    body = response.get_json()
+    assert not body["ok"] and body["error"] and sum(body["imported"].values()) >= BATCH
+
+    # Sending the good file afterwards completes the import
+    assert client.post("/api/import", data=export, headers=AUTH).status_code == 200
+    assert _dataset() == expected
+
+
+def test_http_routes_need_the_token_and_cap_imports(source_db, scratch_db, monkeypatch):
+    export = source_db
+    client = backend.app.test_client()
+    for method, url in (("get", "/api/export"), ("post", "/api/import")):
+        with monkeypatch.context() as patch:
+            patch.setattr(backend, "DATASET_API_TOKEN", "")
+            assert getattr(client, method)(url, headers=AUTH).status_code == 403
+        for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": TOKEN}):
+            response = getattr(client, method)(url, headers=headers)
+            assert response.status_code == 401 and not response.get_json()["ok"]
+
+    scratch_db("target.db")
+    client = backend.app.test_client()
+    with monkeypatch.context() as patch:
+        patch.setattr(backend, "IMPORT_MAX_BYTES", len(export) - 1)
+        response = client.post("/api/import", data=export, headers=AUTH)
+        assert response.status_code == 413
+        assert _dataset() == {}
+        # Without a Content-Length, the body is counted as it arrives
+        response = client.post("/api/import", input_stream=io.BytesIO(export), headers=AUTH,
+                               environ_overrides={"wsgi.input_terminated": True, "CONTENT_LENGTH": ""})
+        assert response.status_code == 413 and "imported" in response.get_json()
+    assert client.post("/api/import", data=export, headers=AUTH).status_code == 200
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
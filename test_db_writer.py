@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Check the group-committing writer thread (DatabaseWriter in backend/app.py):
+writes queued together commit together, a failing write is rolled back
+alone and its exception reaches the caller, and close() commits everything
+already queued. Runs against a scratch database; no server needed.
+
+Run with: python3 test_db_writer.py   (or pytest test_db_writer.py)
+"""
+
+import sys
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+
+@pytest.fixture
+def writer(scratch_db):
+    """A fresh DatabaseWriter on a fresh database (db_writer itself stays untouched)."""
+    scratch_db("writer.db")
+    backend.db_writer.write(lambda cur: cur.execute(
+        "INSERT INTO patients (fingerprint_id, name, age, sex) VALUES (1, 'Test', 40, 'Other')"
+    ))
+    return backend.DatabaseWriter()
+
+
+def _hold(writer):
+    """Occupy the writer thread until the returned event is set, so later writes queue up."""
+    started, release = threading.Event(), threading.Event()
+
+    def wait(cur):
+        started.set()
+        release.wait(10)
+
+    writer.submit(wait)
+    started.wait(10)
+    return release
+
+
+def _insert_vitals(heart_rate):
+    def insert(cur):
+        cur.execute("INSERT INTO vitals (fingerprint_id, heart_rate) VALUES (1, ?)", (heart_rate,))
+        return cur.lastrowid
+    return insert
+
+
+def _heart_rates():
+    conn = backend.get_db()
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT heart_rate FROM vitals"))
+    finally:
+        conn.close()
+
+
+def test_failing_write_rolls_back_only_itself(writer):
+    try:
+        release = _hold(writer)
+
+        def insert_then_fail(cur):
+            _insert_vitals(99)(cur)
+            raise ValueError("bad reading")
+
+        futures = [writer.submit(_insert_vitals(70)), writer.submit(insert_then_fail), writer.submit(_insert_vitals(71))]
+        release.set()
+        assert futures[0].result(10) and futures[2].result(10)
+        assert isinstance(futures[1].exception(10), ValueError)
+
+        # One transaction for all three; only the failing one's row is gone
+        assert writer.stats["commits"] == 2 and writer.stats["max_batch"] == 3
+        assert writer.stats["failed_ops"] == 1
+        assert _heart_rates() == [70, 71]
+    finally:
+        writer.close()
+
+
+def test_write_raises_the_operation_exception(writer):
+    try:
+        error = ValueError("bad reading")
+
+        def fail(cur):
+            raise error
+
+        try:
+            writer.write(fail)
+            raise AssertionError("write() did not raise")
+        except ValueError as e:
+            assert e is error
+        try:
+            writer.write(lambda cur: cur.execute(
+                "INSERT INTO patients (fingerprint_id, name, age, sex) VALUES (1, 'Again', 40, 'Other')"
+            ))
+            raise AssertionError("write() did not raise")
+        except sqlite3.IntegrityError:
+            pass
+        # The writer carries on after failed writes
+        assert writer.write(_insert_vitals(72))
+        assert _heart_rates() == [72]
+    finally:
+        writer.close()
+
+
+def test_concurrent_writes_share_commits(writer):
+    try:
+        release = _hold(writer)
+        threads = [
+            threading.Thread(target=lambda: [writer.write(_insert_vitals(60 + i)) for i in range(20)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(30)
+        assert len(_heart_rates()) == 160
+        assert writer.stats["commits"] < writer.stats["ops"]
+    finally:
+        writer.close()
+
+
+def test_close_commits_queued_writes(writer):
+    release = _hold(writer)
+    futures = [writer.submit(_insert_vitals(80 + i % 10)) for i in range(150)]
+
+    closer = threading.Thread(target=writer.close)
+    closer.start()
+    release.set()
+    closer.join(30)
+    assert not closer.is_alive()
+
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert len(_heart_rates()) == 150
+    # Batches of at most DB_WRITE_BATCH_MAX, then the thread ends
+    assert writer.stats["max_batch"] <= backend.DB_WRITE_BATCH_MAX
+    assert writer._conn is None
+    try:
+        writer.write(_insert_vitals(90))
+        raise AssertionError("closed writer accepted a write")
+    except RuntimeError:
+        pass
+    assert len(_heart_rates()) == 150
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
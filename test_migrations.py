@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Check the schema migrations (MIGRATIONS / init_db) against a database in
+the baseline schema, as created before migrations existed: its data comes
+through to the latest version unchanged, re-running is a no-op, and a
+failing step leaves the database as it was.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_migrations.py   (or pytest test_migrations.py)
+"""
+
+import sys
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+# The schema init_db() created before migrations (including the columns it
+# added with ALTER TABLE, and doctor_documents from the first PDF upload).
+# Frozen: this is what databases in the field look like.
+BASELINE_SCHEMA = """
+    CREATE TABLE patients (
+        fingerprint_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        sex TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE vitals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fingerprint_id INTEGER NOT NULL,
+        weight REAL,
+        height REAL,
+        heart_rate INTEGER,
+        spo2 INTEGER,
+        temperature REAL,
+        blood_pressure TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (fingerprint_id) REFERENCES patients(fingerprint_id)
+    );
+    CREATE TABLE medical_history (
+        fingerprint_id INTEGER PRIMARY KEY,
+        current_allergies TEXT,
+        past_allergies TEXT,
+        current_medications TEXT,
+        past_medications TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (fingerprint_id) REFERENCES patients(fingerprint_id)
+    );
+    CREATE TABLE pain_analysis (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fingerprint_id INTEGER NOT NULL,
+        body_part TEXT NOT NULL,
+        questions TEXT,
+        answers TEXT,
+        severity TEXT,
+        ai_summary TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (fingerprint_id) REFERENCES patients(fingerprint_id)
+    );
+    ALTER TABLE pain_analysis ADD COLUMN specific_area TEXT;
+    ALTER TABLE pain_analysis ADD COLUMN image_path TEXT;
+    ALTER TABLE pain_analysis ADD COLUMN recommendation TEXT;
+    CREATE TABLE doctors (
+        doctor_id TEXT PRIMARY KEY,
+        password TEXT NOT NULL
+    );
+    INSERT INTO doctors (doctor_id, password) VALUES ('doctor1', 'demo123');
+    CREATE TABLE doctor_documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fingerprint_id INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (fingerprint_id) REFERENCES patients(fingerprint_id)
+    );
+"""
+
+QUESTIONS = ["Where does it hurt?", "How long has it hurt?"]
+
+# Tables (and their baseline columns) whose rows must come through unchanged
+BASELINE_TABLES = {
+    "patients": "fingerprint_id, name, age, sex, created_at",
+    "vitals": "id, fingerprint_id, weight, height, heart_rate, spo2, temperature, blood_pressure, timestamp",
+    "medical_history": "fingerprint_id, current_allergies, past_allergies, current_medications, past_medications, "
+                       "updated_at",
+    "pain_analysis": "id, fingerprint_id, body_part, severity, ai_summary, timestamp, specific_area, image_path, "
+                     "recommendation",
+    "doctor_documents": "id, fingerprint_id, filename, filepath, uploaded_at",
+    "doctors": "doctor_id, password",
+}
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """A scratch database in the baseline schema, with a little of everything in it."""
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(1, "Amira Haddad", 54, "Female", "2025-01-02 09:00:00"), (2, "Jon Berg", 31, "Male", "2025-01-03 10:00:00")],
+    )
+    conn.executemany(
+        "INSERT INTO vitals (fingerprint_id, weight, heart_rate, spo2, temperature, blood_pressure, timestamp)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (1, 70.5, 72, 98, 36.8, "120/80", "2025-01-02 09:05:00"),
+            (1, 70.1, 88, 95, 37.9, "135/85", "2025-02-01 11:00:00"),
+            (2, 82.0, 64, 99, 36.6, None, "2025-01-03 10:05:00"),
+        ],
+    )
+    conn.execute(
+        "INSERT INTO medical_history (fingerprint_id, current_allergies, current_medications, updated_at)"
+        " VALUES (1, 'penicillin', 'warfarin', '2025-01-02 09:10:00')"
+    )
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, questions, answers, severity,"
+        " ai_summary, recommendation, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (1, "chest", "left", json.dumps(QUESTIONS), json.dumps(["Left side", "2 days"]), "HIGH",
+             "Chest pain radiating to the arm", "Emergency", "2025-02-01 11:05:00"),
+            (2, "knee", None, json.dumps(QUESTIONS[:1]), json.dumps(["Right knee"]), None, None, None,
+             "2025-01-03 10:10:00"),
+            # A row whose Q&A was never valid JSON
+            (2, "head", None, "not json", "[", "LOW", "Headache", None, "2025-01-04 10:00:00"),
+        ],
+    )
+    conn.execute(
+        "INSERT INTO doctor_documents (fingerprint_id, filename, filepath, uploaded_at)"
+        " VALUES (1, 'ecg.pdf', 'uploads/1/ecg.pdf', '2025-02-01 12:00:00')"
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _snapshot(path):
+    """Every baseline row, plus the Q&A as the app reads it back."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        data = {
+            table: [tuple(row) for row in conn.execute(f"SELECT {columns} FROM {table} ORDER BY 1")]
+            for table, columns in BASELINE_TABLES.items()
+        }
+        qa_columns = {row[1] for row in conn.execute("PRAGMA table_info(pain_analysis)")}
+        if "qa" in qa_columns:
+            rows = conn.execute("SELECT id, questions, answers, qa FROM pain_analysis ORDER BY id").fetchall()
+            data["qa"] = [(row["id"], backend._qa_fields(row)) for row in rows]
+        return data
+    finally:
+        conn.close()
+
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+    finally:
+        conn.close()
+
+
+def _user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def migrate(use_db):
+    """migrate(path) runs init_db() on the database at `path`."""
+    def run(path):
+        use_db(path)
+        backend.init_db()
+    return run
+
+
+def test_baseline_database_migrates_unchanged(baseline_db, migrate):
+    path = baseline_db
+    before = _snapshot(path)
+    migrate(path)
+    assert _user_version(path) == len(backend.MIGRATIONS)
+
+    after = _snapshot(path)
+    qa = dict(after.pop("qa"))
+    assert after == before
+    # Q&A moved to the compact qa column, and reads back as before
+    assert qa[1] == {"questions": QUESTIONS, "answers": ["Left side", "2 days"]}
+    assert qa[2] == {"questions": QUESTIONS[:1], "answers": ["Right knee"]}
+    # Free text that was never JSON is kept as it was
+    assert qa[3] == {"questions": ["not json"], "answers": ["["]}
+
+    # Derived tables are built from the existing rows
+    conn = sqlite3.connect(path)
+    try:
+        summary = conn.execute(
+            "SELECT heart_rate, vitals_at, latest_severity, analysis_count, last_visit"
+            " FROM patient_summary WHERE fingerprint_id = 1"
+        ).fetchone()
+        assert summary == (88, "2025-02-01 11:00:00", "HIGH", 1, "2025-02-01 11:05:00")
+        hits = conn.execute("SELECT rowid FROM patient_search WHERE patient_search MATCH 'warfarin'").fetchall()
+        assert hits == [(1,)]
+    finally:
+        conn.close()
+
+
+def test_rerunning_migrations_is_a_no_op(baseline_db, migrate):
+    path = baseline_db
+    migrate(path)
+    schema, data = _schema(path), _snapshot(path)
+
+    # Up to date: init_db runs nothing
+    migrate(path)
+    assert _user_version(path) == len(backend.MIGRATIONS)
+    assert _schema(path) == schema
+    assert _snapshot(path) == data
+
+    # Every step is also safe to run again on a migrated database
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 0")
+    conn.close()
+    migrate(path)
+    assert _user_version(path) == len(backend.MIGRATIONS)
+    assert _schema(path) == schema
+    assert _snapshot(path) == data
+
+
+def test_failed_step_changes_nothing(baseline_db, migrate, monkeypatch):
+    path = baseline_db
+    schema, data = _schema(path), _snapshot(path)
+
+    def broken_step(cur):
+        cur.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("step failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(backend, "MIGRATIONS", backend.MIGRATIONS + (broken_step,))
+        try:
+            migrate(path)
+            raise AssertionError("init_db did not raise")
+        except RuntimeError as e:
+            assert str(e) == "step failed"
+
+    # Every earlier step was rolled back with it
+    assert _user_version(path) == 0
+    assert _schema(path) == schema
+    assert _snapshot(path) == data
+
+    # ...and the next start-up migrates normally
+    migrate(path)
+    assert _user_version(path) == len(backend.MIGRATIONS)
+
+
+def test_newer_database_is_refused(baseline_db, migrate):
+    path = baseline_db
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA user_version = {len(backend.MIGRATIONS) + 1}")
+    conn.close()
+    schema = _schema(path)
+    try:
+        migrate(path)
+        raise AssertionError("init_db accepted a newer schema")
+    except RuntimeError as e:
+        assert "newer" in str(e)
+    assert _schema(path) == schema
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
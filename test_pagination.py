@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Check keyset pagination (?limit=&after=) on the list endpoints and the
+ranked patient search through the Flask test client: following `next`
+visits every row exactly once, in the same order as the unpaged list, even
+with many equal sort keys; the patient list sorts and search ranking order
+rows as documented; malformed cursors get a 400.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_pagination.py   (or pytest test_pagination.py)
+"""
+
+import sys
+import json
+import base64
+import random
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+PATIENTS = 40
+# Few distinct timestamps, so most rows tie on the sort key and order by id
+TIMESTAMPS = [f"2025-01-{day:02d} 10:00:00" for day in (3, 5, 5, 8, 8, 8, 9)]
+
+
+@pytest.fixture
+def client(scratch_db):
+    scratch_db("pages.db")
+    rng = random.Random(7)
+    conn = backend.get_db()
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(i, f"Patient {i}", 30, "Other", rng.choice(TIMESTAMPS)) for i in range(1, PATIENTS + 1)],
+    )
+    # Patient 1 has a long history; heart_rate numbers the vitals rows
+    conn.executemany(
+        "INSERT INTO vitals (fingerprint_id, heart_rate, timestamp) VALUES (?, ?, ?)",
+        [(1, n, rng.choice(TIMESTAMPS)) for n in range(137)]
+        + [(rng.randint(2, PATIENTS), 1000 + n, rng.choice(TIMESTAMPS)) for n in range(60)],
+    )
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, severity, timestamp) VALUES (?, ?, ?, ?)",
+        [(1, rng.choice(["head", "chest", "knee"]), rng.choice(backend.SEVERITY_LEVELS), rng.choice(TIMESTAMPS))
+         for _ in range(53)]
+        + [(rng.randint(2, PATIENTS), "knee", rng.choice(backend.SEVERITY_LEVELS), rng.choice(TIMESTAMPS))
+           for _ in range(30)],
+    )
+    conn.commit()
+    conn.close()
+    return backend.app.test_client()
+
+
+def _cursor(value):
+    return backend.encode_cursor(value)
+
+
+def _pages(client, url, limit):
+    """Follow `next` from the first page to the last; returns the list of page bodies."""
+    pages, after = [], None
+    while True:
+        query = f"limit={limit}" + (f"&after={after}" if after else "")
+        response = client.get(url + ("&" if "?" in url else "?") + query)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        body = response.get_json()
+        pages.append(body)
+        after = body["next"]
+        if after is None:
+            return pages
+        assert len(pages) < 1000, "pagination does not end"
+
+
+def test_history_pages_visit_every_row_once(client):
+    for url, name, key in (
+        ("/api/get_patient_vitals/1", "vitals", "heart_rate"),
+        ("/api/get_patient_analyses/1", "analyses", "id"),
+        ("/api/compare_analyses/1", "analyses", "timestamp"),
+    ):
+        whole = client.get(url).get_json()[name]
+        for limit in (1, 10, 53):
+            paged = [row for page in _pages(client, url, limit) for row in page[name]]
+            assert paged == whole, f"{url} limit={limit}"
+    vitals = client.get("/api/get_patient_vitals/1").get_json()["vitals"]
+    assert sorted(v["heart_rate"] for v in vitals) == list(range(137))
+
+
+def test_patient_list_pages_visit_every_patient_once(client):
+    for sort in backend.PATIENT_SORT_KEYS:
+        url = f"/api/get_all_patients?sort={sort}"
+        whole = [p["fingerprint_id"] for p in client.get(url).get_json()["patients"]]
+        assert sorted(whole) == list(range(1, PATIENTS + 1))
+        for limit in (1, 7, PATIENTS):
+            paged = [p["fingerprint_id"] for page in _pages(client, url, limit) for p in page["patients"]]
+            assert paged == whole, f"sort={sort} limit={limit}"
+
+
+def test_timeline_pages_visit_every_row_once(client):
+    url = "/api/get_patient_timeline/1"
+    whole = client.get(url).get_json()["timeline"]
+    for limit in (1, 10, 200):
+        pages = _pages(client, url, limit)
+        for name in ("vitals", "pain_analyses"):
+            paged = [row for page in pages for row in page["timeline"][name]]
+            assert paged == whole[name], f"{name} limit={limit}"
+
+
+def test_patient_list_sort_orders(scratch_db):
+    scratch_db("pages.db")
+    conn = backend.get_db()
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(1, "A", 30, "Other", "2025-01-01 10:00:00"), (2, "B", 30, "Other", "2025-01-03 10:00:00"),
+         (3, "C", 30, "Other", "2025-01-02 10:00:00"), (4, "D", 30, "Other", "2025-01-03 10:00:00")],
+    )
+    conn.execute("INSERT INTO vitals (fingerprint_id, heart_rate, timestamp) VALUES (1, 70, datetime('now', '-1 day'))")
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, severity, timestamp)"
+        " VALUES (?, 'knee', ?, datetime('now', ?))",
+        [(3, "HIGH", "-2 days"), (4, "LOW", "-10 days"), (2, "EMERGENCY", "-400 days")],  # 2's is outside 30 days
+    )
+    conn.commit()
+    conn.close()
+    client = backend.app.test_client()
+
+    expected = {
+        "created": [4, 2, 3, 1],  # 2 and 4 registered together: higher ID first
+        "last_visit": [1, 3, 4, 2],  # newest of registration, vitals and analyses
+        "severity": [3, 4, 2, 1],  # 2's emergency is too old to count; no peak: higher ID first
+    }
+    for sort, order in expected.items():
+        patients = client.get(f"/api/get_all_patients?sort={sort}").get_json()["patients"]
+        assert [p["fingerprint_id"] for p in patients] == order, sort
+        paged = [p["fingerprint_id"] for page in _pages(client, f"/api/get_all_patients?sort={sort}", 1)
+                 for p in page["patients"]]
+        assert paged == order, sort
+    peaks = {p["fingerprint_id"]: p["peak_severity_30d"] for p in patients}
+    assert peaks == {1: None, 2: None, 3: "HIGH", 4: "LOW"}
+    assert client.get("/api/get_all_patients?sort=name").status_code == 400
+
+
+@pytest.fixture
+def search_client(scratch_db):
+    scratch_db("pages.db")
+    conn = backend.get_db()
+    # 12 patients whose documents are identical apart from their ID (equal
+    # bm25 scores), one whose name matches, and one unrelated
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex) VALUES (?, ?, 40, 'Other')",
+        [(i, "Same Person") for i in range(10, 22)] + [(30, "Chester Lane"), (31, "Unrelated")],
+    )
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, specific_area, severity, ai_summary)"
+        " VALUES (?, 'chest', 'left', 'LOW', 'Chest pain after exercise')",
+        [(i,) for i in range(10, 22)],
+    )
+    conn.execute(
+        "INSERT INTO medical_history (fingerprint_id, current_medications) VALUES (31, 'warfarin')"
+    )
+    conn.commit()
+    conn.close()
+    return backend.app.test_client()
+
+
+def test_search_ranks_and_breaks_ties_by_id(search_client):
+    client = search_client
+    results = client.get("/api/search_patients?q=ches&limit=500").get_json()
+    ids = [p["fingerprint_id"] for p in results["patients"]]
+    # A name match outweighs complaint matches; equal scores go in ID order
+    assert ids == [30] + list(range(10, 22))
+    assert results["next"] is None
+    assert "\x02chest\x03" in results["patients"][1]["match"]
+    assert client.get("/api/search_patients?q=warfarin").get_json()["patients"][0]["fingerprint_id"] == 31
+    assert client.get("/api/search_patients?q=nothingmatches").get_json()["patients"] == []
+    assert client.get("/api/search_patients?q=%20%21").status_code == 400
+
+
+def test_search_pages_visit_every_match_once(search_client):
+    client = search_client
+    whole = [p["fingerprint_id"] for p in client.get("/api/search_patients?q=chest&limit=500").get_json()["patients"]]
+    assert sorted(whole) == list(range(10, 22)) + [30]
+    for limit in (1, 5, 13):
+        paged = [p["fingerprint_id"] for page in _pages(client, "/api/search_patients?q=chest", limit)
+                 for p in page["patients"]]
+        assert paged == whole, f"limit={limit}"
+    # Without limit, the first PAGE_DEFAULT_LIMIT matches
+    assert len(client.get("/api/search_patients?q=chest").get_json()["patients"]) == len(whole)
+
+
+def test_malformed_cursors_are_rejected(client):
+    raw = lambda text: base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")  # noqa: E731
+    bad = [
+        _cursor(["a"]), _cursor({"a": 1}), _cursor(None), _cursor(["a", 1, 2]), _cursor([["a"], 1]),
+        _cursor([True, 1]), _cursor(["a", None]), _cursor(["a", 2 ** 70]), _cursor("2025-01-01"),
+        raw("[1,"), "not base64 at all!", "WyJhIl0=====x",
+    ]
+    urls = [
+        "/api/get_patient_vitals/1", "/api/get_patient_analyses/1", "/api/compare_analyses/1",
+        "/api/get_all_patients", "/api/get_all_patients?sort=severity", "/api/get_patient_timeline/1",
+        "/api/search_patients?q=patient",
+    ]
+    for url in urls:
+        for token in bad:
+            response = client.get(url + ("&" if "?" in url else "?") + f"after={token}")
+            assert response.status_code == 400, f"{url} after={token}: {response.status_code}"
+            assert response.get_json() == {"ok": False, "error": "Invalid cursor"}, url
+
+    # The timeline cursor tracks each list separately
+    for value in ({"a": 1}, {}, {"v": ["a"]}, {"v": "later"}, ["2025-01-01 10:00:00", 1]):
+        response = client.get(f"/api/get_patient_timeline/1?limit=5&after={_cursor(value)}")
+        assert response.status_code == 400, value
+        assert response.get_json() == {"ok": False, "error": "Invalid cursor"}
+
+    # A well-formed cursor still works, on every list
+    assert client.get(f"/api/get_patient_vitals/1?after={_cursor(['2025-01-08 10:00:00', 50])}").status_code == 200
+    timeline = json.loads(client.get(f"/api/get_patient_timeline/1?limit=5&after={_cursor({'v': 'done'})}").data)
+    assert timeline["timeline"]["vitals"] == [] and len(timeline["timeline"]["pain_analyses"]) == 5
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Check the trigger-maintained patient_summary against the same values
+computed from scratch out of patients/vitals/pain_analysis, after saves
+through the API and after back-dated, edited and deleted rows; that the
+patient list only reads; and that aged-out 30-day peaks are recomputed by
+the background job (refresh_summary_peaks).
+Runs against a scratch database; no server needed.
+
+Run with: python3 test_patient_summary.py   (or pytest test_patient_summary.py)
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+SUMMARY_COLUMNS = (
+    "heart_rate", "blood_pressure", "vitals_at", "latest_severity", "latest_recommendation",
+    "analysis_at", "analysis_count", "peak_severity", "last_visit",
+)
+
+
+@pytest.fixture
+def client(scratch_db, monkeypatch):
+    scratch_db("summary.db")
+    monkeypatch.setattr(backend, "GEMINI_API_KEY", None)  # analyze_condition saves the mock result
+    client = backend.app.test_client()
+    for fid in (1, 2):
+        response = client.post("/api/register_patient",
+                               json={"fingerprint_id": fid, "name": f"Patient {fid}", "age": 40, "sex": "Other"})
+        assert response.get_json()["ok"]
+    return client
+
+
+def _expected(conn, fid):
+    """patient_summary's row for `fid`, recomputed from the base tables."""
+    vitals = conn.execute(
+        "SELECT heart_rate, blood_pressure, timestamp FROM vitals WHERE fingerprint_id = ?"
+        " ORDER BY timestamp DESC, id DESC LIMIT 1", (fid,)
+    ).fetchone() or (None, None, None)
+    finished = conn.execute(
+        "SELECT severity, recommendation, timestamp FROM pain_analysis"
+        " WHERE fingerprint_id = ? AND severity IS NOT NULL ORDER BY timestamp DESC, id DESC", (fid,)
+    ).fetchall()
+    latest = tuple(finished[0]) if finished else (None, None, None)
+    recent = conn.execute(
+        "SELECT severity FROM pain_analysis WHERE fingerprint_id = ? AND severity IS NOT NULL"
+        f" AND timestamp >= datetime('now', '-{backend.SUMMARY_PEAK_DAYS} days')", (fid,)
+    ).fetchall()
+    peak = max((row[0] for row in recent), key=backend.SEVERITY_LEVELS.index, default=None)
+    created_at = conn.execute("SELECT created_at FROM patients WHERE fingerprint_id = ?", (fid,)).fetchone()[0]
+    last_visit = max(created_at, vitals[2] or "", latest[2] or "")
+    return (*vitals, *latest, len(finished), peak, last_visit)
+
+
+def _check(client=None):
+    conn = backend.get_db()
+    try:
+        for fid in (1, 2):
+            actual = conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM patient_summary WHERE fingerprint_id = ?", (fid,)
+            ).fetchone()
+            assert tuple(actual) == _expected(conn, fid), f"patient {fid}: {tuple(actual)} != {_expected(conn, fid)}"
+    finally:
+        conn.close()
+    if client is not None:
+        # ...and the list shows it
+        listed = {p["fingerprint_id"]: p for p in client.get("/api/get_all_patients").get_json()["patients"]}
+        for fid, patient in listed.items():
+            assert patient["latest_vitals"] is None or patient["latest_vitals"]["timestamp"] == \
+                _summary(fid)["vitals_at"]
+            assert patient["peak_severity_30d"] == _summary(fid)["peak_severity"]
+
+
+def _summary(fid):
+    conn = backend.get_db()
+    try:
+        return dict(conn.execute("SELECT * FROM patient_summary WHERE fingerprint_id = ?", (fid,)).fetchone())
+    finally:
+        conn.close()
+
+
+def _write(sql, params=()):
+    backend.db_writer.write(lambda cur: cur.execute(sql, params))
+
+
+def test_summary_follows_saves_through_the_api(client):
+    _check(client)
+    assert client.post("/api/save_vitals", json={"fingerprint_id": 1, "heart_rate": 72, "blood_pressure": "120/80"})\
+        .get_json()["ok"]
+    assert client.post("/api/save_vitals", json={"fingerprint_id": 1, "heart_rate": 95}).get_json()["ok"]
+    _check(client)
+    assert _summary(1)["heart_rate"] == 95
+
+    # Unfinished Q&A doesn't count; the analysis result does
+    assert client.post("/api/save_pain_answers", json={
+        "fingerprint_id": 1, "body_part": "Chest", "questions": ["Where?"], "answers": ["Left"],
+    }).get_json()["ok"]
+    _check(client)
+    assert _summary(1)["analysis_count"] == 0
+    assert client.post("/api/analyze_condition", json={
+        "fingerprint_id": 1, "body_part": "Chest", "questions": ["Where?"], "answers": ["Left"],
+    }).get_json()["ok"]
+    _check(client)
+    assert _summary(1)["latest_severity"] == "MEDIUM" and _summary(1)["analysis_count"] == 1
+
+
+def test_summary_follows_backdated_edited_and_deleted_rows(client):
+    # An older reading arriving late doesn't replace the latest one
+    _write("INSERT INTO vitals (fingerprint_id, heart_rate, timestamp) VALUES (1, 60, datetime('now', '-1 hour'))")
+    _write("INSERT INTO vitals (fingerprint_id, heart_rate, timestamp) VALUES (1, 50, datetime('now', '-3 hours'))")
+    _check(client)
+    assert _summary(1)["heart_rate"] == 60
+
+    insert = ("INSERT INTO pain_analysis (fingerprint_id, body_part, severity, recommendation, timestamp)"
+              " VALUES (?, 'knee', ?, ?, datetime('now', ?))")
+    _write(insert, (1, "HIGH", "Doctor consultation", "-5 days"))
+    _write(insert, (1, "LOW", "Home care", "-1 day"))
+    _write(insert, (1, "EMERGENCY", "Immediate emergency care", "-40 days"))  # outside the 30-day peak
+    _write(insert, (2, "MEDIUM", "Doctor consultation", "-2 days"))
+    _check(client)
+    assert _summary(1)["latest_severity"] == "LOW" and _summary(1)["peak_severity"] == "HIGH"
+
+    _write("UPDATE pain_analysis SET severity = 'EMERGENCY' WHERE severity = 'LOW'")
+    _check(client)
+    _write("UPDATE pain_analysis SET fingerprint_id = 2 WHERE severity = 'HIGH'")
+    _check(client)
+    _write("DELETE FROM pain_analysis WHERE fingerprint_id = 1 AND severity = 'EMERGENCY'"
+           " AND timestamp >= datetime('now', '-2 days')")
+    _write("DELETE FROM vitals WHERE heart_rate = 60")
+    _check(client)
+    assert _summary(1)["heart_rate"] == 50 and _summary(1)["peak_severity"] is None
+
+
+def test_patient_list_only_reads(client):
+    _write("INSERT INTO vitals (fingerprint_id, heart_rate) VALUES (1, 70)")
+    ops = backend.db_writer.stats["ops"]
+    for sort in backend.PATIENT_SORT_KEYS:
+        assert client.get(f"/api/get_all_patients?sort={sort}").status_code == 200
+    assert backend.db_writer.stats["ops"] == ops
+
+
+def test_aged_out_peaks_are_recomputed_by_the_job(client):
+    insert = ("INSERT INTO pain_analysis (fingerprint_id, body_part, severity, timestamp)"
+              " VALUES (1, 'knee', ?, datetime('now', ?))")
+    _write(insert, ("MEDIUM", "-10 days"))
+    _write(insert, ("EMERGENCY", "-29 days"))
+    assert client.get("/api/get_all_patients?sort=severity").get_json()["patients"][0]["peak_severity_30d"] == \
+        "EMERGENCY"
+
+    # Two days on, without any write: the emergency has aged out of the window
+    # (the summary's peak is now what it was then)
+    _write("UPDATE pain_analysis SET timestamp = datetime(timestamp, '-2 days')")
+    _write("UPDATE patient_summary SET peak_severity = 'EMERGENCY', peak_severity_rank = 4,"
+           " peak_severity_at = datetime('now', '-31 days') WHERE fingerprint_id = 1")
+    assert client.get("/api/get_all_patients").get_json()["patients"][1]["peak_severity_30d"] == "EMERGENCY"
+
+    assert backend.refresh_summary_peaks() == 1
+    _check(client)
+    assert _summary(1)["peak_severity"] == "MEDIUM"
+    # Cached lists were dropped with it
+    assert client.get("/api/get_all_patients").get_json()["patients"][1]["peak_severity_30d"] == "MEDIUM"
+    assert backend.refresh_summary_peaks() == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Check the compact pain Q&A storage (encode_qa / decode_qa and the question
+catalog in backend/app.py): answers round-trip exactly, question ids the
+catalog doesn't know read back as empty text, and legacy JSON or free-text
+questions/answers columns migrate without losing anything; the routes
+that save Q&A refuse questions/answers that aren't lists.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_qa_codec.py   (or pytest test_qa_codec.py)
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+
+@pytest.fixture
+def patient_db(scratch_db):
+    scratch_db("qa.db")
+    backend.db_writer.write(lambda cur: cur.execute(
+        "INSERT INTO patients (fingerprint_id, name, age, sex) VALUES (1, 'Test', 40, 'Other')"
+    ))
+
+
+def test_answers_round_trip():
+    cases = [
+        ([], []),
+        ([1], [""]),
+        ([1, 2, 3], ["Left side", "", "2 days"]),
+        ([7], ["Ça brûle — 火傷のように痛い 🔥", "line one\nline two\ttabbed"]),
+        ([2 ** 32 - 1, 0, 42], ["a", "b", "c"]),
+        (list(range(1, 301)), [f"answer {i}" for i in range(300)]),  # more answers than 255
+        ([1, 2], ["only one answer"]),  # unanswered questions
+        ([], ["an answer without its question"]),
+    ]
+    for ids, answers in cases:
+        blob = backend.encode_qa(ids, answers)
+        assert backend.decode_qa(blob) == (ids, answers), (ids, answers)
+
+    # Not strings: None becomes "", anything else its text; the separator can't survive
+    blob = backend.encode_qa([1, 2, 3], [None, 7, f"a{backend.QA_SEPARATOR}b"])
+    assert backend.decode_qa(blob) == ([1, 2, 3], ["", "7", "a b"])
+    assert backend.decode_qa(None) == ([], []) and backend.decode_qa(b"") == ([], [])
+    # Ten typical answers stay around a hundred bytes
+    assert len(backend.encode_qa(list(range(10)), ["Yes", "No", "2 days", "Sharp", "7"] * 2)) < 100
+
+
+def test_unknown_format_is_refused():
+    blob = bytearray(backend.encode_qa([1], ["x"]))
+    blob[0] = backend.QA_FORMAT + 1
+    try:
+        backend.decode_qa(bytes(blob))
+        raise AssertionError("decode_qa accepted an unknown format")
+    except ValueError as e:
+        assert "format" in str(e)
+
+
+def test_catalog_round_trip_and_unknown_ids(patient_db):
+    questions = ["Where does it hurt?", "How long?", "Where does it hurt?"]
+    ids = backend.db_writer.write(lambda cur: backend.question_catalog.ids(cur, "en", questions))
+    assert ids[0] == ids[2] != ids[1]
+    # Same wording in another language is another question
+    (fr,) = backend.db_writer.write(lambda cur: backend.question_catalog.ids(cur, "fr", questions[:1]))
+    assert fr not in ids
+
+    catalog = backend.QuestionCatalog()
+    assert catalog.texts(ids) == questions
+    assert catalog.lang(ids) == "en" and catalog.lang([fr]) == "fr" and catalog.lang([]) == "en"
+    # An id that isn't in the catalog (e.g. a row copied from another
+    # database) reads back as empty text, and the answers still come through
+    row = {"qa": backend.encode_qa([ids[1], 999999], ["3 days", "Yes"])}
+    assert backend._qa_fields(row) == {"questions": ["How long?", ""], "answers": ["3 days", "Yes"]}
+    assert catalog.lang([999999]) == backend.QUESTION_DEFAULT_LANG
+
+
+def test_saved_answers_must_be_lists(patient_db):
+    client = backend.app.test_client()
+    body = {"fingerprint_id": 1, "body_part": "Back", "lang": "en"}
+    for qa in (
+        {"questions": "Where does it hurt?"},
+        {"questions": {"q1": "Where?"}},
+        {"questions": ["Where?", 5]},
+        {"answers": "Lower back"},
+        {"answers": [["nested"]]},
+    ):
+        for route in ("save_pain_answers", "analyze_condition"):
+            response = client.post(f"/api/{route}", json={**body, "answers": ["Yes"], **qa})
+            assert response.status_code == 400, (route, qa)
+            assert "must be a list of strings" in response.get_json()["error"]
+    conn = backend.get_db()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM question_catalog").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM pain_analysis").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+    response = client.post("/api/save_pain_answers", json={
+        **body, "questions": ["Where?", "How bad, 1-10?"], "answers": ["Lower back", 7],
+    })
+    assert response.status_code == 200
+    conn = backend.get_db()
+    try:
+        row = conn.execute("SELECT qa FROM pain_analysis WHERE id = ?", (response.get_json()["analysis_id"],)).fetchone()
+        assert backend._qa_fields(row) == {"questions": ["Where?", "How bad, 1-10?"], "answers": ["Lower back", "7"]}
+    finally:
+        conn.close()
+
+
+def test_legacy_rows_migrate_without_loss(patient_db):
+    legacy = [
+        (json.dumps(["Where?", "Since when?"]), json.dumps(["Knee", "Monday"]),
+         {"questions": ["Where?", "Since when?"], "answers": ["Knee", "Monday"]}),
+        # Free text from before the questionnaire was structured
+        (None, "Hurts when I climb stairs", {"questions": [], "answers": ["Hurts when I climb stairs"]}),
+        ("Describe the pain", "Dull, [on and off",
+         {"questions": ["Describe the pain"], "answers": ["Dull, [on and off"]}),
+        # JSON, but not an array
+        (json.dumps("Where?"), json.dumps(5), {"questions": ["Where?"], "answers": ["5"]}),
+        (json.dumps([]), None, {"questions": [], "answers": []}),
+        ("", "null", {"questions": [], "answers": []}),
+    ]
+
+    def insert(cur):
+        return [
+            cur.execute(
+                "INSERT INTO pain_analysis (fingerprint_id, body_part, questions, answers) VALUES (1, 'knee', ?, ?)",
+                (questions, answers),
+            ).lastrowid
+            for questions, answers, _ in legacy
+        ]
+
+    row_ids = backend.db_writer.write(insert)
+    # The step that moved Q&A into the qa column converts whatever it finds
+    backend.db_writer.write(backend._schema_v8)
+
+    conn = backend.get_db()
+    try:
+        for row_id, (_, _, expected) in zip(row_ids, legacy):
+            row = conn.execute("SELECT questions, answers, qa FROM pain_analysis WHERE id = ?", (row_id,)).fetchone()
+            assert (row["questions"], row["answers"]) == (None, None)
+            assert backend._qa_fields(row) == expected, row_id
+    finally:
+        conn.close()
+
+    # The dataset import takes the same legacy shapes
+    backend.db_writer.write(lambda cur: backend._upsert_rows(cur, "pain_analysis", [
+        {"id": row_ids[0], "fingerprint_id": 1, "body_part": "knee", "questions": "Free text question",
+         "answers": "Free text answer"},
+    ]))
+    conn = backend.get_db()
+    try:
+        row = conn.execute("SELECT qa FROM pain_analysis WHERE id = ?", (row_ids[0],)).fetchone()
+        assert backend._qa_fields(row) == {"questions": ["Free text question"], "answers": ["Free text answer"]}
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
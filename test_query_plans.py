@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Check that the per-patient history queries use the indexes from DB_INDEXES
+(EXPLAIN QUERY PLAN): no full table scans and no sorting in a temp B-tree.
+Runs against a scratch database; no server needed.
+
+Run with: python3 test_query_plans.py   (or pytest test_query_plans.py)
+"""
+
+import sys
+import random
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+# The SQL under test is the SQL the routes run: the query constants from
+# backend/app.py, with page clauses added by the same _keyset_sql the routes use
+AFTER = ("2025-01-15 10:00:00", 2500)
+
+
+def _whole(sql, params, **keys):
+    """As streamed by the history endpoints without ?limit= (see _keyset_rows)."""
+    return backend._keyset_sql(sql, params, None, None, **keys)
+
+
+def _page(sql, params, after=AFTER, **keys):
+    """One ?limit=50&after=... page (see _keyset_page)."""
+    return backend._keyset_sql(sql, params, 50, after, **keys)
+
+
+@pytest.fixture
+def conn(scratch_db):
+    scratch_db("plans.db")
+    conn = backend.get_db()
+    # Enough rows (and ANALYZE statistics) for the planner to make real choices
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO patients (fingerprint_id, name, age, sex) VALUES (?, ?, ?, ?)",
+        [(i, f"Patient {i}", 20 + i % 60, "MF"[i % 2]) for i in range(1, 201)],
+    )
+    conn.executemany(
+        "INSERT INTO vitals (fingerprint_id, heart_rate, spo2, temperature, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(rng.randint(1, 200), 70, 98, 36.8, f"2025-01-{1 + i % 28:02d} 10:{i % 60:02d}:00") for i in range(5000)],
+    )
+    conn.executemany(
+        "INSERT INTO pain_analysis (fingerprint_id, body_part, severity, timestamp) VALUES (?, ?, ?, ?)",
+        [(rng.randint(1, 200), rng.choice(["head", "chest", "knee"]), rng.choice([None, "low", "high"]),
+          f"2025-01-{1 + i % 28:02d} 10:{i % 60:02d}:00") for i in range(5000)],
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _plan(conn, sql, params):
+    return [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def _assert_plan(conn, sql, params, index, covering):
+    plan = _plan(conn, sql, params)
+    text = "\n".join(plan)
+    expected = f"USING COVERING INDEX {index}" if covering else f"USING INDEX {index}"
+    assert expected in text, f"expected '{expected}', got:\n{text}"
+    assert "TEMP B-TREE" not in text, f"query sorts in a temp B-tree:\n{text}"
+    assert not any(detail.startswith("SCAN") and "INDEX" not in detail for detail in plan), \
+        f"full table scan:\n{text}"
+
+
+def _history_list(conn, table, columns):
+    """The SQL of a vitals/analyses list for patient 1, without archives (see history_source)."""
+    with backend.history_source(conn, table, columns, 1) as source:
+        return backend.history_list_sql(columns, source)
+
+
+def test_vitals_queries_use_covering_index(conn):
+    try:
+        # The index holds every column (plus the rowid id), so every vitals list is covered
+        vitals = _history_list(conn, "vitals", backend.VITALS_COLUMNS)
+        for sql, params in (
+            _whole(vitals, ()),
+            _page(vitals, ()),
+            (backend.NEWEST_ROWS.format(columns=backend.REPORT_VITALS_COLUMNS, table="vitals", range=""), (1, 10)),
+            (backend.SUMMARY_REFRESH_VITALS.format(fid=1), ()),
+        ):
+            _assert_plan(conn, sql, params, "idx_vitals_patient_time", covering=True)
+    finally:
+        conn.close()
+
+
+def test_pain_analysis_queries_use_patient_time_index(conn):
+    try:
+        # Q&A and AI text are read from the table, in index order
+        analyses = _history_list(conn, "pain_analysis", backend.ANALYSES_COLUMNS)
+        for sql, params in (
+            _whole(analyses, ()),
+            _page(analyses, ()),
+            _page(_history_list(conn, "pain_analysis", backend.COMPARISON_COLUMNS), ()),
+            (backend.LATEST_ANALYSIS, (1,)),
+            (backend.NEWEST_ROWS.format(columns=backend.REPORT_ANALYSES_COLUMNS, table="pain_analysis", range=""),
+             (1, 5)),
+        ):
+            _assert_plan(conn, sql, params, "idx_pain_patient_time", covering=False)
+    finally:
+        conn.close()
+
+
+def test_pending_analysis_uses_partial_index(conn):
+    try:
+        _assert_plan(conn, backend.PENDING_ANALYSIS, (1, "knee"), "idx_pain_pending", covering=False)
+    finally:
+        conn.close()
+
+
+def test_patient_list_sorts_use_indexes(conn):
+    try:
+        for sort, index, covering in (
+            ("created", "idx_patients_created", True),
+            ("last_visit", "idx_summary_last_visit", False),
+            ("severity", "idx_summary_severity", False),
+        ):
+            key = backend.PATIENT_SORT_KEYS[sort]
+            sql = backend._patient_list_sql(key)
+            for built, params in (
+                _whole(sql, (), key=key, id_col="fingerprint_id"),
+                _page(sql, (), after=("2025-01-15 10:00:00", 100), key=key, id_col="fingerprint_id"),
+            ):
+                _assert_plan(conn, built, params, index, covering)
+    finally:
+        conn.close()
+
+
+def test_search_looks_up_patients_by_id(conn):
+    try:
+        # Ranking by bm25 needs a sort of the matches, but never a scan of patients
+        sql, params = _page(backend.PATIENT_SEARCH, ('"patient"*',), after=(-1.5, 100),
+                            key="score", id_col="fingerprint_id", descending=False)
+        plan = "\n".join(_plan(conn, sql, params))
+        assert "SCAN patient_search VIRTUAL TABLE INDEX" in plan, plan
+        assert "SEARCH p USING INTEGER PRIMARY KEY" in plan, plan
+    finally:
+        conn.close()
+
+
+def test_timeline_without_archives_reads_hot_index(conn):
+    try:
+        # history_source only adds archive files when archive_index lists some
+        range_sql, range_params = backend._range_sql("2025-01-01 00:00:00", None)
+        for key, covering in (("v", True), ("p", True)):
+            table, columns = backend.TIMELINE_LISTS[key]
+            index = "idx_vitals_patient_time" if table == "vitals" else "idx_pain_patient_time"
+            with backend.history_source(conn, table, columns, 1) as source:
+                sql = f"SELECT {columns} FROM {source} WHERE 1" + range_sql
+                for built, params in (
+                    _whole(sql, range_params, descending=False),
+                    _page(sql, range_params, descending=False),
+                ):
+                    _assert_plan(conn, built, params, index, covering)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Check the in-memory response cache (ResponseCache and patient_etag in
+backend/app.py): LRU eviction within the byte budget, entries dropped when
+their data version moves on or their TTL runs out, and through the Flask
+test client that a write is visible on the very next read while unrelated
+reads keep hitting the cache, and that ETags/304s follow the same versions.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_response_cache.py   (or pytest test_response_cache.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from flask import Response
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+
+def _body(size, fill="x"):
+    return Response(fill * size, mimetype="application/json")
+
+
+@pytest.fixture
+def client(scratch_db):
+    scratch_db("cache.db")
+    client = backend.app.test_client()
+    for fid in (1, 2):
+        client.post("/api/register_patient", json={"fingerprint_id": fid, "name": f"Patient {fid}", "age": 40,
+                                                   "sex": "Other"})
+        client.post("/api/save_vitals", json={"fingerprint_id": fid, "heart_rate": 70})
+    return client
+
+
+def test_lru_stays_within_byte_budget():
+    cache = backend.ResponseCache(max_bytes=1000, ttl=60)
+    for n in range(3):
+        cache.put(("p", n), 1, _body(300, str(n)))
+    assert cache.bytes == 900
+    # Touch 0, so 1 is the least recently used when 3 needs room
+    assert cache.get(("p", 0), 1).get_data() == b"0" * 300
+    cache.put(("p", 3), 1, _body(300, "3"))
+    assert cache.get(("p", 1), 1) is None
+    assert [cache.get(("p", n), 1) is not None for n in (0, 2, 3)] == [True, True, True]
+    assert cache.bytes == 900 and cache.stats["evictions"] == 1
+
+    # One big entry pushes out as many as it needs
+    cache.put(("p", 4), 1, _body(700))
+    assert cache.bytes <= 1000 and cache.get(("p", 4), 1) is not None
+    assert cache.describe()["entries"] == 2 and cache.stats["evictions"] == 3
+
+    # Replacing an entry doesn't count it twice
+    cache.put(("p", 4), 2, _body(100))
+    assert cache.bytes == 400
+
+
+def test_oversized_responses_are_not_cached():
+    cache = backend.ResponseCache(max_bytes=1000, ttl=60)
+    cache.put(("p", 0), 1, _body(200))
+    cache.put(("p", 1), 1, _body(1001))
+    assert cache.get(("p", 1), 1) is None
+    assert cache.get(("p", 0), 1) is not None and cache.bytes == 200
+    big = backend.ResponseCache(ttl=60)
+    big.put(("p", 0), 1, _body(backend.RESPONSE_CACHE_MAX_ENTRY + 1))
+    assert big.bytes == 0
+
+
+def test_entries_follow_versions_and_ttl():
+    cache = backend.ResponseCache(max_bytes=1000, ttl=60)
+    cache.put(("p", 0), 5, _body(10, "a"))
+    assert cache.get(("p", 0), 5) is not None
+    # A newer version drops the entry; an older one can't replace a newer one
+    assert cache.get(("p", 0), 6) is None and cache.bytes == 0
+    cache.put(("p", 0), 7, _body(10, "b"))
+    cache.put(("p", 0), 6, _body(10, "c"))
+    assert cache.get(("p", 0), 7).get_data() == b"b" * 10
+
+    short = backend.ResponseCache(max_bytes=1000, ttl=0.05)
+    short.put(("p", 0), 1, _body(10))
+    assert short.get(("p", 0), 1) is not None
+    time.sleep(0.1)
+    assert short.get(("p", 0), 1) is None and short.bytes == 0
+
+    cache.put(("patients", 1), 7, _body(10))
+    cache.invalidate("patients")
+    assert cache.get(("patients", 1), 7) is None and cache.get(("p", 0), 7) is not None
+    assert backend.ResponseCache().ttl == backend.RESPONSE_CACHE_TTL
+
+
+def test_write_is_seen_on_the_next_read(client):
+    cache = backend.response_cache
+    url = "/api/get_patient_vitals/1?limit=10"
+    first = client.get(url).get_json()
+    assert client.get(url).get_json() == first
+    hits = cache.stats["hits"]
+    assert hits >= 1
+
+    client.post("/api/save_vitals", json={"fingerprint_id": 1, "heart_rate": 99})
+    vitals = client.get(url).get_json()["vitals"]
+    assert [v["heart_rate"] for v in vitals] == [99, 70]
+    assert cache.stats["hits"] == hits
+
+    # Patient 2's cached page outlives the write to patient 1...
+    other = "/api/get_patient_vitals/2?limit=10"
+    client.get(other)
+    hits = cache.stats["hits"]
+    client.post("/api/save_vitals", json={"fingerprint_id": 1, "heart_rate": 98})
+    client.get(other)
+    assert cache.stats["hits"] == hits + 1
+
+    # ...but the patient list follows every write
+    listed = client.get("/api/get_all_patients").get_json()["patients"]
+    assert {p["fingerprint_id"]: p["latest_vitals"]["heart_rate"] for p in listed} == {1: 98, 2: 70}
+    client.post("/api/save_vitals", json={"fingerprint_id": 2, "heart_rate": 75})
+    listed = client.get("/api/get_all_patients").get_json()["patients"]
+    assert {p["fingerprint_id"]: p["latest_vitals"]["heart_rate"] for p in listed} == {1: 98, 2: 75}
+
+
+def test_etag_follows_the_patients_own_writes(client):
+    urls = ["/api/get_patient_vitals/1?limit=10", "/api/get_patient/1", "/api/get_patient_timeline/1?limit=10"]
+    etags = {}
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200 and response.headers["Cache-Control"] == "no-cache"
+        etags[url] = response.headers["ETag"]
+        assert etags[url].startswith('W/"p1-')
+        # Same version: 304 with no body, also once the body is cached
+        for _ in range(2):
+            unchanged = client.get(url, headers={"If-None-Match": etags[url]})
+            assert unchanged.status_code == 304 and unchanged.data == b""
+            assert unchanged.headers["ETag"] == etags[url]
+        cached = client.get(url)
+        assert cached.status_code == 200 and cached.headers["ETag"] == etags[url]
+    assert len(set(etags.values())) == 1  # one version per patient, whatever the route
+
+    # A write to another patient leaves patient 1's ETag alone
+    client.post("/api/save_vitals", json={"fingerprint_id": 2, "heart_rate": 88})
+    client.post("/api/save_medical_history/2", json={"current_allergies": "latex"})
+    for url in urls:
+        assert client.get(url, headers={"If-None-Match": etags[url]}).status_code == 304
+
+    # A write to patient 1 changes it, on every route
+    client.post("/api/save_medical_history/1", json={"current_allergies": "penicillin"})
+    for url in urls:
+        response = client.get(url, headers={"If-None-Match": etags[url]})
+        assert response.status_code == 200 and response.headers["ETag"] != etags[url]
+        assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    vitals = client.get(urls[0], headers={"If-None-Match": etags[urls[0]]}).get_json()["vitals"]
+    assert [v["heart_rate"] for v in vitals] == [70]
+
+
+def test_streamed_and_failed_responses_are_not_cached(client):
+    cache = backend.response_cache
+    assert client.get("/api/get_patient_vitals/1").is_streamed  # whole history
+    assert client.get("/api/get_patient_vitals/1?limit=-1").status_code == 400
+    assert cache.describe()["entries"] == 0
+    client.get("/api/get_patient_vitals/1?limit=10")
+    assert cache.describe()["entries"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
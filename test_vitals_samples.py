@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Check the raw vitals sample store (SampleRecorder and encode_sample_batch in
+backend/app.py): samples survive the wall clock stepping back or jumping
+ahead within one flush, a failed write retries its samples without pushing
+out newer ones, and every sample or value that can't be kept is counted.
+Runs against scratch databases; no server needed.
+
+Run with: python3 test_vitals_samples.py   (or pytest test_vitals_samples.py)
+"""
+
+import sys
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+import app as backend  # noqa: E402
+
+T = 1760000000.0  # 2025-10-09
+DAY = 86400
+
+
+def _stored(channel="heart_rate"):
+    """Every stored (ts, value) of a channel, from the raw batches."""
+    conn = backend.get_db()
+    try:
+        rows = conn.execute(
+            "SELECT start_ts, end_ts, sample_count, data FROM vitals_samples WHERE channel = ? ORDER BY start_ts",
+            (backend._CHANNEL_INDEX[channel],),
+        ).fetchall()
+    finally:
+        conn.close()
+    points = []
+    for row in rows:
+        batch = backend.decode_sample_batch(row["start_ts"], row["sample_count"], row["data"])
+        assert batch[0][0] == row["start_ts"] and abs(batch[-1][0] - row["end_ts"]) < 0.001
+        points.extend((round(ts, 3), value) for ts, value in batch)
+    return points
+
+
+def test_clock_steps_split_batches(scratch_db):
+    scratch_db("samples.db")
+    recorder = backend.SampleRecorder()
+    # NTP steps the clock back an hour, then (fake-hwclock) it is 60 days ahead
+    times = [T, T + 1, T - 3600, T - 3599, T + 60 * DAY, T + 60 * DAY + 0.5, T + 2]
+    for n, ts in enumerate(times):
+        recorder.record("vitals", ts, {"heart_rate": 60 + n})
+    assert recorder.flush(now=T) == len(times)
+    assert recorder.counters["flushed"] == len(times) and recorder.counters["dropped"] == 0
+    assert recorder.flush(now=T) == 0
+
+    expected = sorted((round(ts, 3), float(60 + n)) for n, ts in enumerate(times))
+    assert _stored() == expected
+    # Each batch spans less than the uint32 offset range
+    conn = backend.get_db()
+    try:
+        spans = [row[0] for row in conn.execute("SELECT end_ts - start_ts FROM vitals_samples")]
+    finally:
+        conn.close()
+    assert len(spans) == 2 and max(spans) * 1000 <= backend.SAMPLE_OFFSET_MAX_MS
+
+    client = backend.app.test_client()
+    samples = client.get(f"/api/get_vitals_samples?channel=heart_rate&since={T - DAY}&until={T + DAY}")
+    assert [s["value"] for s in samples.get_json()["samples"]] == [62.0, 63.0, 60.0, 61.0, 66.0]
+
+
+def test_failed_write_keeps_the_newest_samples(scratch_db, monkeypatch):
+    scratch_db("samples.db")
+    monkeypatch.setattr(backend, "VITALS_RAW_MAX_PENDING", 10)
+    recorder = backend.SampleRecorder()
+    for n in range(6):
+        recorder.record("vitals", T + n, {"heart_rate": n})
+    write = recorder._write
+
+    def fail(raw_rows, rollups):
+        # The readers keep recording while the write is stuck
+        for n in range(7):
+            recorder.record("vitals", T + 10 + n, {"heart_rate": 10 + n})
+        raise sqlite3.OperationalError("database is locked")
+
+    recorder._write = fail
+    with pytest.raises(sqlite3.OperationalError):
+        recorder.flush(now=T)
+    # Room for 3 of the 6 unwritten ones: the oldest 3 are dropped, and counted
+    assert [sample["heart_rate"] for _, _, sample in recorder._pending] == [3, 4, 5] + list(range(10, 17))
+    assert recorder.counters["dropped"] == 3
+
+    recorder._write = write
+    assert recorder.flush(now=T) == 10
+    assert [value for _, value in _stored()] == [3, 4, 5] + list(range(10, 17))
+    assert recorder.counters["recorded"] == recorder.counters["flushed"] + recorder.counters["dropped"]
+
+
+def test_values_that_cant_be_stored_are_counted(scratch_db):
+    scratch_db("samples.db")
+    recorder = backend.SampleRecorder()
+    recorder.record("vitals", T, {"heart_rate": 1e39, "spo2": float("nan"), "temperature": 36.6})
+    recorder.record("vitals", T + 1, {"heart_rate": 70, "temperature": float("inf")})
+    assert recorder.flush(now=T) == 2
+    assert recorder.counters["rejected"] == 3
+    assert _stored() == [(T + 1, 70.0)] and _stored("spo2") == []
+    assert [value for _, value in _stored("temperature")] == [pytest.approx(36.6)]
+
+    # Nothing else went in with them, so the rollups stay usable
+    client = backend.app.test_client()
+    points = client.get(f"/api/get_vitals_rollups?channel=heart_rate&since={T - 60}&until={T + 60}")
+    assert [(p["count"], p["mean"]) for p in points.get_json()["points"]] == [(1, 70.0)]
+
+
+
+def test_bad_time_ranges_are_rejected(scratch_db):
+    scratch_db("samples.db")
+    client = backend.app.test_client()
+    for route in ("get_vitals_rollups", "get_vitals_samples"):
+        for query in ("since=nan", "since=inf", "until=-inf", "since=1e20", "until=1e300", "since=-5", "until=soon"):
+            response = client.get(f"/api/{route}?channel=heart_rate&{query}")
+            assert response.status_code == 400, (route, query, response.status_code)
+            assert response.get_json() == {"ok": False, "error": "Invalid since/until"}
+        assert client.get(f"/api/{route}?channel=heart_rate&since={T}&until={T + 60}").status_code == 200
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))